@@ -1,3 +1,15 @@
 __version__ = '1.1.0'
 from iterator_chain.begin import from_iterable
 from iterator_chain.begin import from_iterable_parallel
+from iterator_chain.begin import from_iterable_thread_parallel
+from iterator_chain.begin import from_async_iterable
+from iterator_chain.begin import from_lines
+from iterator_chain.begin import from_records
+from iterator_chain.begin import from_lines_parallel
+from iterator_chain.begin import from_records_parallel
+from iterator_chain.profiling import Profiler
+from iterator_chain.serialization import Serializer
+from iterator_chain.caching import clear_cache
+from iterator_chain.pool import shared_executor
+from iterator_chain.pool import shared_thread_executor
+from iterator_chain.pool import shutdown_shared_executor
@@ -0,0 +1,155 @@
+import collections
+import functools
+import operator
+from iterator_chain import blocks
+
+
+_Aggregate = collections.namedtuple('_Aggregate', ['initial', 'update', 'merge', 'finish'])
+
+
+def _update_count(state, batch):
+    return state + len(batch)
+
+
+def _update_sum(state, batch):
+    return state + blocks.total([batch])
+
+
+def _update_minimum(state, batch):
+    return _merge_minimums(state, tuple(blocks.minimums([batch])))
+
+
+def _update_maximum(state, batch):
+    return _merge_maximums(state, tuple(blocks.maximums([batch])))
+
+
+def _merge_minimums(first, second):
+    if not first or not second:
+        return first or second
+    return first if first[0] <= second[0] else second
+
+
+def _merge_maximums(first, second):
+    if not first or not second:
+        return first or second
+    return first if first[0] >= second[0] else second
+
+
+def _update_first(state, batch):
+    return state or tuple(batch[:1])
+
+
+def _update_last(state, batch):
+    return tuple(batch[-1:]) or state
+
+
+def _merge_firsts(first, second):
+    return first or second
+
+
+def _merge_lasts(first, second):
+    return second or first
+
+
+def _update_mean(state, batch):
+    count, total = state
+    return count + len(batch), total + blocks.total([batch])
+
+
+def _merge_means(first, second):
+    return first[0] + second[0], first[1] + second[1]
+
+
+def _finish_mean(state):
+    count, total = state
+    return total / count if count else None
+
+
+def _finish_optional(state):
+    # the states of the aggregates that can be empty are a tuple of nothing or of their value
+    return state[0] if state else None
+
+
+def _update_reduce(function, state, batch):
+    return functools.reduce(function, batch, state)
+
+
+def _identity(state):
+    return state
+
+
+BUILT_IN = {
+    'count': _Aggregate(0, _update_count, operator.add, _identity),
+    'sum': _Aggregate(0, _update_sum, operator.add, _identity),
+    'min': _Aggregate((), _update_minimum, _merge_minimums, _finish_optional),
+    'max': _Aggregate((), _update_maximum, _merge_maximums, _finish_optional),
+    'first': _Aggregate((), _update_first, _merge_firsts, _finish_optional),
+    'last': _Aggregate((), _update_last, _merge_lasts, _finish_optional),
+    'mean': _Aggregate((0, 0), _update_mean, _merge_means, _finish_mean),
+}
+
+
+def resolve(specs):
+    """
+    Turns the specifications of the aggregates into the functions that compute them.
+
+    :param specs: A `dict` of a name to either the name of a built-in aggregate, or a tuple of an initial value, a
+    function that takes the aggregate so far and an element and returns the new aggregate, and optionally an
+    associative function that takes two aggregates and returns them combined.
+    :return: A `dict` of the same names to `_Aggregate`s.  Their `merge` is None if they cannot be combined.
+    """
+    resolved = {}
+    for name, spec in specs.items():
+        if isinstance(spec, str):
+            if spec not in BUILT_IN:
+                raise ValueError('{} is not one of {}'.format(repr(spec), ', '.join(repr(built_in) for built_in in BUILT_IN)))
+            resolved[name] = BUILT_IN[spec]
+        else:
+            initial, function, *combiner = spec
+            resolved[name] = _Aggregate(initial, functools.partial(_update_reduce, function), combiner[0] if combiner else None, _identity)
+    return resolved
+
+
+def mergeable(aggregates):
+    return all(aggregate.merge is not None for aggregate in aggregates.values())
+
+
+def compute(aggregates, batches):
+    """
+    Can run in the execution unit.  Computes every aggregate over the batches in a single pass.
+
+    :param aggregates: A `dict` returned by `resolve`.
+    :param batches: An iterable of lists or NumPy arrays of elements.
+    :return: A `dict` of every name to the state of its aggregate, which still needs to be finished.
+    """
+    states = {name: aggregate.initial for name, aggregate in aggregates.items()}
+    for batch in batches:
+        for name, aggregate in aggregates.items():
+            states[name] = aggregate.update(states[name], batch)
+    return states
+
+
+def merge(aggregates, partial_states):
+    """
+    Combines the states computed by `compute` for consecutive parts of the elements.
+
+    :param aggregates: A `dict` returned by `resolve`, whose aggregates can all be combined.
+    :param partial_states: An iterable of the states computed by `compute`, in the order of the elements.
+    :return: A `dict` of every name to the combined state of its aggregate.
+    """
+    states = None
+    for chunk_states in partial_states:
+        if states is None:
+            states = chunk_states
+        else:
+            states = {name: aggregate.merge(states[name], chunk_states[name]) for name, aggregate in aggregates.items()}
+    if states is None:
+        return {name: aggregate.initial for name, aggregate in aggregates.items()}
+    return states
+
+
+def finish(aggregates, states):
+    """
+    :return: A `dict` of every name to the final value of its aggregate.
+    """
+    return {name: aggregate.finish(states[name]) for name, aggregate in aggregates.items()}
@@ -1,27 +1,176 @@
+import asyncio
+import functools
 from concurrent.futures import ProcessPoolExecutor
+from iterator_chain import caching
+from iterator_chain import files
+from iterator_chain import pool
 from iterator_chain.intermediate import _IntermediateIteratorChain
+from iterator_chain.parallel_intermediate import _FLAT_MAP
 from iterator_chain.parallel_intermediate import _IntermediateParallelIteratorChain
 
 
-def from_iterable(iterable):
+def from_iterable(iterable, profiler=None):
     """
     Starts the iterator chain with the supplied iterable.  Chaining and terminating methods can now be called on the result.
 
     :param iterable: An iterable to be used in the iterator chain.
+    :param profiler: Keyword.  A `Profiler` that records the work done by every method of the chain.  If unspecified or None, nothing is recorded.
     :return: An intermediate object that subsequent chaining and terminating methods can be called on.
     """
-    iterator = iter(iterable)
-    return _IntermediateIteratorChain(iterator)
+    iterator = _profile_source(iter(iterable), profiler, 'from_iterable')
+    return _IntermediateIteratorChain(iterator, profiler=profiler, lineage=(caching.source('from_iterable', iterable),))
 
 
-def from_iterable_parallel(iterable, chunksize=None):
+def from_iterable_parallel(iterable, chunksize=None, max_in_flight=None, ordered=True, target_chunk_time=None, executor=None, profiler=None, shared_memory_threshold=None, serializer=None):
     """
     Starts the iterator chain with the supplied iterable.  Chaining and terminating methods can now be called on the result.  Certain chaining and terminating methods will occur in parallel.  Parallel means separate processes to get around Python's GIL.
 
     :param iterable: An iterable to be used in the iterator chain.
-    :param chunksize: How big of chunks to split the iterator up across the parallel execution units.  If unspecified or None, the chunk size will start at 1 and send that many elements to each execution unit.  The chunk size will then increment in powers of two and send that many items to each execution unit.  This is repeated until the iterator is exhausted.  This value is used as the default chunksize for all the following parallel based methods.  A specific parallel based method's chunksize can be overrided by supplying the `chunksize` keyword to that method.
+    :param chunksize: How big of chunks to split the iterator up across the parallel execution units.  If unspecified or None, the chunk size will start at 1 and adapt to how long the chunks take to execute, aiming for each chunk to take `target_chunk_time` seconds.  When the size of the iterable is known, the chunks get smaller near its end so the last chunks don't leave execution units idle.  The chosen chunk sizes are logged at the debug level.  This value is used as the default chunksize for all the following parallel based methods.  A specific parallel based method's chunksize can be overrided by supplying the `chunksize` keyword to that method.
+    :param max_in_flight: The maximum number of chunks that are submitted to the parallel execution units but whose results have not been consumed yet.  Chunks are only submitted as results are requested, so memory use stays constant no matter how large the iterable is.  If unspecified or None, two chunks per CPU are allowed.
+    :param ordered: If set to `False`, the results of the parallel based methods are returned as soon as their chunk finishes instead of in the order of the iterable.  This keeps all the parallel execution units busy when some elements take much longer than others.  This value is used as the default ordering for all the following parallel based methods.  A specific parallel based method's ordering can be overrided by supplying the `ordered` keyword to that method.
+    :param target_chunk_time: How many seconds each chunk should take to execute when the chunk size is adapted.  If unspecified or None, 0.1 seconds is used.
+    :param executor: The `concurrent.futures.Executor` to execute the parallel based methods with.  The executor is not shut down by the iterator chain, so it can be reused across many chains, like the warm process pool returned by `shared_executor`.  If unspecified or None, a new process pool is started for the chain and shut down once the chain is finished, so the functions of the chain can be defined right before it.
+    :param profiler: A `Profiler` that records the work done by every method of the chain, including how many chunks were sent to the parallel execution units and how long was spent waiting on them.  If unspecified or None, nothing is recorded.
+    :param shared_memory_threshold: How many bytes a `bytes`, `bytearray`, or NumPy array element must be to be sent to the parallel execution units through shared memory instead of being pickled.  Only the location of the shared memory is pickled, and the parallel execution units map NumPy arrays straight from it without copying.  Results of the parallel based methods that are at least as large are sent back the same way.  If unspecified or None, every element is pickled.
+    :param serializer: A `Serializer` that the functions, chunks, and results are serialized with instead of the executor's own pickling.  The functions are serialized once per parallel method and loaded once per parallel execution unit instead of being pickled with every chunk, and with cloudpickle installed they can be lambdas.  With `shared_memory_threshold`, large `bytes`, `bytearray`s, and NumPy arrays anywhere inside the elements are sent through shared memory, not just the elements themselves.  If unspecified or None, the executor's own pickling is used.
     :return: An intermediate object that subsequent chaining and terminating methods can be called on.
     """
-    iterator = iter(iterable)
-    executor = ProcessPoolExecutor()
-    return _IntermediateParallelIteratorChain(iterator, executor, chunksize=chunksize)
+    iterator = _profile_source(iter(iterable), profiler, 'from_iterable_parallel')
+    shutdown_executor = executor is None
+    if executor is None:
+        executor = ProcessPoolExecutor()
+    return _IntermediateParallelIteratorChain(iterator, executor, chunksize=chunksize, max_in_flight=max_in_flight, ordered=ordered, target_chunk_time=target_chunk_time, shutdown_executor=shutdown_executor, shared_memory_threshold=shared_memory_threshold, serializer=serializer, profiler=profiler, lineage=(caching.source('from_iterable_parallel', iterable),))
+
+
+def from_iterable_thread_parallel(iterable, chunksize=None, max_in_flight=None, ordered=True, target_chunk_time=None, executor=None, profiler=None):
+    """
+    Starts the iterator chain with the supplied iterable.  Chaining and terminating methods can now be called on the result.  Certain chaining and terminating methods will occur in parallel.  Parallel means separate threads, which avoids the cost of sending elements to separate processes when the functions are I/O bound.
+
+    :param iterable: An iterable to be used in the iterator chain.
+    :param chunksize: How big of chunks to split the iterator up across the parallel execution units.  Behaves the same as the `chunksize` of `from_iterable_parallel`.
+    :param max_in_flight: The maximum number of chunks that are submitted to the parallel execution units but whose results have not been consumed yet.  Behaves the same as the `max_in_flight` of `from_iterable_parallel`.
+    :param ordered: Behaves the same as the `ordered` of `from_iterable_parallel`.
+    :param target_chunk_time: Behaves the same as the `target_chunk_time` of `from_iterable_parallel`.
+    :param executor: The `concurrent.futures.Executor` to execute the parallel based methods with.  The executor is not shut down by the iterator chain.  If unspecified or None, a thread pool that is shared by all thread parallel iterator chains is used.
+    :param profiler: Behaves the same as the `profiler` of `from_iterable_parallel`.
+    :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+    """
+    iterator = _profile_source(iter(iterable), profiler, 'from_iterable_thread_parallel')
+    if executor is None:
+        executor = pool.shared_thread_executor()
+    return _IntermediateParallelIteratorChain(iterator, executor, chunksize=chunksize, max_in_flight=max_in_flight, ordered=ordered, target_chunk_time=target_chunk_time, shutdown_executor=False, profiler=profiler, lineage=(caching.source('from_iterable_thread_parallel', iterable),))
+
+
+def from_async_iterable(async_iterable, profiler=None):
+    """
+    Starts the iterator chain with the supplied asynchronous iterable.  Chaining and terminating methods can now be called on the result.  The asynchronous iterable is iterated on a shared event loop, which is the same loop the coroutines of `amap` and `afilter` run on.
+
+    :param async_iterable: An asynchronous iterable to be used in the iterator chain.
+    :param profiler: Keyword.  Behaves the same as the `profiler` of `from_iterable`.
+    :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+    """
+    iterator = _profile_source(_iterate_async_iterable(async_iterable), profiler, 'from_async_iterable')
+    return _IntermediateIteratorChain(iterator, profiler=profiler, lineage=(caching.source('from_async_iterable', async_iterable),))
+
+
+def from_lines(path, encoding='utf-8', profiler=None):
+    """
+    Starts the iterator chain with the lines of a file.  Chaining and terminating methods can now be called on the result.  The file is memory mapped and split into lines a range of bytes at a time, and the lines don't include their line endings.
+
+    :param path: The path of the file.
+    :param encoding: Keyword.  The encoding of the file.  It must encode the newline as a single `\n` byte, like UTF-8 does.  Defaults to `'utf-8'`.
+    :param profiler: Keyword.  Behaves the same as the `profiler` of `from_iterable`.
+    :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+    """
+    iterator = _profile_source(files.read(path, encoding), profiler, 'from_lines')
+    return _IntermediateIteratorChain(iterator, profiler=profiler, lineage=(caching.source('from_lines', encoding, path=path),))
+
+
+def from_records(path, fmt, encoding='utf-8', profiler=None):
+    """
+    Starts the iterator chain with the records of a file.  Chaining and terminating methods can now be called on the result.  The file is read the same way as `from_lines`, so a record cannot span multiple lines.
+
+    :param path: The path of the file.
+    :param fmt: `'jsonl'` for a file with a JSON value on every line, or `'csv'` for a CSV file whose first line is the header.  CSV rows become `dict`s keyed by the header.
+    :param encoding: Keyword.  Behaves the same as the `encoding` of `from_lines`.
+    :param profiler: Keyword.  Behaves the same as the `profiler` of `from_iterable`.
+    :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+    """
+    files.check_format(fmt)
+    iterator = _profile_source(files.read(path, encoding, fmt=fmt), profiler, 'from_records')
+    return _IntermediateIteratorChain(iterator, profiler=profiler, lineage=(caching.source('from_records', (fmt, encoding), path=path),))
+
+
+def from_lines_parallel(path, encoding='utf-8', range_size=None, chunksize=None, max_in_flight=None, ordered=True, target_chunk_time=None, executor=None, profiler=None, serializer=None):
+    """
+    Starts the iterator chain with the lines of a file.  Chaining and terminating methods can now be called on the result.  Certain chaining and terminating methods will occur in parallel, like with `from_iterable_parallel`.  The file is split into ranges of bytes, and the parallel execution units read the lines of each range themselves, so the lines are never read or sent by the calling process.  The following parallel methods are executed together with the reading.
+
+    :param path: The path of the file.
+    :param encoding: Behaves the same as the `encoding` of `from_lines`.
+    :param range_size: How many bytes each range spans.  If unspecified or None, 1 MiB is used.
+    :param chunksize: Behaves the same as the `chunksize` of `from_iterable_parallel`, except that the chunks of the reading and the methods executed together with it are made of ranges instead of lines.
+    :param max_in_flight: Behaves the same as the `max_in_flight` of `from_iterable_parallel`.
+    :param ordered: Behaves the same as the `ordered` of `from_iterable_parallel`.
+    :param target_chunk_time: Behaves the same as the `target_chunk_time` of `from_iterable_parallel`.
+    :param executor: Behaves the same as the `executor` of `from_iterable_parallel`.
+    :param profiler: Behaves the same as the `profiler` of `from_iterable_parallel`.
+    :param serializer: Behaves the same as the `serializer` of `from_iterable_parallel`.
+    :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+    """
+    return _from_file_parallel(path, encoding, None, range_size, chunksize, max_in_flight, ordered, target_chunk_time, executor, profiler, serializer, 'from_lines_parallel')
+
+
+def from_records_parallel(path, fmt, encoding='utf-8', range_size=None, chunksize=None, max_in_flight=None, ordered=True, target_chunk_time=None, executor=None, profiler=None, serializer=None):
+    """
+    Starts the iterator chain with the records of a file.  Chaining and terminating methods can now be called on the result.  The records are read and parsed in the parallel execution units the same way as `from_lines_parallel` reads lines.
+
+    :param path: The path of the file.
+    :param fmt: Behaves the same as the `fmt` of `from_records`.
+    :param encoding: Behaves the same as the `encoding` of `from_lines`.
+    :param range_size: Behaves the same as the `range_size` of `from_lines_parallel`.
+    :param chunksize: Behaves the same as the `chunksize` of `from_lines_parallel`.
+    :param max_in_flight: Behaves the same as the `max_in_flight` of `from_iterable_parallel`.
+    :param ordered: Behaves the same as the `ordered` of `from_iterable_parallel`.
+    :param target_chunk_time: Behaves the same as the `target_chunk_time` of `from_iterable_parallel`.
+    :param executor: Behaves the same as the `executor` of `from_iterable_parallel`.
+    :param profiler: Behaves the same as the `profiler` of `from_iterable_parallel`.
+    :param serializer: Behaves the same as the `serializer` of `from_iterable_parallel`.
+    :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+    """
+    files.check_format(fmt)
+    return _from_file_parallel(path, encoding, fmt, range_size, chunksize, max_in_flight, ordered, target_chunk_time, executor, profiler, serializer, 'from_records_parallel')
+
+
+def _from_file_parallel(path, encoding, fmt, range_size, chunksize, max_in_flight, ordered, target_chunk_time, executor, profiler, serializer, method):
+    fieldnames, start = files.read_header(path, encoding) if fmt == 'csv' else (None, 0)
+    iterator = iter(files.byte_ranges(path, range_size=range_size, start=start))
+    read_stage = (_FLAT_MAP, functools.partial(files.read_range, path, encoding, fmt, fieldnames))
+    stage_profile = profiler._add_stage(method) if profiler is not None else None
+
+    shutdown_executor = executor is None
+    if executor is None:
+        executor = ProcessPoolExecutor()
+    return _IntermediateParallelIteratorChain(iterator, executor, chunksize=chunksize, max_in_flight=max_in_flight, ordered=ordered, target_chunk_time=target_chunk_time, shutdown_executor=shutdown_executor, serializer=serializer, profiler=profiler, lineage=(caching.source(method, (fmt, encoding), path=path),), stages=(read_stage,), stage_profiles=(stage_profile,), stages_chunksize=chunksize, stages_ordered=ordered)
+
+
+def _profile_source(iterator, profiler, method):
+    if profiler is None:
+        return iterator
+    stage = profiler._add_stage(method)
+    return profiler._wrap_output(iterator, stage)
+
+
+def _iterate_async_iterable(async_iterable):
+    event_loop = pool.shared_event_loop()
+    async_iterator = async_iterable.__aiter__()
+
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(_anext(async_iterator), event_loop).result()
+        except StopAsyncIteration:
+            return
+
+
+async def _anext(async_iterator):
+    return await async_iterator.__anext__()
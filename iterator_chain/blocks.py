@@ -0,0 +1,67 @@
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DEFAULT_SIZE = 1024
+
+
+def batches(iterator, size, array=False):
+    """
+    A generator that groups the elements of the iterator into blocks.
+
+    :param iterator: The iterator to group.
+    :param size: How many elements to put in each block.  The last block may have fewer.
+    :param array: Keyword.  If `True`, the blocks are NumPy arrays instead of lists.
+    """
+    while True:
+        block = list(itertools.islice(iterator, size))
+        if not block:
+            return
+        yield numpy.asarray(block) if array else block
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError('NumPy is required for array blocks.  Install it with `pip install iterator-chain[numpy]`.')
+
+
+def is_array(block):
+    return numpy is not None and isinstance(block, numpy.ndarray)
+
+
+def unbatch(blocks):
+    """
+    A generator of the elements in the blocks.  The elements of NumPy arrays are converted to Python objects.
+
+    :param blocks: An iterable of blocks.
+    """
+    for block in blocks:
+        yield from block.tolist() if is_array(block) else block
+
+
+def count(blocks):
+    return sum(len(block) for block in blocks)
+
+
+def total(blocks):
+    return sum(block.sum() if is_array(block) else sum(block) for block in blocks)
+
+
+def minimums(blocks):
+    """
+    :param blocks: An iterable of blocks.
+    :return: A list of the smallest element of each block that isn't empty.
+    """
+    return [block.min() if is_array(block) else min(block) for block in blocks if len(block)]
+
+
+def maximums(blocks):
+    """
+    :param blocks: An iterable of blocks.
+    :return: A list of the largest element of each block that isn't empty.
+    """
+    return [block.max() if is_array(block) else max(block) for block in blocks if len(block)]
@@ -0,0 +1,49 @@
+import math
+
+
+_SALT = 0x9E3779B97F4A7C15
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        """
+        A set that only remembers whether an element might have been added.  It never forgets an element that was added,
+        but it wrongly reports up to `error_rate` of the elements that were not added as added while at most `capacity`
+        elements have been added.  Beyond `capacity`, far more are wrongly reported the more elements are added.  It uses
+        a fixed amount of memory no matter how many elements are added.
+
+        :param capacity: How many elements are expected to be added.
+        :param error_rate: The acceptable rate of false positives, between 0 and 1.
+        """
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+
+        self._bit_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hash_count = max(1, round(self._bit_count / capacity * math.log(2)))
+        self._bits = bytearray((self._bit_count + 7) // 8)
+
+    def add(self, item):
+        """
+        Adds the item.
+
+        :param item: A hashable item.
+        :return: `True` if the item was definitely not added before, else `False`.
+        """
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                added = True
+        return added
+
+    def __contains__(self, item):
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._positions(item))
+
+    def _positions(self, item):
+        # double hashing derives every position from two hashes, so the item itself is only hashed once
+        first_hash = hash(item)
+        second_hash = hash((first_hash, _SALT)) | 1
+        return ((first_hash + index * second_hash) % self._bit_count for index in range(self._hash_count))
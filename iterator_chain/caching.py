@@ -0,0 +1,319 @@
+import collections
+import collections.abc
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import types
+
+
+STORAGES = ('memory', 'disk')
+# in the user's own cache directory, because a cache that someone else could write to would unpickle their code
+DEFAULT_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'iterator-chain')
+
+_ITEMS_PER_PICKLE = 1024
+# how many chains are cached in memory before the least recently used is forgotten
+_MAX_MEMORY_CACHES = 64
+_FILE_SUFFIX = '.cache'
+# the sources whose data is fingerprinted by pickling it, because they can be iterated again with the same elements
+_FINGERPRINTED_SOURCES = (list, tuple, range, str, bytes, dict, set, frozenset)
+
+Source = collections.namedtuple('Source', ['method', 'data', 'path'])
+# what is recorded in a lineage in place of the chains and iterators supplied to a method, so they are not kept alive
+_ChainArgument = collections.namedtuple('_ChainArgument', ['lineage'])
+_IteratorArgument = collections.namedtuple('_IteratorArgument', ['type_name'])
+
+# the elements of the chains cached in memory, by their fingerprint, from the least to the most recently used
+_memory = collections.OrderedDict()
+
+
+class _Unfingerprintable(Exception):
+    pass
+
+
+def source(method, data, path=None):
+    """
+    Describes what a chain started from, which is the first entry of the chain's lineage.
+
+    :param method: The name of the function that started the chain.
+    :param data: The iterable the chain started from, or the arguments that the elements of the file depend on.
+    :param path: Keyword.  The path of the file the chain started from, if any.  Its size and modification time are
+    part of the fingerprint.
+    :return: A `Source`.
+    """
+    return Source(method, data, path)
+
+
+def record_lineage(original_function):
+    """
+    Adds the decorated chaining method and its arguments to the lineage of the chain it returns, which is what caches are
+    fingerprinted by.  Chains supplied to the method are recorded by their lineage, and iterators by their type, so the
+    lineage does not keep them or their elements alive.
+    """
+    @functools.wraps(original_function)
+    def wrapper(self, *args, **kwargs):
+        chain = original_function(self, *args, **kwargs)
+        arguments = tuple(_lineage_argument(argument) for argument in args)
+        keyword_arguments = {name: _lineage_argument(argument) for name, argument in kwargs.items()}
+        chain._lineage = self._lineage + ((original_function.__name__, arguments, keyword_arguments),)
+        return chain
+
+    return wrapper
+
+
+def fingerprint(lineage, key=None):
+    """
+    Fingerprints everything a chain's elements depend on.  The code, defaults, and closures of the functions supplied to
+    the methods are fingerprinted, as are the values of the other globals they read, so changing any of them changes the
+    fingerprint.  The global functions and modules they use are only fingerprinted by their name.
+
+    :param lineage: A tuple of the chain's `Source` followed by a tuple of the name, positional arguments, and keyword
+    arguments of every chaining method called since.
+    :param key: Keyword.  Anything picklable that identifies the data the chain started from.  If None, the data itself
+    is fingerprinted.
+    :return: The fingerprint as a hexadecimal string.
+    """
+    fingerprinter = _Fingerprinter(key is None)
+    if key is not None:
+        fingerprinter.feed_pickled(key)
+    try:
+        fingerprinter.feed_lineage(lineage)
+    except _Unfingerprintable as exception:
+        raise ValueError('{} cannot be fingerprinted, so the cache needs a key that identifies it'.format(exception)) from None
+    return fingerprinter.digest.hexdigest()
+
+
+def replay(storage, path, fingerprint):
+    """
+    :return: An iterator of the cached elements with the fingerprint, or None if they are not cached.
+    """
+    if storage == 'memory':
+        elements = _memory.get(fingerprint)
+        if elements is None:
+            return None
+        _memory.move_to_end(fingerprint)
+        return iter(elements)
+
+    try:
+        cache_file = open(_cache_path(path, fingerprint), 'rb')
+    except FileNotFoundError:
+        return None
+    return _read(cache_file)
+
+
+def record(storage, path, fingerprint, iterator):
+    """
+    A generator of the elements of the iterator that caches them with the fingerprint.  The elements are only cached if
+    the iterator is exhausted, so a cache is never replayed with missing elements.
+
+    :param storage: One of `STORAGES`.  Only the `_MAX_MEMORY_CACHES` most recently used chains are kept in memory.
+    :param path: The directory of the disk cache.  If None, `DEFAULT_DIRECTORY` is used.
+    :param fingerprint: What `fingerprint` returned.
+    :param iterator: The iterator of the elements to cache.
+    """
+    if storage == 'memory':
+        elements = []
+        for item in iterator:
+            elements.append(item)
+            yield item
+        _memory[fingerprint] = elements
+        while len(_memory) > _MAX_MEMORY_CACHES:
+            _memory.popitem(last=False)
+        return
+
+    cache_path = _cache_path(path, fingerprint)
+    # the elements are written next to the cache and moved into place once complete, so readers never see part of them
+    cache_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path), prefix=fingerprint, suffix='.tmp', delete=False)
+    try:
+        with cache_file:
+            batch = []
+            for item in iterator:
+                batch.append(item)
+                if len(batch) >= _ITEMS_PER_PICKLE:
+                    pickle.dump(batch, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+                yield item
+            if batch:
+                pickle.dump(batch, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_file.name, cache_path)
+    except BaseException:
+        os.remove(cache_file.name)
+        raise
+
+
+def clear_cache(path=None):
+    """
+    Deletes every chain cached in memory and every chain cached on disk in the directory.
+
+    :param path: Keyword.  The directory of the disk cache.  If None, `DEFAULT_DIRECTORY` is used.
+    """
+    _memory.clear()
+
+    directory = path or DEFAULT_DIRECTORY
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(_FILE_SUFFIX):
+            os.remove(os.path.join(directory, name))
+
+
+def _cache_path(path, fingerprint):
+    if path:
+        os.makedirs(path, exist_ok=True)
+        return os.path.join(path, fingerprint + _FILE_SUFFIX)
+
+    os.makedirs(DEFAULT_DIRECTORY, mode=0o700, exist_ok=True)
+    status = os.stat(DEFAULT_DIRECTORY)
+    if hasattr(os, 'getuid') and (status.st_uid != os.getuid() or status.st_mode & 0o022):
+        raise PermissionError('{} must be owned by and only writable by the current user to cache chains in it'.format(DEFAULT_DIRECTORY))
+    return os.path.join(DEFAULT_DIRECTORY, fingerprint + _FILE_SUFFIX)
+
+
+def _read(cache_file):
+    with cache_file:
+        while True:
+            try:
+                batch = pickle.load(cache_file)
+            except EOFError:
+                return
+            yield from batch
+
+
+class _Fingerprinter:
+    def __init__(self, fingerprint_sources):
+        """
+        Adds the lineage of a chain to a digest.
+
+        :param fingerprint_sources: If `True`, the data of the chains is fingerprinted, and an error is raised for data
+        that cannot be.  If `False`, only the method that started each chain is.
+        """
+        self.digest = hashlib.blake2b(digest_size=16)
+        self._fingerprint_sources = fingerprint_sources
+        # the ids of the functions already added, so recursive functions don't recurse forever
+        self._seen = set()
+
+    def feed_pickled(self, something):
+        """
+        Adds something by pickling it straight into the digest, so large data never needs to be held as one `bytes`.
+        """
+        pickle.Pickler(_DigestFile(self.digest), protocol=pickle.HIGHEST_PROTOCOL).dump(something)
+
+    def feed_lineage(self, lineage):
+        for entry in lineage:
+            if isinstance(entry, Source):
+                self._feed_source(entry)
+            else:
+                self.feed(entry)
+
+    def feed(self, something):
+        """
+        Adds something supplied to a chaining method.  Functions are added by their code instead of their name, and
+        chains by their lineage.  Anything else is pickled if it can be, and otherwise only its type is added.  Tuples
+        and `dict`s are added an item at a time because pickle would only add the names of the functions in them.
+        """
+        self.digest.update(type(something).__qualname__.encode())
+
+        if isinstance(something, _ChainArgument):
+            self.feed_lineage(something.lineage)
+        elif isinstance(something, _IteratorArgument):
+            # iterators are data, which needs the key to be told apart
+            if self._fingerprint_sources:
+                raise _Unfingerprintable('The {} supplied to the chain'.format(something.type_name))
+        elif isinstance(something, tuple):
+            self.digest.update(str(len(something)).encode())
+            for item in something:
+                self.feed(item)
+        elif isinstance(something, dict):
+            for name, value in sorted(something.items(), key=lambda item: repr(item[0])):
+                self.feed(name)
+                self.feed(value)
+        elif hasattr(something, '_lineage'):
+            self.feed_lineage(something._lineage)
+        elif isinstance(something, types.CodeType):
+            self.digest.update(something.co_code)
+            self.feed(something.co_names)
+            self.feed(something.co_consts)
+        elif isinstance(something, (functools.partial, types.FunctionType, types.MethodType)):
+            self._feed_function(something)
+        else:
+            try:
+                self.feed_pickled(something)
+            except Exception:
+                self._feed_unpicklable(something)
+
+    def _feed_source(self, source):
+        self.feed(source.method)
+        if source.path is not None:
+            status = os.stat(source.path)
+            self.feed((os.path.abspath(source.path), status.st_size, status.st_mtime_ns, source.data))
+        elif self._fingerprint_sources:
+            if not isinstance(source.data, _FINGERPRINTED_SOURCES):
+                raise _Unfingerprintable('The {} that the chain started from'.format(type(source.data).__name__))
+            try:
+                self.feed_pickled(source.data)
+            except Exception:
+                raise _Unfingerprintable('The {} that the chain started from'.format(type(source.data).__name__)) from None
+
+    def _feed_function(self, function):
+        if id(function) in self._seen:
+            return
+        self._seen.add(id(function))
+
+        if isinstance(function, functools.partial):
+            self.feed((function.func, function.args, function.keywords))
+        elif isinstance(function, types.FunctionType):
+            closure = tuple(cell.cell_contents for cell in function.__closure__ or ())
+            self.feed((function.__code__, function.__defaults__, function.__kwdefaults__, closure))
+            self._feed_globals(function)
+        else:
+            self.feed((function.__func__, function.__self__))
+
+    def _feed_globals(self, function):
+        for name in sorted(_global_names(function.__code__)):
+            if name not in function.__globals__:
+                continue
+            value = function.__globals__[name]
+            # global functions, classes, and modules are only fingerprinted by their name, which is already in the code
+            if isinstance(value, types.ModuleType) or callable(value):
+                continue
+            self.feed(name)
+            try:
+                self.feed_pickled(value)
+            except Exception:
+                self.feed(type(value).__qualname__)
+
+    def _feed_unpicklable(self, something):
+        if hasattr(something, '__iter__') or hasattr(something, '__aiter__'):
+            # iterables are data, which needs the key to be told apart when it cannot be fingerprinted
+            if self._fingerprint_sources:
+                raise _Unfingerprintable('The {} supplied to the chain'.format(type(something).__name__))
+        elif callable(something) and isinstance(type(something).__call__, types.FunctionType):
+            self._feed_function(type(something).__call__)
+
+
+class _DigestFile:
+    def __init__(self, digest):
+        """
+        A write-only file that adds everything written to it to a digest.
+        """
+        self.write = digest.update
+
+
+def _lineage_argument(argument):
+    if hasattr(argument, '_lineage'):
+        return _ChainArgument(argument._lineage)
+    if isinstance(argument, (collections.abc.Iterator, collections.abc.AsyncIterator)):
+        return _IteratorArgument(type(argument).__name__)
+    return argument
+
+
+def _global_names(code):
+    """
+    :return: A `set` of the names the code, and the code of the functions defined in it, reads as globals or attributes.
+    """
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            names |= _global_names(constant)
+    return names
@@ -0,0 +1,162 @@
+import collections
+import csv
+import io
+import json
+import mmap
+import os
+
+
+DEFAULT_RANGE_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20
+
+FORMATS = ('jsonl', 'csv')
+
+_JSON_ENCODER = json.JSONEncoder()
+
+EncodedBatch = collections.namedtuple('EncodedBatch', ['count', 'fieldnames', 'data'])
+
+
+def byte_ranges(path, range_size=None, start=0):
+    """
+    Splits the file into ranges of bytes.  Each line of the file belongs to the range it starts in.
+
+    :param path: The path of the file.
+    :param range_size: Keyword.  How many bytes each range spans.  If None, 1 MiB is used.
+    :param start: Keyword.  The byte to start at.
+    :return: A list of tuples of the start and end of every range.
+    """
+    range_size = range_size or DEFAULT_RANGE_SIZE
+    size = os.path.getsize(path)
+    return [(range_start, min(range_start + range_size, size)) for range_start in range(start, size, range_size)]
+
+
+def read_header(path, encoding):
+    """
+    Reads the CSV header of the file.
+
+    :return: A tuple of the list of field names and the byte the rest of the file starts at.
+    """
+    with open(path, 'rb') as header_file:
+        header_line = header_file.readline()
+    fieldnames = next(csv.reader([header_line.decode(encoding)]), [])
+    return fieldnames, len(header_line)
+
+
+def read_range(path, encoding, fmt, fieldnames, byte_range):
+    """
+    Can run in the execution unit.  Reads the lines that start in the range of bytes and parses them.  The file is memory mapped, so the lines are split without reading the file line by line.
+
+    :param path: The path of the file.
+    :param encoding: The encoding of the file.  It must encode the newline as the single byte `\\n`, like UTF-8 does.
+    :param fmt: None to return the lines themselves, `'jsonl'` to parse every line that isn't blank as JSON, or `'csv'` to parse the lines as CSV rows.
+    :param fieldnames: The field names of the CSV rows.
+    :param byte_range: A tuple of the start and end of the range.
+    :return: A list of the lines, without their line endings, or the parsed records.
+    """
+    lines = _read_lines(path, encoding, byte_range)
+    if fmt == 'jsonl':
+        return [json.loads(line) for line in lines if line.strip()]
+    elif fmt == 'csv':
+        return list(csv.DictReader(lines, fieldnames=fieldnames))
+    return lines
+
+
+def read(path, encoding, fmt=None, range_size=None):
+    """
+    A generator of the lines or records of the file, read one range of bytes at a time.
+
+    :param path: The path of the file.
+    :param encoding: The encoding of the file.
+    :param fmt: Keyword.  The same as the `fmt` of `read_range`.
+    :param range_size: Keyword.  How many bytes to read at a time.
+    """
+    fieldnames, start = read_header(path, encoding) if fmt == 'csv' else (None, 0)
+    for byte_range in byte_ranges(path, range_size=range_size, start=start):
+        yield from read_range(path, encoding, fmt, fieldnames, byte_range)
+
+
+def encode(fmt, encoding, fieldnames, items):
+    """
+    Can run in the execution unit.  Serializes a batch of items into the bytes of their lines, so they can be written with a single call.
+
+    :param fmt: None to write every item as its `str`, `'jsonl'` to write every item as JSON, or `'csv'` to write every item as a CSV row.  `dict`s are written with `csv.DictWriter` and anything else with `csv.writer`.
+    :param encoding: The encoding to encode the lines with.
+    :param fieldnames: The field names of the CSV rows.  If None, the keys of the first `dict` are used.
+    :param items: An iterable of the items.
+    :return: An `EncodedBatch` of how many items were serialized, the field names that were used, and the bytes.
+    """
+    items = list(items)
+    if fmt == 'jsonl':
+        text = ''.join([_JSON_ENCODER.encode(item) + '\n' for item in items])
+    elif fmt == 'csv':
+        buffer = io.StringIO()
+        if items and isinstance(items[0], dict):
+            fieldnames = fieldnames if fieldnames is not None else list(items[0])
+            csv.DictWriter(buffer, fieldnames).writerows(items)
+        else:
+            csv.writer(buffer).writerows(items)
+        text = buffer.getvalue()
+    else:
+        text = ''.join([str(item) + '\n' for item in items])
+    return EncodedBatch(len(items), fieldnames, text.encode(encoding))
+
+
+def write(path, encoding, fmt, fieldnames, encoded_batches, append=False):
+    """
+    Writes the batches serialized by `encode` to the file with large buffered writes.  The CSV header is written before the first batch, unless the file is appended to.
+
+    :param path: The path of the file.
+    :param encoding: The encoding the batches were encoded with.
+    :param fmt: The same as the `fmt` of `encode`.
+    :param fieldnames: The field names the batches were encoded with, or None.
+    :param encoded_batches: An iterable of `EncodedBatch`s.
+    :param append: Keyword.  If `True`, the file is appended to instead of overwritten.
+    :return: How many items were written.
+    """
+    count = 0
+    header = fieldnames
+    with open(path, 'ab' if append else 'wb', buffering=WRITE_BUFFER_SIZE) as output_file:
+        if fmt == 'csv' and header is not None and not append:
+            output_file.write(_encode_header(header, encoding))
+        for batch in encoded_batches:
+            if fmt == 'csv' and batch.fieldnames is not None and batch.fieldnames != header:
+                if header is not None:
+                    raise ValueError('the rows have different fields, so fieldnames must be specified')
+                header = batch.fieldnames
+                if not append:
+                    output_file.write(_encode_header(header, encoding))
+            output_file.write(batch.data)
+            count += batch.count
+    return count
+
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError('fmt must be one of {}'.format(', '.join(repr(known_format) for known_format in FORMATS)))
+
+
+def _read_lines(path, encoding, byte_range):
+    start, end = byte_range
+    with open(path, 'rb') as mapped_file, mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        # the line that is cut by the start of the range belongs to the previous range
+        position = mapped.find(b'\n', start - 1) + 1 if start > 0 else 0
+        if position == 0 and start > 0 or position >= end:
+            return []
+
+        # the last line is the one that contains the last byte of the range
+        region_end = mapped.find(b'\n', end - 1)
+        if region_end == -1:
+            region_end = len(mapped)
+
+        text = mapped[position:region_end].decode(encoding)
+
+    lines = text.split('\n')
+    if '\r' in text:
+        lines = [line[:-1] if line.endswith('\r') else line for line in lines]
+    return lines
+
+
+def _encode_header(fieldnames, encoding):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(fieldnames)
+    return buffer.getvalue().encode(encoding)
@@ -1,13 +1,54 @@
 import itertools
 import functools
 import collections
+import asyncio
+import heapq
+import inspect
+import operator
+from iterator_chain import aggregates
+from iterator_chain import pool
+from iterator_chain import blocks
+from iterator_chain import bloom
+from iterator_chain import caching
+from iterator_chain import files
+from iterator_chain import spill
+from iterator_chain.caching import record_lineage
+from iterator_chain.profiling import profile_chain_method
+from iterator_chain.profiling import profile_terminal_method
+
+
+_DEFAULT_CONCURRENCY = 100
+_DEFAULT_DISTINCT_MAX_MEMORY = 1000000
+_DEFAULT_DISTINCT_CAPACITY = 1000000
+_DEFAULT_DISTINCT_ERROR_RATE = 0.001
+
+_FLATTEN_NOTHING = 'nothing'
+_FLATTEN_DICT = 'dict'
+_FLATTEN_ITERABLE = 'iterable'
+
+_JOIN_HOWS = ('inner', 'left', 'right', 'outer')
+_JOIN_BUILDS = (None, 'left', 'right')
+
+_SortSpec = collections.namedtuple('_SortSpec', ['unsorted_chain', 'sorted_iterator', 'key', 'cmp', 'reverse'])
 
 
 class _IntermediateIteratorChain:
-    def __init__(self, iterator):
+    def __init__(self, iterator, profiler=None, batched=False, lineage=()):
         self._iterator = iterator
+        self._profiler = profiler
+        self._batched = batched
+        self._lineage = lineage
+        self._sort_spec = None
+
+    def _chain(self, iterator):
+        return _IntermediateIteratorChain(iterator, profiler=self._profiler, batched=self._batched, lineage=self._lineage)
+
+    def _profile_output(self, stage):
+        self._iterator = self._profiler._wrap_output(self._iterator, stage)
 
     # Chain methods
+    @record_lineage
+    @profile_chain_method()
     def map(self, function):
         """
         Will run the `function` across all the elements in the iterator.
@@ -16,8 +57,10 @@ class _IntermediateIteratorChain:
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
         iterator = map(function, self._iterator)
-        return _IntermediateIteratorChain(iterator)
+        return self._chain(iterator)
 
+    @record_lineage
+    @profile_chain_method()
     def filter(self, function):
         """
         Will run the `function` on every element.  `function` should return a truthy or falsy value.  On true, the element will stay; on false, the element will be removed.
@@ -26,8 +69,55 @@ class _IntermediateIteratorChain:
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
         iterator = filter(function, self._iterator)
-        return _IntermediateIteratorChain(iterator)
+        return self._chain(iterator)
 
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    def amap(self, function, concurrency=None):
+        """
+        Will await the coroutine returned by `function` for every element.  Up to `concurrency` coroutines run at the same time, but the results stay in the same order as the elements.
+
+        :param function: A coroutine function that takes a single argument.
+        :param concurrency: Keyword.  The maximum number of coroutines to run at the same time.  If unspecified or None, 100 coroutines are allowed.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = (result for _, result in self._await_each(function, concurrency))
+        return self._chain(iterator)
+
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    def afilter(self, function, concurrency=None):
+        """
+        Will await the coroutine returned by `function` for every element.  The coroutine should return a truthy or falsy value.  On true, the element will stay; on false, the element will be removed.  Up to `concurrency` coroutines run at the same time.
+
+        :param function: A coroutine function that takes a single argument.
+        :param concurrency: Keyword.  The maximum number of coroutines to run at the same time.  If unspecified or None, 100 coroutines are allowed.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = (item for item, result in self._await_each(function, concurrency) if result)
+        return self._chain(iterator)
+
+    def _await_each(self, function, concurrency):
+        event_loop = pool.shared_event_loop()
+        concurrency = concurrency or _DEFAULT_CONCURRENCY
+        in_flight = collections.deque()
+
+        try:
+            for item in self._iterator:
+                in_flight.append((item, asyncio.run_coroutine_threadsafe(function(item), event_loop)))
+                if len(in_flight) >= concurrency:
+                    item, future = in_flight.popleft()
+                    yield item, future.result()
+
+            while in_flight:
+                item, future = in_flight.popleft()
+                yield item, future.result()
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    @record_lineage
+    @profile_chain_method()
     def skip(self, number):
         """
         The `number` number of elements will be skipped over and effectively removed.
@@ -36,26 +126,62 @@ class _IntermediateIteratorChain:
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
         iterator = self._skip(number)
-        return _IntermediateIteratorChain(iterator)
+        return self._chain(iterator)
 
     def _skip(self, number):
         return itertools.islice(self._iterator, number, None)
 
-    def distinct(self):
+    @record_lineage
+    @profile_chain_method()
+    def distinct(self, key=None, mode='exact', max_memory=None, capacity=None, error_rate=None):
         """
-        Any duplicates will be removed.
+        Any duplicates will be removed.  Every distinct element is remembered, so use `key` to only remember something smaller, like an ID, and `mode` to bound the memory that is used.
 
+        :param key: Keyword.  A function of one argument that returns what is compared to find the duplicates.  The first element with each key is kept.  If unspecified or None, the elements themselves are compared.
+        :param mode: Keyword.  `'exact'` remembers every key in memory.  `'disk'` moves the remembered keys to a temporary database every time `max_memory` of them are in memory, so the keys must also be picklable.  `'approximate'` remembers the keys in a Bloom filter that uses a fixed amount of memory, but wrongly removes up to `error_rate` of the distinct elements while at most `capacity` keys have been seen.  Beyond `capacity`, far more of them are removed the more keys are seen.  Defaults to `'exact'`.
+        :param max_memory: Keyword.  The maximum number of keys to hold in memory in `'disk'` mode.  If unspecified or None, 1,000,000 keys are held.
+        :param capacity: Keyword.  How many distinct keys are expected in `'approximate'` mode.  If unspecified or None, 1,000,000 keys are expected.
+        :param error_rate: Keyword.  The acceptable rate of wrongly removed elements in `'approximate'` mode.  If unspecified or None, 0.001 is used.
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
-        iterator = self._distinct()
-        return _IntermediateIteratorChain(iterator)
-
-    def _distinct(self):
+        iterator = self._distinct(key=key, mode=mode, max_memory=max_memory, capacity=capacity, error_rate=error_rate)
+        return self._chain(iterator)
+
+    def _distinct(self, key=None, mode='exact', max_memory=None, capacity=None, error_rate=None):
+        if mode == 'exact':
+            return self._distinct_in_memory(key)
+        elif mode == 'approximate':
+            seen = bloom.BloomFilter(capacity or _DEFAULT_DISTINCT_CAPACITY, error_rate or _DEFAULT_DISTINCT_ERROR_RATE)
+            return self._distinct_in(seen, key)
+        elif mode == 'disk':
+            seen = spill.SpilledSet(max_memory or _DEFAULT_DISTINCT_MAX_MEMORY)
+            return self._distinct_in_spilled(seen, key)
+        raise ValueError("mode must be 'exact', 'approximate', or 'disk'")
+
+    def _distinct_in_memory(self, key):
         seen = set()
-        for item in itertools.filterfalse(seen.__contains__, self._iterator):
-            seen.add(item)
-            yield item
+        if key is None:
+            for item in itertools.filterfalse(seen.__contains__, self._iterator):
+                seen.add(item)
+                yield item
+        else:
+            for item in self._iterator:
+                item_key = key(item)
+                if item_key not in seen:
+                    seen.add(item_key)
+                    yield item
 
+    def _distinct_in(self, seen, key):
+        for item in self._iterator:
+            if seen.add(item if key is None else key(item)):
+                yield item
+
+    def _distinct_in_spilled(self, seen, key):
+        with seen:
+            yield from self._distinct_in(seen, key)
+
+    @record_lineage
+    @profile_chain_method()
     def limit(self, max_size):
         """
         The iterator will stop after `max_size` elements.  Any elements afterward are effectively removed.
@@ -64,56 +190,126 @@ class _IntermediateIteratorChain:
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
         iterator = self._limit(max_size)
-        return _IntermediateIteratorChain(iterator)
+        return self._chain(iterator)
 
     def _limit(self, max_size):
+        sort_spec = self._sort_spec
+        if sort_spec is not None and isinstance(max_size, int) and max_size >= 0 \
+                and inspect.getgeneratorstate(sort_spec.sorted_iterator) == inspect.GEN_CREATED:
+            # a sort followed by a limit only needs to keep the elements that make it past the limit, and anything that
+            # isn't a size, like None, is left to islice to accept or reject
+            return sort_spec.unsorted_chain._select(max_size, key=sort_spec.key, cmp=sort_spec.cmp, largest=sort_spec.reverse)
         return itertools.islice(self._iterator, max_size)
 
-    @staticmethod
-    def _is_dict(something):
-        return isinstance(something, dict)
+    @record_lineage
+    @profile_chain_method()
+    def top(self, k, key=None):
+        """
+        Keeps only the `k` largest elements, from largest to smallest.  This is the same as `.sort(key=key, reverse=True).limit(k)`, but only `k` elements are held in memory at once.
 
-    @staticmethod
-    def _is_iterable(something):
-        return not isinstance(something, str) and not isinstance(something, dict) and isinstance(something, collections.abc.Iterable)
+        :param k: An integer.
+        :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = self._select(k, key=key, largest=True)
+        return self._chain(iterator)
 
-    def _flatten(self, iterable, force_stop=False):
-        for item in iterable:
-            if force_stop:
-                yield item
-            elif self._is_dict(item):
-                yield from self._flatten(item.items(), force_stop=True)
-            elif self._is_iterable(item):
-                yield from self._flatten(item)
+    @record_lineage
+    @profile_chain_method()
+    def bottom(self, k, key=None):
+        """
+        Keeps only the `k` smallest elements, from smallest to largest.  This is the same as `.sort(key=key).limit(k)`, but only `k` elements are held in memory at once.
+
+        :param k: An integer.
+        :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = self._select(k, key=key, largest=False)
+        return self._chain(iterator)
+
+    def _select(self, k, key=None, cmp=None, largest=False):
+        if key is None and cmp is not None:
+            key = functools.cmp_to_key(cmp)
+        select = heapq.nlargest if largest else heapq.nsmallest
+        yield from select(k, self._iterator, key=key)
+
+    @staticmethod
+    def _flatten_kind(item_type):
+        if issubclass(item_type, dict):
+            return _FLATTEN_DICT
+        elif issubclass(item_type, str) or not issubclass(item_type, collections.abc.Iterable):
+            return _FLATTEN_NOTHING
+        return _FLATTEN_ITERABLE
+
+    def _flatten(self, iterable, depth=None):
+        # checking against the Iterable ABC is slow, so it's only done once per type
+        kinds = {}
+        iterators = [iter(iterable)]
+        while iterators:
+            for item in iterators[-1]:
+                item_type = type(item)
+                kind = kinds.get(item_type)
+                if kind is None:
+                    kind = kinds[item_type] = self._flatten_kind(item_type)
+
+                if kind is _FLATTEN_NOTHING or (depth is not None and len(iterators) > depth):
+                    yield item
+                elif kind is _FLATTEN_DICT:
+                    yield from item.items()
+                else:
+                    # walk into the item and come back to the rest of this iterator once the item is exhausted
+                    iterators.append(iter(item))
+                    break
             else:
-                yield item
+                iterators.pop()
 
-    def flatten(self):
+    @record_lineage
+    @profile_chain_method()
+    def flatten(self, depth=None):
         """
         Any element that is an iterable itself will have its elements iterated over first before continuing with the remaining elements.  Strings (`str`) do not count as an iterable for this method.  Dictionaries flatten to its item tuples.
 
+        :param depth: Keyword.  How many levels of nested iterables to flatten.  Any iterables nested deeper are left as they are.  If unspecified or None, every level is flattened.
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
-        iterator = self._flatten(self._iterator)
-        return _IntermediateIteratorChain(iterator)
+        iterator = self._flatten(self._iterator, depth=depth)
+        return self._unbatched_chain(iterator)
 
-    def sort(self, key=None, cmp=None, reverse=False):
+    @record_lineage
+    @profile_chain_method()
+    def sort(self, key=None, cmp=None, reverse=False, max_memory=None):
         """
-        Sorts the iterator based on the elements' values.  Use `key` or `cmp` to make a custom comparison.  If `key` is specified, `cmp` cannot be used.  This method is expensive because it must serialize all the values into a sequence.
+        Sorts the iterator based on the elements' values.  Use `key` or `cmp` to make a custom comparison.  If `key` is specified, `cmp` cannot be used.  This method is expensive because it must serialize all the values into a sequence, unless `max_memory` is specified.  When it is directly followed by `limit`, only the elements that make it past the limit are kept, like `top` and `bottom` do.
 
         :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
         :param cmp: Keyword.  A Python 2.x "cmp" function that takes two arguments.
         :param reverse: Keyword.  If set to `True`, the elements will be sorted in the reverse order.
+        :param max_memory: Keyword.  The maximum number of elements to hold in memory at once.  If there are more elements, they are sorted in runs of `max_memory` elements that are pickled to temporary files and merged back together as the sorted elements are requested.  The elements must then be picklable.  If unspecified or None, all the elements are sorted in memory.
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
-        iterator = self._sort(key=key, cmp=cmp, reverse=reverse)
-        return _IntermediateIteratorChain(iterator)
+        iterator = self._sort(key=key, cmp=cmp, reverse=reverse, max_memory=max_memory)
+        return self._sorted_chain(iterator, key, cmp, reverse)
 
-    def _sort(self, key=None, cmp=None, reverse=False):
+    def _sorted_chain(self, iterator, key, cmp, reverse):
+        chain = self._chain(iterator)
+        chain._sort_spec = _SortSpec(self, iterator, key, cmp, reverse)
+        return chain
+
+    def _sort(self, key=None, cmp=None, reverse=False, max_memory=None):
         if key is None and cmp is not None:
             key = functools.cmp_to_key(cmp)
-        return iter(sorted(self._iterator, key=key, reverse=reverse))
+        if max_memory is not None and max_memory < 1:
+            raise ValueError('max_memory must be at least 1')
+        return self._sort_lazily(key, reverse, max_memory)
+
+    def _sort_lazily(self, key, reverse, max_memory):
+        if max_memory is None:
+            yield from sorted(self._iterator, key=key, reverse=reverse)
+        else:
+            yield from spill.external_sort(self._iterator, key=key, reverse=reverse, max_memory=max_memory)
 
+    @record_lineage
+    @profile_chain_method()
     def reverse(self):
         """
         Reverses the iterator.  The last item will be first, and the first item will be last.  This method is expensive because it must serialize all the values into a list.
@@ -121,13 +317,310 @@ class _IntermediateIteratorChain:
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
         iterator = self._reverse()
-        return _IntermediateIteratorChain(iterator)
+        return self._chain(iterator)
 
     def _reverse(self):
         forward = list(self._iterator)
         return reversed(forward)
 
+    @record_lineage
+    @profile_chain_method()
+    def chunked(self, size):
+        """
+        Groups the elements into lists of `size` elements.  Unlike `batch`, the lists are ordinary elements, so the following methods, including the terminating methods, see the lists themselves.
+
+        :param size: An integer.  The last list may have fewer elements.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        iterator = blocks.batches(self._iterator, size)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    def sliding_window(self, size, step=1):
+        """
+        Turns the elements into tuples of `size` consecutive elements.  Each window starts `step` elements after the previous one.  The windows are taken from a ring buffer, so each element is only held until it leaves the window.  If there are fewer than `size` elements, there are no windows, and elements after the last full window are left out.
+
+        :param size: An integer.
+        :param step: Keyword.  An integer.  Defaults to 1.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        if step < 1:
+            raise ValueError('step must be at least 1')
+        iterator = self._sliding_window(size, step)
+        return self._unbatched_chain(iterator)
+
+    def _sliding_window(self, size, step):
+        iterator = self._iterator
+        window = collections.deque(itertools.islice(iterator, size), maxlen=size)
+        if len(window) < size:
+            return
+        yield tuple(window)
+
+        if step == 1:
+            for item in iterator:
+                window.append(item)
+                yield tuple(window)
+            return
+
+        pending = 0
+        for item in iterator:
+            window.append(item)
+            pending += 1
+            if pending == step:
+                yield tuple(window)
+                pending = 0
+
+    @record_lineage
+    @profile_chain_method()
+    def window_by(self, key, size):
+        """
+        Groups the elements into tumbling windows of `size`, like windows of time.  The window of an element is the multiple of `size` that its key is at or past.  Elements are expected in the order of their keys, so a window ends as soon as an element's key falls in a different window.  The elements become tuples of the start of a window and a list of its elements.
+
+        :param key: A function that takes an element and returns a number, like a timestamp.
+        :param size: A positive number in the same units as the keys.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        if size <= 0:
+            raise ValueError('size must be positive')
+        iterator = self._window_by(key, size)
+        return self._unbatched_chain(iterator)
+
+    def _window_by(self, key, size):
+        window_start, window = None, []
+        for item in self._iterator:
+            item_key = key(item)
+            item_window_start = item_key - item_key % size
+            if item_window_start != window_start and window:
+                yield window_start, window
+                window = []
+            window_start = item_window_start
+            window.append(item)
+        if window:
+            yield window_start, window
+
+    @record_lineage
+    @profile_chain_method()
+    def group_by(self, key):
+        """
+        Groups the elements by their key in a single pass over the iterator.  The elements become tuples of a key and a list of the elements with that key, in the order the keys were first found.  This method is expensive because it must hold every element in memory.  Use `count_by` or `aggregate_by` when only a summary of each group is needed.
+
+        :param key: A function that takes an element and returns its hashable key.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = self._group_by(key)
+        return self._unbatched_chain(iterator)
+
+    def _group_by(self, key):
+        groups = collections.defaultdict(list)
+        for item in self._iterator:
+            groups[key(item)].append(item)
+        yield from groups.items()
+
+    @record_lineage
+    @profile_chain_method()
+    def count_by(self, key):
+        """
+        Counts the elements with each key in a single pass over the iterator.  The elements become tuples of a key and how many elements have that key, in the order the keys were first found.  Only the counts are held in memory.
+
+        :param key: A function that takes an element and returns its hashable key.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = self._count_by(key)
+        return self._unbatched_chain(iterator)
+
+    def _count_by(self, key):
+        yield from collections.Counter(map(key, self._iterator)).items()
+
+    @record_lineage
+    @profile_chain_method()
+    def aggregate_by(self, key, seed, combine):
+        """
+        Aggregates the elements with each key in a single pass over the iterator, like `reduce` does for all the elements.  The elements become tuples of a key and the aggregate of the elements with that key, in the order the keys were first found.  Only the aggregates are held in memory.
+
+        :param key: A function that takes an element and returns its hashable key.
+        :param seed: The aggregate of a key before any of its elements are combined into it.  It is used for every key, so `combine` should return a new aggregate instead of modifying it.
+        :param combine: A function that takes the aggregate so far and an element, and returns the new aggregate.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = self._aggregate_by(key, seed, combine)
+        return self._unbatched_chain(iterator)
+
+    def _aggregate_by(self, key, seed, combine):
+        yield from _aggregate_items(key, seed, combine, self._iterator).items()
+
+    @record_lineage
+    @profile_chain_method()
+    def join(self, other, left_key, right_key=None, how='inner', build=None):
+        """
+        Joins the elements with the elements of another chain that have the same key.  The elements become tuples of an element of this chain and an element of the other chain.  A hash table is built from one side, and the other side is streamed through it, so only the build side is held in memory.
+
+        :param other: Another chain, or any iterable.
+        :param left_key: A function that takes an element of this chain and returns its hashable key.
+        :param right_key: Keyword.  A function that takes an element of the other chain and returns its hashable key.  If unspecified or None, `left_key` is used.
+        :param how: Keyword.  `'inner'` to only keep the elements that have a match, `'left'` to also keep the elements of this chain that don't, `'right'` to also keep the elements of the other chain that don't, or `'outer'` to keep both.  An element without a match is paired with None.  Defaults to `'inner'`.
+        :param build: Keyword.  `'left'` to build the hash table from this chain, or `'right'` to build it from the other chain.  The elements come out in the order of the streamed side.  If unspecified or None, the side that is known to be smaller is used, or the other chain if the sizes aren't known.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        _check_join(how, build)
+        iterator = self._hash_join(other, left_key, right_key or left_key, how, build)
+        return self._unbatched_chain(iterator)
+
+    def _hash_join(self, other, left_key, right_key, how, build):
+        left, right = self._iterator, _iterate(other)
+        if build is None:
+            build = 'left' if 0 < operator.length_hint(left) < operator.length_hint(right) else 'right'
+
+        keep_left, keep_right = how in ('left', 'outer'), how in ('right', 'outer')
+        if build == 'right':
+            yield from _probe(left, right, left_key, right_key, keep_left, keep_right)
+        else:
+            yield from ((left_item, right_item) for right_item, left_item in _probe(right, left, right_key, left_key, keep_right, keep_left))
+
+    @record_lineage
+    @profile_chain_method()
+    def merge_join(self, other, left_key, right_key=None, how='inner'):
+        """
+        Joins the elements with the elements of another chain that have the same key, like `join`, when both chains are already sorted by their keys from smallest to largest.  Both sides are streamed, so only the elements of the other chain that share the current key are held in memory.
+
+        :param other: Another chain, or any iterable.
+        :param left_key: A function that takes an element of this chain and returns its key.
+        :param right_key: Keyword.  A function that takes an element of the other chain and returns its key.  If unspecified or None, `left_key` is used.
+        :param how: Keyword.  The same as the `how` of `join`.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        _check_join(how, None)
+        iterator = self._merge_join(other, left_key, right_key or left_key, how)
+        return self._unbatched_chain(iterator)
+
+    def _merge_join(self, other, left_key, right_key, how):
+        keep_left, keep_right = how in ('left', 'outer'), how in ('right', 'outer')
+        left_groups = itertools.groupby(self._iterator, left_key)
+        right_groups = itertools.groupby(_iterate(other), right_key)
+        left_group, right_group = next(left_groups, None), next(right_groups, None)
+
+        while left_group is not None and right_group is not None:
+            (left_group_key, left_items), (right_group_key, right_items) = left_group, right_group
+            if left_group_key < right_group_key:
+                if keep_left:
+                    yield from zip(left_items, itertools.repeat(None))
+                left_group = next(left_groups, None)
+            elif right_group_key < left_group_key:
+                if keep_right:
+                    yield from zip(itertools.repeat(None), right_items)
+                right_group = next(right_groups, None)
+            else:
+                right_items = list(right_items)
+                for left_item in left_items:
+                    for right_item in right_items:
+                        yield left_item, right_item
+                left_group, right_group = next(left_groups, None), next(right_groups, None)
+
+        if keep_left and left_group is not None:
+            yield from zip(left_group[1], itertools.repeat(None))
+            for _, left_items in left_groups:
+                yield from zip(left_items, itertools.repeat(None))
+        if keep_right and right_group is not None:
+            yield from zip(itertools.repeat(None), right_group[1])
+            for _, right_items in right_groups:
+                yield from zip(itertools.repeat(None), right_items)
+
+    @record_lineage
+    @profile_chain_method()
+    def zip_with(self, other):
+        """
+        Pairs every element with the element of another chain at the same position.  The elements become tuples of an element of this chain and an element of the other chain.  The chain stops once either side runs out of elements.
+
+        :param other: Another chain, or any iterable.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = self._zip_with(other)
+        return self._unbatched_chain(iterator)
+
+    def _zip_with(self, other):
+        yield from zip(self._iterator, _iterate(other))
+
+    @record_lineage
+    @profile_chain_method()
+    def cache(self, storage='memory', path=None, key=None):
+        """
+        Caches the elements the first time the chain is iterated, so a later chain with the same methods and functions replays them instead of executing the methods again.  The cache is found by a fingerprint of the data the chain started from and of every method called since, including the code, defaults, and closures of the functions supplied to them, so changing any of them makes a new cache.  The values of the other globals they read are fingerprinted too, but the global functions and modules they use are only fingerprinted by their name.  The elements are only cached once the chain is iterated to its end.
+
+        :param storage: Keyword.  `'memory'` to cache the elements in a `list` in this process, where only the 64 most recently used chains are kept, or `'disk'` to cache them in a file of pickled batches of elements, which is read back a batch at a time.  If unspecified, `'memory'` is used.
+        :param path: Keyword.  The directory of the `'disk'` cache.  If unspecified or None, an `iterator-chain` directory in the user's cache directory, `$XDG_CACHE_HOME` or `~/.cache`, is used.
+        :param key: Keyword.  Anything picklable that identifies the data the chain started from, which is then fingerprinted in its place.  It is required when the chain did not start from a `list`, `tuple`, `range`, `str`, `bytes`, `dict`, `set`, or file, like when it started from a generator, because there is no way to tell what else it would produce.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        if storage not in caching.STORAGES:
+            raise ValueError("storage must be 'memory' or 'disk'")
+        fingerprint = caching.fingerprint(self._lineage, key=key)
+        iterator = self._cache(storage, path, fingerprint)
+        return self._chain(iterator)
+
+    def _cache(self, storage, path, fingerprint):
+        replayed = caching.replay(storage, path, fingerprint)
+        if replayed is not None:
+            # the previous methods are never iterated, so none of their work is done again
+            yield from replayed
+        else:
+            yield from caching.record(storage, path, fingerprint, self._iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    def batch(self, size, array=False):
+        """
+        Groups the elements into blocks of `size` elements.  From then on, the chaining methods see the blocks as the elements, until `unbatch` or `flatten` is called.  `count`, `sum`, `min`, and `max` still count and compare the elements inside the blocks, using NumPy's vectorized methods when the blocks are arrays.
+
+        :param size: An integer.  The last block may have fewer elements.
+        :param array: Keyword.  If set to `True`, the blocks are one-dimensional NumPy arrays instead of lists.  NumPy must be installed.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        if array:
+            blocks.require_numpy()
+        iterator = blocks.batches(self._iterator, size, array=array)
+        return self._batched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    def map_batches(self, function):
+        """
+        Will run the `function` on every block of elements.  If `batch` hasn't been called, the elements are first grouped into lists of 1024 elements.
+
+        :param function: A function that takes a block and returns a new block.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        batched_chain = self if self._batched else self.batch(blocks.DEFAULT_SIZE)
+        return batched_chain.map(function)
+
+    @record_lineage
+    @profile_chain_method()
+    def unbatch(self):
+        """
+        Turns the blocks back into their elements.  The elements of NumPy arrays are converted to Python objects.
+
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        iterator = blocks.unbatch(self._iterator)
+        return self._unbatched_chain(iterator)
+
+    def _batched_chain(self, iterator):
+        chain = self._chain(iterator)
+        chain._batched = True
+        return chain
+
+    def _unbatched_chain(self, iterator):
+        chain = self._chain(iterator)
+        chain._batched = False
+        return chain
+
     # Termination methods
+    @profile_terminal_method()
     def list(self):
         """
         Serializes the iterator chain into a `list` and returns it.
@@ -136,14 +629,18 @@ class _IntermediateIteratorChain:
         """
         return list(self._iterator)
 
+    @profile_terminal_method()
     def count(self):
         """
         Returns the number of elements in the iterator
 
         :return: An integer.
         """
+        if self._batched:
+            return blocks.count(self._iterator)
         return sum(1 for _ in self._iterator)
 
+    @profile_terminal_method()
     def first(self, default=None):
         """
         Returns just the first item in the iterator.  If the iterator is empty, the `default` is returned.
@@ -153,6 +650,7 @@ class _IntermediateIteratorChain:
         """
         return next(itertools.islice(self._iterator, 1), default)
 
+    @profile_terminal_method()
     def last(self, default=None):
         """
          Returns just the last item in the iterator.  If the iterator is empty, the `default` is returned.
@@ -166,6 +664,7 @@ class _IntermediateIteratorChain:
             end = default
         return end
 
+    @profile_terminal_method()
     def max(self, default=None):
         """
         Returns the largest valued element in the iterator.  If the iterator is empty, the `default` is returned.
@@ -173,8 +672,11 @@ class _IntermediateIteratorChain:
         :param default: Keyword.  Any value.
         :return: The largest element.
         """
+        if self._batched:
+            return max(blocks.maximums(self._iterator), default=default)
         return max(self._iterator, default=default)
 
+    @profile_terminal_method()
     def min(self, default=None):
         """
         Returns the smallest valued element in the iterator.  If the iterator is empty, the `default` is returned.
@@ -182,8 +684,11 @@ class _IntermediateIteratorChain:
         :param default: Keyword.  Any value.
         :return: The smallest element.
         """
+        if self._batched:
+            return min(blocks.minimums(self._iterator), default=default)
         return min(self._iterator, default=default)
 
+    @profile_terminal_method()
     def sum(self, default=None):
         """
         Sums all the elements in the iterator together.  If any of the elements are un-summable, the `default` is returned.
@@ -192,11 +697,12 @@ class _IntermediateIteratorChain:
         :return: The sum of all the elements.
         """
         try:
-            total = sum(self._iterator)
+            total = blocks.total(self._iterator) if self._batched else sum(self._iterator)
         except TypeError:
             total = default
         return total
 
+    @profile_terminal_method()
     def reduce(self, function, initial=None):
         """
         Applies the function to two elements in the iterator cumulatively.  Subsequent calls to `function` uses the previous return value from `function` as the first argument and the next element in the iterator as the second argument.  The final value is returned.  If `initial` is present, it is placed before the items of the sequence in the calculation, and serves as a default when the sequence is empty.
@@ -210,6 +716,51 @@ class _IntermediateIteratorChain:
         else:
             return functools.reduce(function, self._iterator, initial)
 
+    @profile_terminal_method()
+    def aggregate(self, **specs):
+        """
+        Computes several aggregates of the elements in a single pass over the iterator, so an expensive chain doesn't need to be executed once per aggregate.  The elements are aggregated a batch at a time.
+
+        :param specs: Keywords.  The name of each aggregate and either the name of a built-in aggregate, which is one of `'count'`, `'sum'`, `'min'`, `'max'`, `'first'`, `'last'`, or `'mean'`, or a tuple of an initial value and a function that takes the aggregate so far and an element and returns the new aggregate.  The tuple may also have a third function, which parallel chains use to combine the aggregates of their chunks.  `'min'`, `'max'`, `'first'`, `'last'`, and `'mean'` are None when the iterator is empty.
+        :return: A `dict` of the name of each aggregate to its value.
+        """
+        resolved = aggregates.resolve(specs)
+        return aggregates.finish(resolved, self._aggregate(resolved))
+
+    @profile_terminal_method()
+    def fan_out(self, *specs):
+        """
+        The same as `aggregate`, but the aggregates are specified by their position instead of their name.
+
+        :param specs: Any number of the values of the keywords of `aggregate`.
+        :return: A tuple of the value of each aggregate, in the same order as `specs`.
+        """
+        resolved = aggregates.resolve(dict(enumerate(specs)))
+        values = aggregates.finish(resolved, self._aggregate(resolved))
+        return tuple(values[index] for index in range(len(specs)))
+
+    def _aggregate(self, resolved):
+        batches = self._iterator if self._batched else blocks.batches(self._iterator, blocks.DEFAULT_SIZE)
+        return aggregates.compute(resolved, batches)
+
+    def tee(self, n=2, buffer_size=None):
+        """
+        Splits the chain into `n` independent chains that each see every element, so one expensive chain can feed several chains.  The elements are only held until every chain has moved past them, so little is held when the chains are consumed at similar rates.  This chain should not be used afterward.
+
+        :param n: Keyword.  How many chains to split into.  Defaults to 2.
+        :param buffer_size: Keyword.  The most elements a chain may get ahead of the slowest chain.  If a chain gets further ahead, `BufferError` is raised instead of holding more elements.  If unspecified or None, there is no limit.
+        :return: A tuple of the intermediate objects that subsequent chaining and terminating methods can be called on.
+        """
+        if buffer_size is not None and buffer_size < 1:
+            raise ValueError('buffer_size must be at least 1')
+
+        iterators = itertools.tee(self._iterator, n)
+        if buffer_size is not None:
+            positions = [0] * n
+            iterators = [_bounded_tee(iterator, index, positions, buffer_size) for index, iterator in enumerate(iterators)]
+        return tuple(self._chain(iterator) for iterator in iterators)
+
+    @profile_terminal_method()
     def for_each(self, function):
         """
         Executes `function` on every element in the iterator.  There is no return value.  If you are wanting to return a list of values based on the function, use `.map(function).list()`.
@@ -219,6 +770,50 @@ class _IntermediateIteratorChain:
         for item in self._iterator:
             function(item)
 
+    @profile_terminal_method()
+    def to_file(self, path, encoding='utf-8', append=False):
+        """
+        Writes every element in the iterator to the file as a line of its `str`.  The elements are serialized in batches and written with large buffered writes.
+
+        :param path: The path of the file.
+        :param encoding: Keyword.  The encoding of the file.  Defaults to `'utf-8'`.
+        :param append: Keyword.  If set to `True`, the file is appended to instead of overwritten.
+        :return: The number of elements written.
+        """
+        return self._write_file(path, None, encoding, None, append)
+
+    @profile_terminal_method()
+    def to_jsonl(self, path, encoding='utf-8', append=False):
+        """
+        Writes every element in the iterator to the file as a line of JSON.  The elements are serialized in batches and written with large buffered writes.
+
+        :param path: The path of the file.
+        :param encoding: Keyword.  The encoding of the file.  Defaults to `'utf-8'`.
+        :param append: Keyword.  If set to `True`, the file is appended to instead of overwritten.
+        :return: The number of elements written.
+        """
+        return self._write_file(path, 'jsonl', encoding, None, append)
+
+    @profile_terminal_method()
+    def to_csv(self, path, fieldnames=None, encoding='utf-8', append=False):
+        """
+        Writes every element in the iterator to the file as a CSV row.  `dict` elements are written by their keys, and any other element is written as a sequence of values.  The elements are serialized in batches and written with large buffered writes.
+
+        :param path: The path of the file.
+        :param fieldnames: Keyword.  A list of the fields, which is written as the header.  If unspecified or None, the keys of the first `dict` in each batch are used, so they must be the same for every batch, and sequences are written without a header.
+        :param encoding: Keyword.  The encoding of the file.  Defaults to `'utf-8'`.
+        :param append: Keyword.  If set to `True`, the file is appended to instead of overwritten, and no header is written.
+        :return: The number of elements written.
+        """
+        return self._write_file(path, 'csv', encoding, fieldnames, append)
+
+    def _write_file(self, path, fmt, encoding, fieldnames, append):
+        iterator = blocks.unbatch(self._iterator) if self._batched else self._iterator
+        batches = blocks.batches(iterator, blocks.DEFAULT_SIZE)
+        encoded_batches = (files.encode(fmt, encoding, fieldnames, batch) for batch in batches)
+        return files.write(path, encoding, fmt, fieldnames, encoded_batches, append=append)
+
+    @profile_terminal_method()
     def all_match(self, function):
         """
         Returns `True` only if all the elements return `True` after applying the `function` to them.  Else returns `False`.
@@ -228,6 +823,7 @@ class _IntermediateIteratorChain:
         """
         return all(map(function, self._iterator))
 
+    @profile_terminal_method()
     def any_match(self, function):
         """
         Returns `True` if just one element return `True` after applying the `function` to it.  If all elements result in `False`, `False` is returned.
@@ -237,6 +833,7 @@ class _IntermediateIteratorChain:
         """
         return any(map(function, self._iterator))
 
+    @profile_terminal_method()
     def none_match(self, function):
         """
         Returns `True` only if all the elements return `False` after applying the `function` to them.  Else returns `True`.
@@ -245,3 +842,78 @@ class _IntermediateIteratorChain:
         :return: True or False
         """
         return not self.any_match(function)
+
+
+def _aggregate_items(key, seed, combine, items):
+    """
+    Can run in the execution unit.  Aggregates the items with each key.
+
+    :return: A `dict` of every key to its aggregate.
+    """
+    aggregates = {}
+    for item in items:
+        item_key = key(item)
+        aggregates[item_key] = combine(aggregates.get(item_key, seed), item)
+    return aggregates
+
+
+def _iterate(other):
+    """
+    :param other: A chain, or any iterable.
+    :return: An iterator of the elements of the chain or iterable.
+    """
+    if isinstance(other, _IntermediateIteratorChain):
+        return other._iterator
+    return iter(other)
+
+
+def _check_join(how, build):
+    if how not in _JOIN_HOWS:
+        raise ValueError('how must be one of {}'.format(', '.join(repr(join_how) for join_how in _JOIN_HOWS)))
+    if build not in _JOIN_BUILDS:
+        raise ValueError("build must be 'left', 'right', or None")
+
+
+def _probe(probe, build, probe_key, build_key, keep_probe, keep_build):
+    """
+    A generator that builds a hash table from the `build` items and streams the `probe` items through it.
+
+    :param keep_probe: Whether to keep the probe items that don't have a match.
+    :param keep_build: Whether to keep the build items that don't have a match.
+    :return: Tuples of a probe item and a build item, where an item without a match is paired with None.
+    """
+    table = collections.defaultdict(list)
+    for item in build:
+        table[build_key(item)].append(item)
+
+    matched_keys = set()
+    for item in probe:
+        item_key = probe_key(item)
+        matches = table.get(item_key)
+        if matches:
+            if keep_build:
+                matched_keys.add(item_key)
+            for match in matches:
+                yield item, match
+        elif keep_probe:
+            yield item, None
+
+    if keep_build:
+        for item_key, matches in table.items():
+            if item_key not in matched_keys:
+                for match in matches:
+                    yield None, match
+
+
+def _bounded_tee(iterator, index, positions, buffer_size):
+    """
+    A generator of the elements of one iterator returned by `itertools.tee` that stops its chain from getting more than
+    `buffer_size` elements ahead of the slowest of the other iterators.
+
+    :param positions: A list of how many elements each iterator has returned, shared by all of them.
+    """
+    for item in iterator:
+        positions[index] += 1
+        if positions[index] - min(positions) > buffer_size:
+            raise BufferError('a chain of tee got more than {} elements ahead of the slowest chain'.format(buffer_size))
+        yield item
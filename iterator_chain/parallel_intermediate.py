@@ -1,190 +1,870 @@
 import functools
+import heapq
 from iterator_chain.intermediate import _IntermediateIteratorChain
+from iterator_chain.intermediate import _aggregate_items
+from iterator_chain.intermediate import _check_join
 import collections
 import os
 import itertools
+import logging
+import operator
+import time
 from functools import wraps
+from concurrent.futures import BrokenExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
+from iterator_chain import aggregates
+from iterator_chain import blocks
+from iterator_chain import files
+from iterator_chain import pool
+from iterator_chain import serialization
+from iterator_chain import spill
+from iterator_chain import transport
+from iterator_chain.profiling import _ParallelProfile
+from iterator_chain.caching import record_lineage
+from iterator_chain.profiling import profile_chain_method
+from iterator_chain.profiling import profile_terminal_method
 
 
+_logger = logging.getLogger(__name__)
+
+_MAP = 'map'
+_FILTER = 'filter'
+_FOR_EACH = 'for_each'
+_FLAT_MAP = 'flat_map'
+
 def shutdown_executor_on_exception(original_function):
     @wraps(original_function)
     def wrapper(self, *args, **kwargs):
         try:
             return original_function(self, *args, **kwargs)
         except Exception as exception:
-            self._executor.shutdown(wait=True)
+            # the outstanding chunks only remove their shared memory once they are cancelled
+            self._cancel_executions()
+            if self._shutdown_executor:
+                self._executor.shutdown(wait=True)
+            elif isinstance(exception, BrokenExecutor):
+                pool._discard_shared_executor(self._executor)
             raise exception
 
     return wrapper
 
 
 class _IntermediateParallelIteratorChain(_IntermediateIteratorChain):
-    def __init__(self, iterator, executor, chunksize=None):
-        super(_IntermediateParallelIteratorChain, self).__init__(iterator)
+    def __init__(self, iterator, executor, chunksize=None, max_in_flight=None, ordered=True, target_chunk_time=None, shutdown_executor=True, shared_memory_threshold=None, serializer=None, profiler=None, batched=False, lineage=(), stages=(), stage_profiles=(), stages_chunksize=None, stages_ordered=True, upstream=None, executor_owner=None):
+        super(_IntermediateParallelIteratorChain, self).__init__(iterator, profiler=profiler, batched=batched, lineage=lineage)
         self._executor = executor
+        self._shutdown_executor = shutdown_executor
         self._chunksize = chunksize
+        self._max_in_flight = max_in_flight
+        self._ordered = ordered
+        self._target_chunk_time = target_chunk_time
+        self._shared_memory_threshold = shared_memory_threshold
+        self._serializer = serializer
+        self._stages = tuple(stages)
+        self._stage_profiles = tuple(stage_profiles)
+        self._stages_chunksize = stages_chunksize
+        self._stages_ordered = stages_ordered
+        # the chain this one was made from, whose parallel stages are looked up when the work before this point is cancelled
+        self._upstream = upstream
+        # shuts the executor down once every chain split by `tee` is gone, in place of `shutdown_executor`
+        self._executor_owner = executor_owner
+        self._executions = []
         self._chain_method_called = False
 
+    @property
+    def _iterator(self):
+        """
+        The iterator of the chain.  Any pending parallel stages are executed the first time it is accessed.
+
+        :return: An iterator.
+        """
+        if self._stages:
+            self._flush_stages()
+        return self._source_iterator
+
+    @_iterator.setter
+    def _iterator(self, iterator):
+        self._source_iterator = iterator
+
+    def _flush_stages(self, reducer=None):
+        """
+        Replaces the source iterator with one that executes all the pending stages together in parallel.
+
+        :param reducer: Keyword.  A function that takes a list of the results of a chunk and returns a single partial result.  If specified, the source iterator is replaced with one of partial results, one per chunk, that still need to be combined.
+        """
+        only_filters = reducer is None and all(kind == _FILTER for kind, _ in self._stages)
+        if only_filters:
+            # the items themselves are unchanged, so only the indices of the surviving items need to be sent back
+            execute, arguments = _execute_filter_stages, (self._stages,)
+        else:
+            execute, arguments = _execute_stages, (self._stages, reducer)
+
+        if self._shared_memory_threshold is not None and self._serializer is None:
+            # the serializer sends large buffers through shared memory itself
+            execute = functools.partial(_execute_shared, execute, self._shared_memory_threshold)
+
+        if self._profiler is None:
+            function = functools.partial(execute, *arguments)
+            stage_profiles, parallel_profile = None, None
+        else:
+            function = functools.partial(_execute_profiled, execute, *arguments)
+            stage_profiles, parallel_profile = self._stage_profiles, _ParallelProfile()
+            for stage in stage_profiles:
+                if stage is not None:
+                    stage.parallel = parallel_profile
+
+        execution = _ParallelExecutionIterator(self._source_iterator, function, self._executor, chunksize=self._stages_chunksize, max_in_flight=self._max_in_flight, ordered=self._stages_ordered, returns_indices=only_filters, target_chunk_time=self._target_chunk_time, shared_memory_threshold=self._shared_memory_threshold, serializer=self._serializer, stage_profiles=stage_profiles, parallel_profile=parallel_profile)
+        self._source_iterator = execution
+        self._executions.append(execution)
+
+        if stage_profiles and stage_profiles[-1] is not None and stage_profiles[-1] is not self._profiler._active_stage:
+            # the elements were counted in the parallel execution units, so only the time is recorded here
+            self._source_iterator = self._profiler._wrap_output(execution, stage_profiles[-1], count=False)
+
+        self._stages = ()
+        self._stage_profiles = ()
+
+    def _cancel_executions(self):
+        """
+        Stops submitting more work for every parallel stage before this point in the chain and cancels the work that has
+        not started yet.  Used once an answer is known and no more elements are needed.  The stages are looked up now
+        instead of when the chain was made, because they are only executed once the chain is first iterated.
+        """
+        chain = self
+        while chain is not None:
+            for execution in chain._executions:
+                execution.close()
+            chain = chain._upstream
+
+    def _fuse_stage(self, kind, function, chunksize, ordered):
+        """
+        Appends a stage to the pending stages so that consecutive parallel stages are executed together, which means each
+        element only crosses to and from the parallel execution units once.  Stages with a different chunksize or
+        ordering cannot be fused, so the pending stages are executed first in that case.
+
+        :param kind: The kind of stage.  One of `_MAP`, `_FILTER`, `_FOR_EACH`, or `_FLAT_MAP`.
+        :param function: The function of the stage.
+        :param chunksize: The chunksize of the stage.  Defaults to the chunksize of the chain.
+        :param ordered: Whether the stage keeps the order of the elements.  Defaults to the ordering of the chain.
+        :return: A tuple of the new pending stages, their profiles, their chunksize, and their ordering.
+        """
+        chunksize = chunksize or self._chunksize
+        ordered = self._ordered if ordered is None else ordered
+        if self._stages and (chunksize, ordered) != (self._stages_chunksize, self._stages_ordered):
+            self._flush_stages()
+
+        return self._stages + ((kind, function),), self._stage_profiles + (None,), chunksize, ordered
+
+    def _chain_stage(self, kind, function, chunksize, ordered):
+        stages, stage_profiles, stages_chunksize, stages_ordered = self._fuse_stage(kind, function, chunksize, ordered)
+        return self._chain(self._source_iterator, stages=stages, stage_profiles=stage_profiles, stages_chunksize=stages_chunksize, stages_ordered=stages_ordered)
+
+    def _fuse_terminal_stage(self, kind, function, chunksize, ordered):
+        self._stages, self._stage_profiles, self._stages_chunksize, self._stages_ordered = self._fuse_stage(kind, function, chunksize, ordered)
+        if self._profiler is not None:
+            self._stage_profiles = self._stage_profiles[:-1] + (self._profiler._active_stage,)
+
+    def _chain(self, iterator, stages=(), stage_profiles=(), stages_chunksize=None, stages_ordered=True):
+        return _IntermediateParallelIteratorChain(iterator, self._executor, chunksize=self._chunksize, max_in_flight=self._max_in_flight, ordered=self._ordered, target_chunk_time=self._target_chunk_time, shutdown_executor=self._shutdown_executor, shared_memory_threshold=self._shared_memory_threshold, serializer=self._serializer, profiler=self._profiler, batched=self._batched, lineage=self._lineage, stages=stages, stage_profiles=stage_profiles, stages_chunksize=stages_chunksize, stages_ordered=stages_ordered, upstream=self, executor_owner=self._executor_owner)
+
+    def _profile_output(self, stage):
+        if self._stages:
+            # the pending stage is profiled in the parallel execution units once it is executed
+            stage.wall_time = None
+            self._stage_profiles = self._stage_profiles[:-1] + (stage,)
+        else:
+            super(_IntermediateParallelIteratorChain, self)._profile_output(stage)
+
     # Chain methods
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def map(self, function, chunksize=None):
+    def map(self, function, chunksize=None, ordered=None):
         """
         Will run the `function` across all the elements in the iterator in parallel.
 
         :param function: A function that takes a single argument.
         :param chunksize: Overrides the chunksize supplied to the original `from_iterable_parallel`.
+        :param ordered: Overrides the ordering supplied to the original `from_iterable_parallel`.
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
-        chunksize = chunksize or self._chunksize
         self._chain_method_called = True
+        return self._chain_stage(_MAP, function, chunksize, ordered)
 
-        iterator_of_results = _ParallelExecutionIterator(self._iterator, function, self._executor, chunksize=chunksize)
-
-        return _IntermediateParallelIteratorChain(iterator_of_results, self._executor, chunksize=self._chunksize)
-
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def filter(self, function, chunksize=None):
+    def filter(self, function, chunksize=None, ordered=None):
         """
         Will run the `function` on every element in parallel.  `function` should return a truthy or falsy value.  On true, the element will stay; on false, the element will be removed.
 
         :param function: A function that takes a single argument.
         :param chunksize: Overrides the chunksize supplied to the original `from_iterable_parallel`.
+        :param ordered: Overrides the ordering supplied to the original `from_iterable_parallel`.
         :return: An intermediate object that subsequent chaining and terminating methods can be called on.
         """
-        chunksize = chunksize or self._chunksize
         self._chain_method_called = True
+        return self._chain_stage(_FILTER, function, chunksize, ordered)
 
-        partial_filter_helper = functools.partial(self._filter_helper, function)
-        iterator_of_results = _ParallelExecutionIterator(self._iterator, partial_filter_helper, self._executor, chunksize=chunksize)
-        filtered_results_iterator = filter(lambda item_tuple: item_tuple[1], iterator_of_results)
-        filtered_original_item_iterator = map(lambda item_tuple: item_tuple[0], filtered_results_iterator)
-
-        return _IntermediateParallelIteratorChain(filtered_original_item_iterator, self._executor, chunksize=self._chunksize)
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    @shutdown_executor_on_exception
+    def amap(self, function, concurrency=None):
+        self._chain_method_called = True
+        iterator = (result for _, result in self._await_each(function, concurrency))
+        return self._chain(iterator)
 
-    @staticmethod
-    def _filter_helper(function, item):
-        true_or_false = function(item)
-        return item, true_or_false
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    @shutdown_executor_on_exception
+    def afilter(self, function, concurrency=None):
+        self._chain_method_called = True
+        iterator = (item for item, result in self._await_each(function, concurrency) if result)
+        return self._chain(iterator)
 
+    @record_lineage
+    @profile_chain_method()
     @shutdown_executor_on_exception
     def skip(self, number):
         self._chain_method_called = True
         iterator = self._skip(number)
-        return _IntermediateParallelIteratorChain(iterator, self._executor, chunksize=self._chunksize)
+        return self._chain(iterator)
 
+    @record_lineage
+    @profile_chain_method()
     @shutdown_executor_on_exception
-    def distinct(self):
+    def distinct(self, key=None, mode='exact', max_memory=None, capacity=None, error_rate=None):
         self._chain_method_called = True
-        iterator = self._distinct()
-        return _IntermediateParallelIteratorChain(iterator, self._executor, chunksize=self._chunksize)
+        iterator = self._distinct(key=key, mode=mode, max_memory=max_memory, capacity=capacity, error_rate=error_rate)
+        return self._chain(iterator)
 
+    @record_lineage
+    @profile_chain_method()
     @shutdown_executor_on_exception
     def limit(self, max_size):
+        """
+        The iterator will stop after `max_size` elements.  Any elements afterward are effectively removed.  Once `max_size` elements have been reached, no more work is submitted for the previous parallel methods and their outstanding work is cancelled.
+
+        :param max_size: An integer.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        self._chain_method_called = True
+        iterator = self._parallel_limit(max_size)
+        return self._chain(iterator)
+
+    def _parallel_limit(self, max_size):
+        yield from self._limit(max_size)
+        self._cancel_executions()
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def flatten(self, depth=None):
+        self._chain_method_called = True
+        iterator = self._flatten(self._iterator, depth=depth)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    @shutdown_executor_on_exception
+    def sort(self, key=None, cmp=None, reverse=False, max_memory=None):
+        """
+        Sorts the iterator based on the elements' values.  Use `key` or `cmp` to make a custom comparison.  If `key` is specified, `cmp` cannot be used.  If there are pending parallel methods, each chunk is sorted in the parallel execution units along with them, and the sorted chunks are then merged together, so `key` is only executed in the parallel execution units.  Otherwise, the elements are sorted in this process like the serial `sort` does.  When it is directly followed by `limit`, only the elements that make it past the limit are kept, like `top` and `bottom` do.
+
+        :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
+        :param cmp: Keyword.  A Python 2.x "cmp" function that takes two arguments.
+        :param reverse: Keyword.  If set to `True`, the elements will be sorted in the reverse order.
+        :param max_memory: Keyword.  The maximum number of elements to hold in memory at once, besides the chunks that are being sorted.  If there are more elements, the sorted chunks are merged into runs of about `max_memory` elements that are pickled to temporary files and merged back together as the sorted elements are requested.  If unspecified or None, all the sorted chunks are held in memory.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
         self._chain_method_called = True
-        iterator = self._limit(max_size)
-        return _IntermediateParallelIteratorChain(iterator, self._executor, chunksize=self._chunksize)
+        if max_memory is not None and max_memory < 1:
+            raise ValueError('max_memory must be at least 1')
+        if not self._stages:
+            # nothing is pending, so sending the elements to the parallel execution units would only add a round trip
+            return super(_IntermediateParallelIteratorChain, self).sort(key=key, cmp=cmp, reverse=reverse, max_memory=max_memory)
+
+        iterator = self._parallel_sort(key, cmp, reverse, max_memory)
+        return self._sorted_chain(iterator, key, cmp, reverse)
+
+    def _parallel_sort(self, key, cmp, reverse, max_memory):
+        # nothing is submitted until the sorted elements are requested, so a following limit can select them instead
+        sorted_chunks = self._partial_results(functools.partial(_sort_chunk, key, cmp, reverse))
+        yield from _merge_sorted_chunks(sorted_chunks, key, cmp, reverse, max_memory)
 
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def flatten(self):
+    def top(self, k, key=None):
+        """
+        Keeps only the `k` largest elements, from largest to smallest.  This is the same as `.sort(key=key, reverse=True).limit(k)`, but only `k` elements per chunk are held in memory at once.  If there are pending parallel methods, the `k` largest elements of each chunk are found in the parallel execution units along with them, and then merged together.  Otherwise, they are found in this process.
+
+        :param k: An integer.
+        :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
         self._chain_method_called = True
-        iterator = self._flatten(self._iterator)
-        return _IntermediateParallelIteratorChain(iterator, self._executor, chunksize=self._chunksize)
+        iterator = self._select(k, key=key, largest=True)
+        return self._chain(iterator)
 
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def sort(self, key=None, cmp=None, reverse=False):
+    def bottom(self, k, key=None):
+        """
+        Keeps only the `k` smallest elements, from smallest to largest.  This is the same as `.sort(key=key).limit(k)`, but only `k` elements per chunk are held in memory at once.  If there are pending parallel methods, the `k` smallest elements of each chunk are found in the parallel execution units along with them, and then merged together.  Otherwise, they are found in this process.
+
+        :param k: An integer.
+        :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
         self._chain_method_called = True
-        iterator = self._sort(key=key, cmp=cmp, reverse=reverse)
-        return _IntermediateParallelIteratorChain(iterator, self._executor, chunksize=self._chunksize)
+        iterator = self._select(k, key=key, largest=False)
+        return self._chain(iterator)
 
+    def _select(self, k, key=None, cmp=None, largest=False):
+        if not self._stages:
+            yield from super(_IntermediateParallelIteratorChain, self)._select(k, key=key, cmp=cmp, largest=largest)
+            return
+        selected_chunks = self._partial_results(functools.partial(_select_chunk, k, key, cmp, largest))
+        yield from _merge_selected_chunks(selected_chunks, k, key, cmp, largest)
+
+    @record_lineage
+    @profile_chain_method()
     @shutdown_executor_on_exception
     def reverse(self):
         self._chain_method_called = True
         iterator = self._reverse()
-        return _IntermediateParallelIteratorChain(iterator, self._executor, chunksize=self._chunksize)
+        return self._chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def join(self, other, left_key, right_key=None, how='inner', build=None):
+        self._chain_method_called = True
+        _check_join(how, build)
+        iterator = self._hash_join(other, left_key, right_key or left_key, how, build)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def merge_join(self, other, left_key, right_key=None, how='inner'):
+        self._chain_method_called = True
+        _check_join(how, None)
+        iterator = self._merge_join(other, left_key, right_key or left_key, how)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def zip_with(self, other):
+        self._chain_method_called = True
+        iterator = self._zip_with(other)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def cache(self, storage='memory', path=None, key=None):
+        """
+        Caches the elements the first time the chain is iterated, so a later chain with the same methods and functions replays them instead of executing the methods again.  When the cache is replayed, the pending parallel methods are never executed, so nothing is sent to the parallel execution units.  Otherwise, behaves the same as the serial `cache`.
+
+        :param storage: Keyword.  `'memory'` or `'disk'`.
+        :param path: Keyword.  The directory of the `'disk'` cache.
+        :param key: Keyword.  Anything picklable that identifies the data the chain started from.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        self._chain_method_called = True
+        return super(_IntermediateParallelIteratorChain, self).cache(storage=storage, path=path, key=key)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def chunked(self, size):
+        """
+        Groups the elements into lists of `size` elements.  Unlike `batch`, the lists are ordinary elements, so the following methods, including the terminating methods, see the lists themselves.  Each list is sent to the parallel execution units of the following parallel methods as a single element.
+
+        :param size: An integer.  The last list may have fewer elements.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        self._chain_method_called = True
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        iterator = blocks.batches(self._iterator, size)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def sliding_window(self, size, step=1):
+        self._chain_method_called = True
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        if step < 1:
+            raise ValueError('step must be at least 1')
+        iterator = self._sliding_window(size, step)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def window_by(self, key, size):
+        self._chain_method_called = True
+        if size <= 0:
+            raise ValueError('size must be positive')
+        iterator = self._window_by(key, size)
+        return self._unbatched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    @shutdown_executor_on_exception
+    def group_by(self, key):
+        """
+        Groups the elements by their key in a single pass over the iterator.  The elements become tuples of a key and a list of the elements with that key, in the order the keys were first found.  If there are pending parallel methods, each chunk is grouped in the parallel execution units along with them, and the groups of the chunks are then merged together.  Otherwise, the elements are grouped in this process.
+
+        :param key: A function that takes an element and returns its hashable key.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        self._chain_method_called = True
+        if not self._stages:
+            # nothing is pending, so sending the elements to the parallel execution units would only add a round trip
+            iterator = self._group_by(key)
+        else:
+            iterator = self._parallel_group_by(key)
+        return self._unbatched_chain(iterator)
+
+    def _parallel_group_by(self, key):
+        groups = collections.defaultdict(list)
+        for chunk_groups in self._partial_results(functools.partial(_group_chunk, key)):
+            for group_key, items in chunk_groups.items():
+                groups[group_key].extend(items)
+        yield from groups.items()
+
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    @shutdown_executor_on_exception
+    def count_by(self, key):
+        """
+        Counts the elements with each key in a single pass over the iterator.  The elements become tuples of a key and how many elements have that key, in the order the keys were first found.  If there are pending parallel methods, each chunk is counted in the parallel execution units along with them, so only the counts of each chunk are sent back and added together.  Otherwise, the elements are counted in this process.
+
+        :param key: A function that takes an element and returns its hashable key.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        self._chain_method_called = True
+        if not self._stages:
+            iterator = self._count_by(key)
+        else:
+            iterator = self._parallel_count_by(key)
+        return self._unbatched_chain(iterator)
+
+    def _parallel_count_by(self, key):
+        counts = collections.Counter()
+        for chunk_counts in self._partial_results(functools.partial(_count_chunk, key)):
+            counts.update(chunk_counts)
+        yield from counts.items()
+
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    @shutdown_executor_on_exception
+    def aggregate_by(self, key, seed, combine, combiner=None):
+        """
+        Aggregates the elements with each key in a single pass over the iterator, like `reduce` does for all the elements.  The elements become tuples of a key and the aggregate of the elements with that key, in the order the keys were first found.
+
+        If `combiner` is specified and there are pending parallel methods, each chunk is aggregated with `combine` in the parallel execution units along with them, so only the aggregates of each chunk are sent back.  The aggregates of a key are then combined with `combiner`.  `seed` must then be an identity value, like `0` for addition, because it is used once per key per chunk.
+
+        :param key: A function that takes an element and returns its hashable key.
+        :param seed: The aggregate of a key before any of its elements are combined into it.  It is used for every key, so `combine` should return a new aggregate instead of modifying it.
+        :param combine: A function that takes the aggregate so far and an element, and returns the new aggregate.
+        :param combiner: Keyword.  An associative function that takes two aggregates of the same key and returns them combined.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        self._chain_method_called = True
+        if combiner is None or not self._stages:
+            iterator = self._aggregate_by(key, seed, combine)
+        else:
+            iterator = self._parallel_aggregate_by(key, seed, combine, combiner)
+        return self._unbatched_chain(iterator)
+
+    def _parallel_aggregate_by(self, key, seed, combine, combiner):
+        aggregates = {}
+        for chunk_aggregates in self._partial_results(functools.partial(_aggregate_items, key, seed, combine)):
+            for aggregate_key, aggregate in chunk_aggregates.items():
+                if aggregate_key in aggregates:
+                    aggregate = combiner(aggregates[aggregate_key], aggregate)
+                aggregates[aggregate_key] = aggregate
+        yield from aggregates.items()
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def batch(self, size, array=False):
+        self._chain_method_called = True
+        if size < 1:
+            raise ValueError('size must be at least 1')
+        if array:
+            blocks.require_numpy()
+        iterator = blocks.batches(self._iterator, size, array=array)
+        return self._batched_chain(iterator)
+
+    @record_lineage
+    @profile_chain_method(wrap_functions=False)
+    @shutdown_executor_on_exception
+    def map_batches(self, function, chunksize=None, ordered=None):
+        """
+        Will run the `function` on every block of elements in parallel.  Whole blocks are sent to the parallel execution units, so the elements of a block are sent together.  If `batch` hasn't been called, the elements are first grouped into lists of 1024 elements.
+
+        :param function: A function that takes a block and returns a new block.
+        :param chunksize: Overrides the chunksize supplied to the original `from_iterable_parallel`.  The chunksize counts blocks, not elements.
+        :param ordered: Overrides the ordering supplied to the original `from_iterable_parallel`.
+        :return: An intermediate object that subsequent chaining and terminating methods can be called on.
+        """
+        batched_chain = self if self._batched else self.batch(blocks.DEFAULT_SIZE)
+        return batched_chain.map(function, chunksize=chunksize, ordered=ordered)
+
+    @record_lineage
+    @profile_chain_method()
+    @shutdown_executor_on_exception
+    def unbatch(self):
+        self._chain_method_called = True
+        iterator = blocks.unbatch(self._iterator)
+        return self._unbatched_chain(iterator)
 
     # Termination methods
+    @profile_terminal_method()
     @shutdown_executor_on_exception
     def list(self):
         serialized = super(_IntermediateParallelIteratorChain, self).list()
         return serialized
 
+    @profile_terminal_method()
     @shutdown_executor_on_exception
     def count(self):
-        count = super(_IntermediateParallelIteratorChain, self).count()
-        return count
+        """
+        Returns the number of elements in the iterator.  If there are pending parallel methods, the elements of each chunk are counted in the parallel execution units.
+
+        :return: An integer.
+        """
+        if not self._stages:
+            return super(_IntermediateParallelIteratorChain, self).count()
+
+        return sum(self._partial_results(blocks.count if self._batched else len))
+
+    def _partial_results(self, reducer):
+        """
+        Executes the pending stages in parallel and reduces the results of each chunk inside the parallel execution units, so only one partial result per chunk is sent back.
+
+        :param reducer: A function that takes a list of the results of a chunk and returns a single partial result.
+        :return: An iterator of the partial results.
+        """
+        self._flush_stages(reducer=reducer)
+        return self._source_iterator
 
+    @profile_terminal_method()
     @shutdown_executor_on_exception
     def first(self, default=None):
         first = super(_IntermediateParallelIteratorChain, self).first(default)
+        self._cancel_executions()
         return first
 
+    @profile_terminal_method()
     @shutdown_executor_on_exception
     def last(self, default=None):
         last = super(_IntermediateParallelIteratorChain, self).last(default)
         return last
 
+    @profile_terminal_method()
     @shutdown_executor_on_exception
     def max(self, default=None):
-        max = super(_IntermediateParallelIteratorChain, self).max(default)
-        return max
+        """
+        Returns the largest valued element in the iterator.  If the iterator is empty, the `default` is returned.  If there are pending parallel methods, the largest element of each chunk is found in the parallel execution units.
+
+        :param default: Keyword.  Any value.
+        :return: The largest element.
+        """
+        if not self._stages:
+            return super(_IntermediateParallelIteratorChain, self).max(default)
+
+        if self._batched:
+            return max(itertools.chain.from_iterable(self._partial_results(blocks.maximums)), default=default)
+        return max(self._partial_results(max), default=default)
 
+    @profile_terminal_method()
     @shutdown_executor_on_exception
     def min(self, default=None):
-        min = super(_IntermediateParallelIteratorChain, self).min(default)
-        return min
+        """
+        Returns the smallest valued element in the iterator.  If the iterator is empty, the `default` is returned.  If there are pending parallel methods, the smallest element of each chunk is found in the parallel execution units.
+
+        :param default: Keyword.  Any value.
+        :return: The smallest element.
+        """
+        if not self._stages:
+            return super(_IntermediateParallelIteratorChain, self).min(default)
 
+        if self._batched:
+            return min(itertools.chain.from_iterable(self._partial_results(blocks.minimums)), default=default)
+        return min(self._partial_results(min), default=default)
+
+    @profile_terminal_method()
     @shutdown_executor_on_exception
     def sum(self, default=None):
-        sum = super(_IntermediateParallelIteratorChain, self).sum(default)
-        return sum
+        """
+        Sums all the elements in the iterator together.  If any of the elements are un-summable, the `default` is returned.  If there are pending parallel methods, the elements of each chunk are summed in the parallel execution units.
+
+        :param default: Keyword.  Any value.
+        :return: The sum of all the elements.
+        """
+        if not self._stages:
+            return super(_IntermediateParallelIteratorChain, self).sum(default)
+
+        try:
+            total = sum(self._partial_results(blocks.total if self._batched else sum))
+        except TypeError:
+            total = default
+        return total
+
+    @profile_terminal_method()
+    @shutdown_executor_on_exception
+    def reduce(self, function, initial=None, combiner=None):
+        """
+        Applies the function to two elements in the iterator cumulatively.  Subsequent calls to `function` uses the previous return value from `function` as the first argument and the next element in the iterator as the second argument.  The final value is returned.  If `initial` is present, it is placed before the items of the sequence in the calculation, and serves as a default when the sequence is empty.
+
+        If `combiner` is specified and there are pending parallel methods, each chunk is reduced with `function` in the parallel execution units, starting from `initial` if it is present.  The partial results are then reduced with `combiner`.  `initial` must then be an identity value, like `0` for addition, because it is used once per chunk.
+
+        :param function: A function that takes two arguments.
+        :param initial: Keyword.  Any value.
+        :param combiner: Keyword.  An associative function that takes two partial results and returns them combined.
+        :return: The final reduced value.
+        """
+        if combiner is None or not self._stages:
+            return super(_IntermediateParallelIteratorChain, self).reduce(function, initial=initial)
+
+        partial_results = self._partial_results(functools.partial(_reduce_chunk, function, initial))
+        if initial is None:
+            return functools.reduce(combiner, partial_results)
+        else:
+            return functools.reduce(combiner, partial_results, initial)
+
+    @profile_terminal_method()
+    @shutdown_executor_on_exception
+    def aggregate(self, **specs):
+        """
+        Computes several aggregates of the elements in a single pass over the iterator, so an expensive chain doesn't need to be executed once per aggregate.  If there are pending parallel methods, each chunk is aggregated in the parallel execution units, so only the aggregates of each chunk are sent back and combined.  The aggregates that are tuples must then have a third function that takes two aggregates and returns them combined, and their initial value must be an identity value because it is used once per chunk.  Otherwise, the elements are sent back and aggregated in this process instead.
+
+        :param specs: Keywords.  The name of each aggregate and either the name of a built-in aggregate, which is one of `'count'`, `'sum'`, `'min'`, `'max'`, `'first'`, `'last'`, or `'mean'`, or a tuple of an initial value, a function that takes the aggregate so far and an element and returns the new aggregate, and optionally an associative function that takes two aggregates and returns them combined.
+        :return: A `dict` of the name of each aggregate to its value.
+        """
+        resolved = aggregates.resolve(specs)
+        return aggregates.finish(resolved, self._aggregate(resolved))
+
+    @profile_terminal_method()
+    @shutdown_executor_on_exception
+    def fan_out(self, *specs):
+        resolved = aggregates.resolve(dict(enumerate(specs)))
+        values = aggregates.finish(resolved, self._aggregate(resolved))
+        return tuple(values[index] for index in range(len(specs)))
+
+    def _aggregate(self, resolved):
+        if not self._stages or not aggregates.mergeable(resolved):
+            return super(_IntermediateParallelIteratorChain, self)._aggregate(resolved)
+
+        chunk_states = self._partial_results(functools.partial(_aggregate_chunk, resolved, self._batched))
+        return aggregates.merge(resolved, chunk_states)
 
     @shutdown_executor_on_exception
-    def reduce(self, function, initial=None):
-        reduce = super(_IntermediateParallelIteratorChain, self).reduce(function, initial=initial)
-        return reduce
+    def tee(self, n=2, buffer_size=None):
+        self._chain_method_called = True
+        branches = super(_IntermediateParallelIteratorChain, self).tee(n=n, buffer_size=buffer_size)
+        executor_owner = _ExecutorOwner(self._executor) if self._shutdown_executor else self._executor_owner
+        for branch in branches:
+            # every branch reads the same parallel work, so a branch that stops early must not cancel it for the others
+            branch._upstream = None
+            branch._shutdown_executor = False
+            branch._executor_owner = executor_owner
+        return branches
 
+    @profile_terminal_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def for_each(self, function, chunksize=None):
+    def for_each(self, function, chunksize=None, ordered=None):
         """
         Executes `function` on every element in the iterator in parallel.  There is no return value.  If you are wanting to return a list of values based on the function, use `.map(function).list()`.
 
         :param function: A function that takes one argument and returns nothing.
         :param chunksize: Overrides the chunksize supplied to the original `from_iterable_parallel`.
+        :param ordered: Overrides the ordering supplied to the original `from_iterable_parallel`.
         """
-        chunksize = chunksize or self._chunksize
+        self._fuse_terminal_stage(_FOR_EACH, function, chunksize, ordered)
+        collections.deque(self._iterator, maxlen=0)
+
+    @profile_terminal_method()
+    @shutdown_executor_on_exception
+    def to_file(self, path, encoding='utf-8', append=False):
+        """
+        Writes every element in the iterator to the file as a line of its `str`.  If there are pending parallel methods, each chunk is serialized to bytes in the parallel execution units, so this process only writes the bytes with large buffered writes.
+
+        :param path: The path of the file.
+        :param encoding: Keyword.  The encoding of the file.  Defaults to `'utf-8'`.
+        :param append: Keyword.  If set to `True`, the file is appended to instead of overwritten.
+        :return: The number of elements written.
+        """
+        return self._write_file(path, None, encoding, None, append)
+
+    @profile_terminal_method()
+    @shutdown_executor_on_exception
+    def to_jsonl(self, path, encoding='utf-8', append=False):
+        """
+        Writes every element in the iterator to the file as a line of JSON.  If there are pending parallel methods, each chunk is serialized to bytes in the parallel execution units, so this process only writes the bytes with large buffered writes.
+
+        :param path: The path of the file.
+        :param encoding: Keyword.  The encoding of the file.  Defaults to `'utf-8'`.
+        :param append: Keyword.  If set to `True`, the file is appended to instead of overwritten.
+        :return: The number of elements written.
+        """
+        return self._write_file(path, 'jsonl', encoding, None, append)
+
+    @profile_terminal_method()
+    @shutdown_executor_on_exception
+    def to_csv(self, path, fieldnames=None, encoding='utf-8', append=False):
+        """
+        Writes every element in the iterator to the file as a CSV row.  `dict` elements are written by their keys, and any other element is written as a sequence of values.  If there are pending parallel methods, each chunk is serialized to bytes in the parallel execution units, so this process only writes the bytes with large buffered writes.
+
+        :param path: The path of the file.
+        :param fieldnames: Keyword.  A list of the fields, which is written as the header.  If unspecified or None, the keys of the first `dict` in each chunk are used, so they must be the same for every chunk, and sequences are written without a header.
+        :param encoding: Keyword.  The encoding of the file.  Defaults to `'utf-8'`.
+        :param append: Keyword.  If set to `True`, the file is appended to instead of overwritten, and no header is written.
+        :return: The number of elements written.
+        """
+        return self._write_file(path, 'csv', encoding, fieldnames, append)
 
-        iterator_of_results = _ParallelExecutionIterator(self._iterator, function, self._executor, chunksize=chunksize)
-        list(iterator_of_results)
+    def _write_file(self, path, fmt, encoding, fieldnames, append):
+        if not self._stages:
+            return super(_IntermediateParallelIteratorChain, self)._write_file(path, fmt, encoding, fieldnames, append)
 
+        encoded_batches = self._partial_results(functools.partial(_encode_chunk, fmt, encoding, fieldnames, self._batched))
+        return files.write(path, encoding, fmt, fieldnames, encoded_batches, append=append)
+
+    @profile_terminal_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def all_match(self, function):
-        all_match = super(_IntermediateParallelIteratorChain, self).all_match(function)
-        return all_match
+    def all_match(self, function, chunksize=None):
+        """
+        Returns `True` only if all the elements return `True` after applying the `function` to them.  Else returns `False`.  If there are pending parallel methods, `function` is applied in the parallel execution units together with them.  As soon as an element returns `False`, the outstanding parallel work is cancelled.
 
+        :param function: A function that takes one argument and returns a boolean.
+        :param chunksize: Overrides the chunksize supplied to the original `from_iterable_parallel`.
+        :return: True or False
+        """
+        negated_function = functools.partial(_negate, function)
+        return not self._parallel_any_match(negated_function, chunksize)
+
+    @profile_terminal_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def any_match(self, function):
-        any_match = super(_IntermediateParallelIteratorChain, self).any_match(function)
+    def any_match(self, function, chunksize=None):
+        """
+        Returns `True` if just one element return `True` after applying the `function` to it.  If all elements result in `False`, `False` is returned.  If there are pending parallel methods, `function` is applied in the parallel execution units together with them.  As soon as an element returns `True`, the outstanding parallel work is cancelled.
+
+        :param function: A function that takes one argument and returns a boolean.
+        :param chunksize: Overrides the chunksize supplied to the original `from_iterable_parallel`.
+        :return: True or False
+        """
+        return self._parallel_any_match(function, chunksize)
+
+    def _parallel_any_match(self, function, chunksize):
+        if self._stages:
+            # the order the matches are found in does not matter, so the first chunk to finish can answer
+            self._fuse_terminal_stage(_FILTER, function, chunksize, None)
+            self._stages_ordered = False
+            sentinel = object()
+            any_match = next(self._iterator, sentinel) is not sentinel
+        else:
+            # nothing is pending, so sending the elements to the parallel execution units would only add a round trip
+            any_match = any(map(function, self._iterator))
+        self._cancel_executions()
         return any_match
 
+    @profile_terminal_method(wrap_functions=False)
     @shutdown_executor_on_exception
-    def none_match(self, function):
-        none_match = super(_IntermediateParallelIteratorChain, self).none_match(function)
-        return none_match
+    def none_match(self, function, chunksize=None):
+        """
+        Returns `True` only if all the elements return `False` after applying the `function` to them.  Else returns `True`.  If there are pending parallel methods, `function` is applied in the parallel execution units together with them.  As soon as an element returns `True`, the outstanding parallel work is cancelled.
+
+        :param function: A function that takes one argument and returns a boolean.
+        :param chunksize: Overrides the chunksize supplied to the original `from_iterable_parallel`.
+        :return: True or False
+        """
+        return not self._parallel_any_match(function, chunksize)
 
     def __del__(self):
-        if not self._chain_method_called:
+        if self._shutdown_executor and not self._chain_method_called:
             # we were the last chain method, we are in charge of shutting down the executor
             self._executor.shutdown(wait=True)
 
 
+class _ExecutorOwner:
+    def __init__(self, executor):
+        """
+        Shuts down an executor once nothing references this anymore, for when several chains need the executor.
+
+        :param executor: The executor to shut down.
+        """
+        self._executor = executor
+
+    def __del__(self):
+        self._executor.shutdown(wait=True)
+
+
 class _ParallelExecutionIterator(collections.abc.Iterator):
-    def __init__(self, iterator, function, executor, chunksize=None):
+    def __init__(self, iterator, function, executor, chunksize=None, max_in_flight=None, ordered=True, returns_indices=False, target_chunk_time=None, shared_memory_threshold=None, serializer=None, stage_profiles=None, parallel_profile=None):
+        """
+        :param iterator: The input iterator.
+        :param function: A function that takes a list of items and returns a list of results.  It is executed in the
+        parallel execution units.
+        :param executor: The executor to use.
+        :param chunksize: How many items to put in each list.  If None, the chunksize adapts to how long the chunks take
+        to execute.
+        :param max_in_flight: The maximum number of outstanding chunks.
+        :param ordered: If `False`, the results of whichever chunk finishes first are returned first instead of keeping
+        the order of the input iterator.
+        :param returns_indices: If `True`, `function` returns the indices of the items in the chunk to output instead of
+        the results themselves.  The chunks are kept until their indices are returned.
+        :param target_chunk_time: How many seconds an adaptively sized chunk should take to execute.
+        :param shared_memory_threshold: If not None, items of the chunks that are at least this many bytes are sent
+        through shared memory, and `function` returns large results the same way.
+        :param serializer: If not None, the `Serializer` that `function`, the chunks, and the results are serialized with
+        instead of the executor's own pickling.  It then sends the large buffers inside the items through shared memory.
+        :param stage_profiles: The profile of each stage executed by `function`, or None if the stages aren't profiled.
+        `function` then also returns the counts of each stage and how long it took.
+        :param parallel_profile: Where to record the chunks submitted and the time spent waiting on them.
+        """
         self._input_iterator = iterator
-        self._function = function
         self._executor = executor
-        self._executed = False
-        self._output_iterator = None
         self._chunksize = chunksize
+        self._max_in_flight = max_in_flight or self._default_max_in_flight()
+        self._ordered = ordered
+        self._returns_indices = returns_indices
+        self._shared_memory_threshold = shared_memory_threshold
+        self._serializer = serializer
+        self._shared_chunks = {}
+        self._stage_profiles = stage_profiles
+        self._parallel_profile = parallel_profile
+        self._futures = collections.deque()
+        self._output_iterator = iter([])
+
+        if chunksize is not None:
+            self._function = function
+            self._chunksizer = None
+            chunksizes = itertools.repeat(chunksize)
+        else:
+            self._function = functools.partial(_time_execution, function)
+            self._chunksizer = _AdaptiveChunksizer(iterator, target_chunk_time=target_chunk_time)
+            chunksizes = iter(self._chunksizer.next_chunksize, None)
+
+        if serializer is not None:
+            # serialized once here and loaded once per execution unit, instead of pickled with every chunk
+            digest, program = serializer.program(self._function)
+            self._function = functools.partial(serialization.execute, digest, program, shared_memory_threshold)
+
+        self._chunk_iterator = self._slice_into_chunks(iterator, chunksizes)
 
     def __iter__(self):
         """
@@ -196,74 +876,473 @@ class _ParallelExecutionIterator(collections.abc.Iterator):
 
     def __next__(self):
         """
-        Upon first invocation, the function executes against every item in the iterator in parallel.  Once complete,
-        the first mapped value is returned.  Subsequent invocations immediately return the next mapped value.
+        Returns the next mapped value.  Chunks of the input iterator are only submitted to the executor as mapped values
+        are requested, and no more than `max_in_flight` chunks are ever outstanding at once.  This keeps the memory used
+        constant regardless of how large the input iterator is.
 
-        :return: The next mapped value after executing the function against every item in the iterator in a parallel
+        :return: The next mapped value after executing the function against the items in the iterator in a parallel
         fashion.
         """
-        if not self._executed:
-            self._executed = True
-            self._execute()
+        while True:
+            try:
+                return next(self._output_iterator)
+            except StopIteration:
+                pass
 
-        return next(self._output_iterator)
+            self._submit_chunks()
+            if not self._futures:
+                raise StopIteration
 
-    def _execute(self):
-        if self._chunksize is not None:
-            self._output_iterator = self._executor.map(self._function, self._input_iterator, chunksize=self._chunksize)
-        else:
-            self._output_iterator = self._map_successively_larger_slices(self._executor, self._function, self._input_iterator)
+            start = time.perf_counter()
+            if self._ordered:
+                future, chunk, size = self._futures.popleft()
+            else:
+                future, chunk, size = self._pop_completed()
 
-    @classmethod
-    def _map_successively_larger_slices(cls, executor, function, input_iterator):
+            try:
+                results = future.result()
+            finally:
+                transport.discard(self._shared_chunks.pop(future, ()))
+            if self._parallel_profile is not None:
+                self._record_wait(start, results)
+            if self._serializer is not None:
+                results = serialization.loads(results, delete=True)
+            if self._chunksizer is not None:
+                seconds, results = results
+                self._chunksizer.record(size, seconds)
+            if self._stage_profiles is not None:
+                results = self._record_stage_counts(results)
+            if self._shared_memory_threshold is not None and self._serializer is None:
+                results = [transport.receive(result, delete=True) for result in results]
+            if chunk is not None:
+                results = map(chunk.__getitem__, results)
+            self._output_iterator = iter(results)
+
+    def close(self):
         """
-        Successively slices more and more items from the iterator and executes the function against them until the
-        iterator is exhausted.
+        Stops submitting chunks and cancels the outstanding chunks that have not started executing.  The iterator is
+        exhausted afterward.
+        """
+        self._chunk_iterator = iter([])
+        self._output_iterator = iter([])
+        while self._futures:
+            future, _, _ = self._futures.popleft()
+            if self._shared_memory_threshold is not None:
+                future.add_done_callback(self._discard_shared)
+            future.cancel()
+
+    def __del__(self):
+        # an iterator that is dropped before it is exhausted still has chunks whose shared memory needs removing
+        self.close()
 
-        :param executor: The executor to use
-        :param function: The function to execute against every item in the iterator.
-        :param input_iterator: The iterator to run the function against.
-        :return: An iterator who's values have been transformed by the function.
+    def _discard_shared(self, future):
         """
-        cpu_count = os.cpu_count() or 1
+        Deletes the shared memory of a chunk whose results will never be consumed.
+        """
+        transport.discard(self._shared_chunks.pop(future, ()))
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        results = future.result()
+        if self._serializer is not None:
+            serialization.discard(results)
+            return
+        if self._chunksizer is not None:
+            _, results = results
+        if self._stage_profiles is not None:
+            results, _, _ = results
+        transport.discard(results)
 
-        constructed_output_iterator = iter([])
+    def _pop_completed(self):
+        """
+        Waits for any outstanding chunk to finish and removes it.
+
+        :return: A tuple of the finished future, its chunk, and the size of its chunk.
+        """
+        wait([future for future, _, _ in self._futures], return_when=FIRST_COMPLETED)
+        for index, outstanding in enumerate(self._futures):
+            if outstanding[0].done():
+                del self._futures[index]
+                return outstanding
 
-        for chunksize in cls._power_of_two_range(1):
-            miniature_input_iterator = itertools.islice(input_iterator, chunksize * cpu_count)
-            list_of_miniature_input_iterator = [miniature_input_iterator]
-            if cls._iterator_is_empty(list_of_miniature_input_iterator):
+    def _submit_chunks(self):
+        """
+        Submits chunks of the input iterator to the executor until `max_in_flight` chunks are outstanding or the input
+        iterator is exhausted.
+        """
+        while len(self._futures) < self._max_in_flight:
+            chunk = next(self._chunk_iterator, None)
+            if chunk is None:
                 break
-            miniature_input_iterator = list_of_miniature_input_iterator[0]
-            miniature_output_iterator = executor.map(function, miniature_input_iterator, chunksize=chunksize)
-            constructed_output_iterator = itertools.chain(constructed_output_iterator, miniature_output_iterator)
+            payload = None
+            if self._serializer is not None:
+                payload = self._serializer.dumps(chunk, threshold=self._shared_memory_threshold)
+                future = self._executor.submit(self._function, payload)
+                self._shared_chunks[future] = payload.buffers
+            elif self._shared_memory_threshold is None:
+                future = self._executor.submit(self._function, chunk)
+            else:
+                shared_chunk = [transport.share(item, self._shared_memory_threshold) for item in chunk]
+                future = self._executor.submit(self._function, shared_chunk)
+                self._shared_chunks[future] = shared_chunk
+            if self._parallel_profile is not None:
+                self._record_submit(payload)
+            self._futures.append((future, chunk if self._returns_indices else None, len(chunk)))
+
+    def _record_submit(self, payload):
+        """
+        :param payload: The serializer's payload of the chunk, or None if the executor pickles the chunk itself, which
+        cannot be measured without pickling it again.
+        """
+        profile = self._parallel_profile
+        if profile.first_submit is None:
+            profile.first_submit = time.perf_counter()
+        profile.chunks_submitted += 1
+        if payload is not None:
+            profile.bytes_pickled = (profile.bytes_pickled or 0) + len(payload.data)
+
+    def _record_wait(self, start, results):
+        profile = self._parallel_profile
+        profile.last_result = time.perf_counter()
+        profile.wait_time += profile.last_result - start
+        if self._serializer is not None:
+            profile.bytes_pickled = (profile.bytes_pickled or 0) + len(results.data)
 
-        return constructed_output_iterator
+    def _record_stage_counts(self, results):
+        """
+        Records what the stages did in the execution unit.
+
+        :param results: A tuple of the results of the chunk, the counts of each stage, and how long the chunk took.
+        :return: The results of the chunk.
+        """
+        results, stage_counts, seconds = results
+        self._parallel_profile.worker_time += seconds
+        for stage, (elements_in, elements_out, function_time) in zip(self._stage_profiles, stage_counts):
+            if stage is not None:
+                stage.record_worker_counts(elements_in, elements_out, function_time)
+        return results
 
     @staticmethod
-    def _power_of_two_range(start):
+    def _slice_into_chunks(input_iterator, chunksizes):
         """
-        A generator that continually returns the next power of two value.
-        E.g. 1, 2, 4, 8, 16, 32, etc.
+        A generator that slices the input iterator into lists.
 
-        :param start: The value to start at.
+        :param input_iterator: The iterator to slice.
+        :param chunksizes: An iterator of how many items to put in each list.
         """
-        while True:
-            yield start
-            start <<= 1
+        for chunksize in chunksizes:
+            chunk = list(itertools.islice(input_iterator, chunksize))
+            if not chunk:
+                return
+            yield chunk
 
     @staticmethod
-    def _iterator_is_empty(list_with_iterator):
+    def _default_max_in_flight():
         """
-        Checks the iterator whether it is empty or not.  It does this by "tasting" the iterator and reconstructing it
-        if it is not empty.
+        By default, allow two chunks per CPU to be outstanding so every execution unit has the next chunk waiting.
 
-        :param list_with_iterator: A list with a single item: the iterator to test.
-        :return: True if the iterator is empty, False if the iterator is not empty.
+        :return: The default maximum number of outstanding chunks.
         """
-        try:
-            first_item = next(list_with_iterator[0])
-            list_with_iterator[0] = itertools.chain([first_item], list_with_iterator[0])
-            return False
-        except StopIteration:
-            return True
+        return 2 * (os.cpu_count() or 1)
+
+
+class _AdaptiveChunksizer:
+    _DEFAULT_TARGET_CHUNK_TIME = 0.1
+    _MAXIMUM_CHUNKSIZE = 65536
+    _MAXIMUM_GROWTH = 4
+    _SMOOTHING = 0.5
+    _HISTORY_LENGTH = 1000
+
+    def __init__(self, input_iterator, target_chunk_time=None):
+        """
+        Decides how big each chunk should be so that every chunk takes about `target_chunk_time` seconds to execute.
+        Until the first chunk has been timed, chunks of a single item are used.  Each decision is logged at the debug
+        level and kept in `history`.
+
+        :param input_iterator: The iterator being sliced.  If it knows how many items it has left, the chunks get smaller
+        near its end so the last chunks don't leave execution units idle.
+        :param target_chunk_time: Keyword.  How many seconds a chunk should take to execute.
+        """
+        self._input_iterator = input_iterator
+        self._target_chunk_time = target_chunk_time or self._DEFAULT_TARGET_CHUNK_TIME
+        self._execution_units = os.cpu_count() or 1
+        self._seconds_per_item = None
+        self._chunksize = 1
+        self.history = collections.deque(maxlen=self._HISTORY_LENGTH)
+
+    def record(self, size, seconds):
+        """
+        Records how long a chunk took to execute.
+
+        :param size: The number of items in the chunk.
+        :param seconds: How many seconds the chunk took to execute.
+        """
+        seconds_per_item = seconds / size
+        if self._seconds_per_item is None:
+            self._seconds_per_item = seconds_per_item
+        else:
+            self._seconds_per_item = self._SMOOTHING * seconds_per_item + (1 - self._SMOOTHING) * self._seconds_per_item
+
+    def next_chunksize(self):
+        """
+        Decides the size of the next chunk.
+
+        :return: The number of items to put in the next chunk.
+        """
+        if self._seconds_per_item is not None:
+            if self._seconds_per_item > 0:
+                ideal_chunksize = int(self._target_chunk_time / self._seconds_per_item)
+            else:
+                ideal_chunksize = self._MAXIMUM_CHUNKSIZE
+            self._chunksize = max(1, min(ideal_chunksize, self._chunksize * self._MAXIMUM_GROWTH, self._MAXIMUM_CHUNKSIZE))
+
+        chunksize = self._chunksize
+        remaining = operator.length_hint(self._input_iterator, -1)
+        if remaining >= 0:
+            # near the end, give every execution unit at least two chunks
+            chunksize = max(1, min(chunksize, -(-remaining // (2 * self._execution_units))))
+
+        self.history.append(_ChunksizeDecision(chunksize, self._seconds_per_item, remaining if remaining >= 0 else None))
+        _logger.debug('Chose a chunksize of %d with %s seconds per item and %s items remaining', chunksize, self._seconds_per_item, remaining if remaining >= 0 else 'unknown')
+        return chunksize
+
+
+_ChunksizeDecision = collections.namedtuple('_ChunksizeDecision', ['chunksize', 'seconds_per_item', 'remaining'])
+
+
+def _time_execution(function, chunk):
+    """
+    Runs in the execution unit.  Times how long `function` takes to execute against the chunk.
+
+    :param function: A function that takes a list of items.
+    :param chunk: A list of items.
+    :return: A tuple of how many seconds `function` took and what it returned.
+    """
+    start = time.perf_counter()
+    results = function(chunk)
+    return time.perf_counter() - start, results
+
+
+def _execute_stages(stages, reducer, chunk):
+    """
+    Runs in the execution unit.  Executes every stage against every item in the chunk.
+
+    :param stages: A sequence of tuples of the kind of stage and the stage's function.
+    :param reducer: A function that reduces the items that made it through all the stages into a single partial result, or None.
+    :param chunk: A list of items.
+    :return: A list of the items that made it through all the stages.  If `reducer` is specified, a list of just the partial result, or an empty list if no items made it through.
+    """
+    iterator = iter(chunk)
+    for kind, function in stages:
+        if kind == _FILTER:
+            iterator = filter(function, iterator)
+        elif kind == _FLAT_MAP:
+            iterator = itertools.chain.from_iterable(map(function, iterator))
+        else:
+            iterator = map(function, iterator)
+
+    if stages and stages[-1][0] == _FOR_EACH:
+        collections.deque(iterator, maxlen=0)
+        return []
+
+    results = list(iterator)
+    if reducer is not None:
+        return [reducer(results)] if results else []
+
+    return results
+
+
+def _execute_filter_stages(stages, chunk):
+    """
+    Runs in the execution unit.  Executes every filter stage against every item in the chunk.
+
+    :param stages: A sequence of tuples of `_FILTER` and the stage's function.
+    :param chunk: A list of items.
+    :return: A list of the indices of the items in the chunk that made it through all the stages.
+    """
+    indices = range(len(chunk))
+    for _, function in stages:
+        indices = [index for index in indices if function(chunk[index])]
+
+    return indices
+
+
+def _execute_shared(execute, threshold, *arguments):
+    """
+    Runs in the execution unit.  Reads the items of the chunk that were sent through shared memory, executes the stages like `execute` does, and sends the large results back through shared memory.
+
+    :param execute: A function that executes the stages against the chunk, which is its last argument.
+    :param threshold: How many bytes a result must be to be sent through shared memory.
+    :param arguments: The arguments to `execute`.
+    :return: A list of the results, where the large results are replaced by descriptors of their shared memory.
+    """
+    *arguments, chunk = arguments
+    chunk = [transport.receive(item) for item in chunk]
+    results = execute(*arguments, chunk)
+    return [transport.share(result, threshold) for result in results]
+
+
+def _execute_profiled(execute, stages, *arguments):
+    """
+    Runs in the execution unit.  Executes the stages like `execute` does, but also counts the items that go into and
+    come out of each stage.
+
+    :param execute: `_execute_stages` or `_execute_filter_stages`.
+    :param stages: A sequence of tuples of the kind of stage and the stage's function.
+    :param arguments: The remaining arguments to `execute`.
+    :return: A tuple of what `execute` returned, a list of tuples of the items in, the items out, and the seconds spent
+    for each stage, and how many seconds the chunk took.
+    """
+    start = time.perf_counter()
+    counters = [_StageCounter(kind, function) for kind, function in stages]
+    results = execute([(kind, counter) for (kind, _), counter in zip(stages, counters)], *arguments)
+    stage_counts = [(counter.elements_in, counter.elements_out(), counter.seconds) for counter in counters]
+    return results, stage_counts, time.perf_counter() - start
+
+
+class _StageCounter:
+    def __init__(self, kind, function):
+        self._kind = kind
+        self._function = function
+        self.elements_in = 0
+        self.elements_kept = 0
+        self.elements_produced = 0
+        self.seconds = 0.0
+
+    def __call__(self, item):
+        start = time.perf_counter()
+        result = self._function(item)
+        self.seconds += time.perf_counter() - start
+        self.elements_in += 1
+        if self._kind == _FLAT_MAP:
+            self.elements_produced += len(result)
+        elif result:
+            self.elements_kept += 1
+        return result
+
+    def elements_out(self):
+        if self._kind == _FILTER:
+            return self.elements_kept
+        elif self._kind == _MAP:
+            return self.elements_in
+        elif self._kind == _FLAT_MAP:
+            return self.elements_produced
+        return None
+
+
+def _sort_chunk(key, cmp, reverse, results):
+    """
+    Runs in the execution unit.  Sorts the results of a chunk.
+
+    :return: A list of tuples of each result's key and the result if `key` is specified, so the key doesn't need to be executed again when merging.  Otherwise, the sorted results.
+    """
+    if key is not None:
+        return sorted(zip(map(key, results), results), key=operator.itemgetter(0), reverse=reverse)
+    if cmp is not None:
+        return sorted(results, key=functools.cmp_to_key(cmp), reverse=reverse)
+    return sorted(results, reverse=reverse)
+
+
+def _select_chunk(k, key, cmp, largest, results):
+    """
+    Runs in the execution unit.  Selects the `k` largest or smallest results of a chunk.
+
+    :return: A list of tuples of each selected result's key and the result if `key` is specified, so the key doesn't need to be executed again when merging.  Otherwise, the selected results.
+    """
+    select = heapq.nlargest if largest else heapq.nsmallest
+    if key is not None:
+        return select(k, zip(map(key, results), results), key=operator.itemgetter(0))
+    if cmp is not None:
+        return select(k, results, key=functools.cmp_to_key(cmp))
+    return select(k, results)
+
+
+def _merge_selected_chunks(selected_chunks, k, key, cmp, largest):
+    """
+    Selects the `k` largest or smallest of the results selected by `_select_chunk`.  The chunks are consumed as they finish, so only `k` results are held at once besides the chunks themselves.
+    """
+    select = heapq.nlargest if largest else heapq.nsmallest
+    candidates = itertools.chain.from_iterable(selected_chunks)
+    if key is not None:
+        return map(operator.itemgetter(1), select(k, candidates, key=operator.itemgetter(0)))
+    merge_key = None if cmp is None else functools.cmp_to_key(cmp)
+    return select(k, candidates, key=merge_key)
+
+
+def _merge_sorted_chunks(sorted_chunks, key, cmp, reverse, max_memory):
+    """
+    Merges the chunks sorted by `_sort_chunk` into a single sorted iterator.  Chunks whose elements compare equal are merged in the order the chunks are in, so the sort stays stable.
+
+    :param sorted_chunks: An iterator of the chunks sorted by `_sort_chunk`.
+    :param max_memory: If not None, the chunks are merged into runs of about `max_memory` elements that are spilled to temporary files before merging.
+    :return: An iterator of the sorted elements.
+    """
+    if key is not None:
+        merge_key = operator.itemgetter(0)
+    else:
+        merge_key = None if cmp is None else functools.cmp_to_key(cmp)
+
+    if max_memory is None:
+        merged = heapq.merge(*list(sorted_chunks), key=merge_key, reverse=reverse)
+    else:
+        merged = _merge_spilled_chunks(sorted_chunks, merge_key, reverse, max_memory)
+    return merged if key is None else map(operator.itemgetter(1), merged)
+
+
+def _merge_spilled_chunks(sorted_chunks, merge_key, reverse, max_memory):
+    with spill.SpilledRuns(key=merge_key, reverse=reverse) as runs:
+        pending_chunks, pending_size = [], 0
+        for sorted_chunk in sorted_chunks:
+            pending_chunks.append(sorted_chunk)
+            pending_size += len(sorted_chunk)
+            if pending_size >= max_memory:
+                runs.add(heapq.merge(*pending_chunks, key=merge_key, reverse=reverse))
+                pending_chunks, pending_size = [], 0
+
+        yield from runs.merge(last_run=heapq.merge(*pending_chunks, key=merge_key, reverse=reverse))
+
+
+def _encode_chunk(fmt, encoding, fieldnames, batched, results):
+    """
+    Runs in the execution unit.  Serializes the results of a chunk like `files.encode` does, after turning blocks back into their elements.
+    """
+    return files.encode(fmt, encoding, fieldnames, blocks.unbatch(results) if batched else results)
+
+
+def _group_chunk(key, results):
+    """
+    Runs in the execution unit.  Groups the results of a chunk by their key.
+
+    :return: A `dict` of every key to a list of the results with that key.
+    """
+    groups = collections.defaultdict(list)
+    for result in results:
+        groups[key(result)].append(result)
+    return groups
+
+
+def _count_chunk(key, results):
+    """
+    Runs in the execution unit.  Counts the results of a chunk with each key.
+
+    :return: A `Counter` of every key.
+    """
+    return collections.Counter(map(key, results))
+
+
+def _aggregate_chunk(resolved, batched, results):
+    """
+    Runs in the execution unit.  Computes every aggregate over the results of a chunk.
+    """
+    return aggregates.compute(resolved, results if batched else [results])
+
+
+def _negate(function, item):
+    return not function(item)
+
+
+def _reduce_chunk(function, initial, results):
+    if initial is None:
+        return functools.reduce(function, results)
+    else:
+        return functools.reduce(function, results, initial)
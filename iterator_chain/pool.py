@@ -0,0 +1,95 @@
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+
+_shared_executors = {}
+_shared_event_loop = None
+_shared_lock = threading.Lock()
+
+
+def shared_executor():
+    """
+    Returns a process pool that can be shared by parallel iterator chains by supplying it as their `executor`.  The pool is started the first time it is needed and stays warm until `shutdown_shared_executor` is called or the interpreter exits.  Its processes only know the functions that existed when they were started, so functions defined afterward, like in a notebook, need a new pool.
+
+    :return: A `ProcessPoolExecutor`.
+    """
+    return _shared(ProcessPoolExecutor)
+
+
+def shared_thread_executor():
+    """
+    Returns the thread pool that is shared by every thread parallel iterator chain that isn't supplied its own executor.  The pool is started the first time it is needed and stays warm until `shutdown_shared_executor` is called or the interpreter exits.
+
+    :return: A `ThreadPoolExecutor`.
+    """
+    return _shared(ThreadPoolExecutor)
+
+
+def shared_event_loop():
+    """
+    Returns the event loop that the coroutines of every iterator chain are run on.  The loop runs in its own thread, which is started the first time the loop is needed and stopped when `shutdown_shared_executor` is called or the interpreter exits.
+
+    :return: An `asyncio` event loop.
+    """
+    global _shared_event_loop
+    with _shared_lock:
+        if _shared_event_loop is None:
+            _shared_event_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_run_event_loop, args=(_shared_event_loop,), name='iterator-chain-event-loop', daemon=True)
+            thread.start()
+        return _shared_event_loop
+
+
+def shutdown_shared_executor(wait=True):
+    """
+    Shuts down the shared process pool, thread pool, and event loop.  New ones are started the next time they are needed.
+
+    :param wait: Keyword.  If set to `True`, this function will not return until all the pending work is done.
+    """
+    global _shared_event_loop
+    with _shared_lock:
+        executors = list(_shared_executors.values())
+        _shared_executors.clear()
+        event_loop, _shared_event_loop = _shared_event_loop, None
+
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+    if event_loop is not None:
+        event_loop.call_soon_threadsafe(event_loop.stop)
+
+
+def _shared(executor_class):
+    with _shared_lock:
+        executor = _shared_executors.get(executor_class)
+        if executor is None:
+            executor = executor_class()
+            _shared_executors[executor_class] = executor
+        return executor
+
+
+def _run_event_loop(event_loop):
+    try:
+        event_loop.run_forever()
+    finally:
+        event_loop.close()
+
+
+def _discard_shared_executor(executor):
+    """
+    Stops handing out `executor` as a shared pool.  Used when the pool can no longer execute work.
+
+    :param executor: The broken executor.
+    """
+    with _shared_lock:
+        if _shared_executors.get(type(executor)) is not executor:
+            return
+        del _shared_executors[type(executor)]
+
+    executor.shutdown(wait=False)
+
+
+atexit.register(shutdown_shared_executor)
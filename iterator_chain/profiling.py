@@ -0,0 +1,255 @@
+import inspect
+import os
+import time
+from functools import wraps
+
+
+_FUNCTION_PARAMETERS = {'function', 'key', 'cmp', 'combine', 'combiner', 'left_key', 'right_key'}
+
+
+class Profiler:
+    def __init__(self, callback=None):
+        """
+        Records how much work each method of an iterator chain does.  Pass it to the function that starts the chain, call
+        the chaining and terminating methods as normal, and then call `report`.
+
+        :param callback: Keyword.  A function that takes one argument.  It is called with the report every time a
+        terminating method finishes.
+        """
+        self._callback = callback
+        self._stages = []
+        self._depth = 0
+        self._active_stage = None
+        self._nested_times = []
+
+    def report(self):
+        """
+        Returns what was recorded for every method in the order they were called.  Each method is a `dict` with the
+        following keys.
+
+        - `method` - The name of the method.
+        - `elements_in` - How many elements the method received.
+        - `elements_out` - How many elements the method produced.  None for terminating methods.
+        - `function_time` - Seconds spent in the functions supplied to the method.
+        - `wall_time` - Seconds spent in the method, not counting the time spent in the other methods.  Methods that are
+          executed together in parallel report their wall time together on the last of them.
+        - `chunks_submitted` - How many chunks were submitted to the parallel execution units.  None for serial methods.
+        - `bytes_pickled` - How many bytes the chunks and their results took up once pickled by the chain's `Serializer`.
+          Shared memory is not counted.  None for serial methods and for chains without a `Serializer`, whose chunks are
+          pickled by the executor, if at all.
+        - `wait_time` - Seconds spent waiting on the parallel execution units.  None for serial methods.
+        - `worker_idle_time` - Seconds the parallel execution units were not executing a chunk while the method was
+          running.  None for serial methods.
+
+        :return: A list of `dict`s.
+        """
+        report = []
+        previous_stage = None
+
+        for stage in self._stages:
+            elements_in = stage.elements_in
+            if elements_in is None and previous_stage is not None:
+                elements_in = previous_stage.elements_out
+
+            parallel = stage.parallel
+            report.append({
+                'method': stage.method,
+                'elements_in': elements_in,
+                'elements_out': stage.elements_out,
+                'function_time': stage.function_time,
+                'wall_time': stage.wall_time,
+                'chunks_submitted': parallel.chunks_submitted if parallel else None,
+                'bytes_pickled': parallel.bytes_pickled if parallel else None,
+                'wait_time': parallel.wait_time if parallel else None,
+                'worker_idle_time': parallel.worker_idle_time() if parallel else None,
+            })
+            previous_stage = stage
+
+        return report
+
+    def _add_stage(self, method):
+        stage = _StageProfile(method)
+        self._stages.append(stage)
+        return stage
+
+    def _start_timing(self):
+        self._nested_times.append(0.0)
+        return time.perf_counter()
+
+    def _stop_timing(self, stage, start):
+        """
+        Adds the time since `start` to the stage's wall time, except for the time that was recorded for other stages in
+        the meantime.
+
+        :param stage: The profile of the method that was running.
+        :param start: What `_start_timing` returned.
+        """
+        elapsed = time.perf_counter() - start
+        stage.wall_time = (stage.wall_time or 0.0) + elapsed - self._nested_times.pop()
+        if self._nested_times:
+            self._nested_times[-1] += elapsed
+
+    def _wrap_output(self, iterator, stage, count=True):
+        """
+        Counts the elements that come out of `iterator` and how long they took to produce, not including the time spent
+        in the previous methods.
+
+        :param iterator: The output of a method.
+        :param stage: The method's profile.
+        :param count: Keyword.  If `False`, only the time is recorded because the elements are counted elsewhere.
+        """
+        if count:
+            stage.elements_out = 0
+
+        while True:
+            start = self._start_timing()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._stop_timing(stage, start)
+
+            if count:
+                stage.elements_out += 1
+            yield item
+
+    def _finish(self):
+        if self._callback is not None:
+            self._callback(self.report())
+
+
+class _StageProfile:
+    def __init__(self, method):
+        self.method = method
+        self.elements_in = None
+        self.elements_out = None
+        self.function_time = None
+        self.wall_time = None
+        self.parallel = None
+        self.terminal = False
+
+    def record_function_time(self, seconds):
+        self.function_time = (self.function_time or 0.0) + seconds
+
+    def record_worker_counts(self, elements_in, elements_out, seconds):
+        self.elements_in = (self.elements_in or 0) + elements_in
+        if elements_out is not None and not self.terminal:
+            self.elements_out = (self.elements_out or 0) + elements_out
+        self.record_function_time(seconds)
+
+
+class _ParallelProfile:
+    def __init__(self):
+        self.chunks_submitted = 0
+        self.bytes_pickled = None
+        self.wait_time = 0.0
+        self.worker_time = 0.0
+        self.first_submit = None
+        self.last_result = None
+
+    def worker_idle_time(self):
+        if self.first_submit is None or self.last_result is None:
+            return 0.0
+        available_time = (self.last_result - self.first_submit) * (os.cpu_count() or 1)
+        return max(0.0, available_time - self.worker_time)
+
+
+class _TimedFunction:
+    def __init__(self, function, stage):
+        self._function = function
+        self._stage = stage
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._function(*args, **kwargs)
+        finally:
+            self._stage.record_function_time(time.perf_counter() - start)
+
+
+def profile_chain_method(wrap_functions=True):
+    """
+    Records the decorated chaining method with the chain's profiler, if the chain has one.
+
+    :param wrap_functions: Keyword.  If `True`, the time spent in the functions supplied to the method is recorded.  Use
+    `False` when the functions are executed elsewhere.
+    """
+    def decorator(original_function):
+        @wraps(original_function)
+        def wrapper(self, *args, **kwargs):
+            profiler = self._profiler
+            if profiler is None or profiler._depth > 0:
+                return original_function(self, *args, **kwargs)
+
+            stage = profiler._add_stage(original_function.__name__)
+            if wrap_functions:
+                args, kwargs = _time_functions(original_function, self, args, kwargs, stage)
+
+            profiler._depth += 1
+            profiler._active_stage = stage
+            # methods like sort consume the previous methods when they are called instead of when they are iterated
+            start = profiler._start_timing()
+            try:
+                chain = original_function(self, *args, **kwargs)
+            finally:
+                profiler._stop_timing(stage, start)
+                profiler._depth -= 1
+                profiler._active_stage = None
+
+            chain._profile_output(stage)
+            return chain
+
+        return wrapper
+
+    return decorator
+
+
+def profile_terminal_method(wrap_functions=True):
+    """
+    Records the decorated terminating method with the chain's profiler, if the chain has one.  The profiler's callback
+    is called once the method finishes.
+
+    :param wrap_functions: Keyword.  If `True`, the time spent in the functions supplied to the method is recorded.  Use
+    `False` when the functions are executed elsewhere.
+    """
+    def decorator(original_function):
+        @wraps(original_function)
+        def wrapper(self, *args, **kwargs):
+            profiler = self._profiler
+            if profiler is None or profiler._depth > 0:
+                return original_function(self, *args, **kwargs)
+
+            stage = profiler._add_stage(original_function.__name__)
+            stage.terminal = True
+            if wrap_functions:
+                args, kwargs = _time_functions(original_function, self, args, kwargs, stage)
+
+            profiler._depth += 1
+            profiler._active_stage = stage
+            start = profiler._start_timing()
+            try:
+                return original_function(self, *args, **kwargs)
+            finally:
+                profiler._stop_timing(stage, start)
+                profiler._depth -= 1
+                profiler._active_stage = None
+                profiler._finish()
+
+        return wrapper
+
+    return decorator
+
+
+def _time_functions(original_function, self, args, kwargs, stage):
+    """
+    Wraps the arguments that are functions to be executed by the method so their time is recorded.
+
+    :return: A tuple of the new positional arguments and keyword arguments.
+    """
+    bound_arguments = inspect.signature(original_function).bind(self, *args, **kwargs)
+    for name, value in bound_arguments.arguments.items():
+        if name in _FUNCTION_PARAMETERS and callable(value):
+            bound_arguments.arguments[name] = _TimedFunction(value, stage)
+
+    return bound_arguments.args[1:], bound_arguments.kwargs
@@ -0,0 +1,181 @@
+import collections
+import hashlib
+import io
+import pickle
+import threading
+from iterator_chain import transport
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+
+_PROTOCOL = 5
+_PROGRAM_CACHE_SIZE = 16
+
+_Payload = collections.namedtuple('_Payload', ['data', 'buffers'])
+
+# the programs already loaded by this execution unit, by their digest
+_programs = collections.OrderedDict()
+_programs_lock = threading.Lock()
+
+
+class Serializer:
+    def __init__(self, codecs=None, use_cloudpickle=None):
+        """
+        Serializes what parallel iterator chains send to and receive from the parallel execution units.  The functions
+        of the chain are serialized once per chain and loaded once per execution unit instead of being pickled with
+        every chunk.  The chunks and their results are pickled with protocol 5, so when the chain has a
+        `shared_memory_threshold`, large `bytes`, `bytearray`s, and out-of-band buffers, like the data of NumPy arrays,
+        are sent through shared memory from anywhere inside the elements.
+
+        :param codecs: Keyword.  A `dict` of a type to a tuple of an encode and a decode function.  The encode function
+        takes an instance of the type and returns something picklable, and the decode function takes that and returns
+        the instance again.  The decode function is pickled by reference, so it must be defined at the top level of a
+        module.
+        :param use_cloudpickle: Keyword.  If `True`, the functions are serialized with cloudpickle, which can serialize
+        lambdas and nested functions.  If `False`, they are serialized with pickle.  If unspecified or None,
+        cloudpickle is used when it is installed.
+        """
+        if use_cloudpickle and cloudpickle is None:
+            raise ImportError('cloudpickle is required to serialize lambdas.  Install it with `pip install iterator-chain[cloudpickle]`.')
+
+        self._codecs = dict(codecs or {})
+        self._use_cloudpickle = cloudpickle is not None if use_cloudpickle is None else use_cloudpickle
+
+    def program(self, function):
+        """
+        Serializes the function that executes the chunks together with the codecs.
+
+        :param function: A function that takes a list of items.
+        :return: A tuple of the digest of the program and the program.
+        """
+        pickler = cloudpickle if self._use_cloudpickle else pickle
+        program = pickler.dumps((function, self._codecs), protocol=_PROTOCOL)
+        return hashlib.blake2b(program, digest_size=16).digest(), program
+
+    def dumps(self, something, threshold=None):
+        """
+        Pickles something with the codecs.
+
+        :param something: Anything picklable.
+        :param threshold: Keyword.  How many bytes an out-of-band buffer must be to be sent through shared memory.  If
+        None, every buffer is pickled in-band.
+        :return: A payload for `loads`.
+        """
+        return dumps(something, self._codecs, threshold)
+
+
+def dumps(something, codecs, threshold=None):
+    """
+    Can run in the execution unit.  Pickles something with pickle protocol 5.  The `bytes` and `bytearray`s and the
+    out-of-band buffers, like the data of NumPy arrays, that are at least `threshold` bytes are moved into shared memory.
+
+    :return: A payload for `loads`.
+    """
+    output = io.BytesIO()
+    if not codecs and threshold is None:
+        # the plain pickler never calls back into Python for each object
+        pickle.Pickler(output, protocol=_PROTOCOL).dump(something)
+        return _Payload(output.getvalue(), [])
+
+    pickler = _Pickler(output, codecs, threshold)
+    try:
+        pickler.dump(something)
+    except BaseException:
+        transport.discard(pickler.shared)
+        raise
+    return _Payload(output.getvalue(), pickler.shared)
+
+
+def loads(payload, delete=False):
+    """
+    Can run in the execution unit.  Unpickles a payload returned by `dumps`.
+
+    :param payload: A payload.
+    :param delete: Keyword.  If `True`, the shared memory is deleted once it is read.
+    :return: What was pickled.
+    """
+    if not payload.buffers:
+        return pickle.loads(payload.data)
+
+    buffers = [transport.receive(shared, delete=delete) for shared in payload.buffers if shared.kind == 'buffer']
+    return _Unpickler(io.BytesIO(payload.data), delete, buffers=buffers).load()
+
+
+def discard(payload):
+    """
+    Deletes the shared memory of the out-of-band buffers of a payload that will never be read.
+    """
+    transport.discard(payload.buffers)
+
+
+def execute(digest, program, threshold, payload):
+    """
+    Runs in the execution unit.  Loads the program, unless this execution unit has already loaded it, executes it against
+    the chunk in the payload, and serializes the results the same way.
+
+    :param digest: The digest of the program.
+    :param program: A program returned by `Serializer.program`.
+    :param threshold: The same as the `threshold` of `dumps`.
+    :param payload: A payload of the chunk.
+    :return: A payload of the results.
+    """
+    function, codecs = _load_program(digest, program)
+    results = function(loads(payload))
+    return dumps(results, codecs, threshold)
+
+
+def _load_program(digest, program):
+    with _programs_lock:
+        if digest in _programs:
+            _programs.move_to_end(digest)
+            return _programs[digest]
+
+    loaded = pickle.loads(program)
+    with _programs_lock:
+        _programs[digest] = loaded
+        if len(_programs) > _PROGRAM_CACHE_SIZE:
+            _programs.popitem(last=False)
+    return loaded
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, codecs, threshold):
+        super(_Pickler, self).__init__(file, protocol=_PROTOCOL, buffer_callback=None if threshold is None else self._share_buffer)
+        self._codecs = codecs
+        self._threshold = threshold
+        self.shared = []
+
+    def persistent_id(self, something):
+        # pickle copies `bytes` and `bytearray`s in-band, so they are moved into shared memory before pickle sees them
+        if self._threshold is None or type(something) not in (bytes, bytearray) or len(something) < self._threshold:
+            return None
+        shared = transport.share(something, self._threshold)
+        self.shared.append(shared)
+        return shared
+
+    def reducer_override(self, something):
+        codec = self._codecs.get(type(something))
+        if codec is None:
+            return NotImplemented
+        encode, decode = codec
+        return decode, (encode(something),)
+
+    def _share_buffer(self, buffer):
+        raw = buffer.raw()
+        if raw.nbytes < self._threshold:
+            # pickled in-band
+            return True
+        self.shared.append(transport.share_buffer(raw))
+        return False
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, delete, buffers=None):
+        super(_Unpickler, self).__init__(file, buffers=buffers)
+        self._delete = delete
+
+    def persistent_load(self, shared):
+        return transport.receive(shared, delete=self._delete)
@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import os
+import pickle
+import sqlite3
+import tempfile
+
+
+_ITEMS_PER_PICKLE = 1024
+# how many runs are merged at once, which bounds how many files each level of runs keeps open
+_MAX_FAN_IN = 64
+
+
+def external_sort(iterator, key=None, reverse=False, max_memory=None):
+    """
+    A generator that sorts the iterator while holding no more than `max_memory` elements in memory at once.  Sorted runs
+    of `max_memory` elements are spilled to temporary files, which are then merged back together as the sorted elements
+    are requested.  The sort is stable, like `sorted`.
+
+    :param iterator: The iterator to sort.
+    :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
+    :param reverse: Keyword.  If set to `True`, the elements will be sorted in the reverse order.
+    :param max_memory: Keyword.  The maximum number of elements to hold in memory at once.
+    """
+    with SpilledRuns(key=key, reverse=reverse) as runs:
+        while True:
+            run = sorted(itertools.islice(iterator, max_memory), key=key, reverse=reverse)
+            if len(run) < max_memory:
+                break
+            runs.add(run)
+
+        # the last run is merged straight from memory, and is everything when it all fit
+        yield from runs.merge(last_run=run)
+
+
+def spill(items):
+    """
+    Writes the items to a temporary file that is deleted once it is closed.
+
+    :param items: An iterable of picklable items.
+    :return: The temporary file, positioned at its start.
+    """
+    spill_file = tempfile.TemporaryFile()
+    try:
+        iterator = iter(items)
+        for batch in iter(lambda: list(itertools.islice(iterator, _ITEMS_PER_PICKLE)), []):
+            pickle.dump(batch, spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        spill_file.seek(0)
+    except BaseException:
+        spill_file.close()
+        raise
+    return spill_file
+
+
+def read_spilled(spill_file):
+    """
+    A generator of the items that `spill` wrote to the file.
+
+    :param spill_file: A file returned by `spill`.
+    """
+    while True:
+        try:
+            batch = pickle.load(spill_file)
+        except EOFError:
+            return
+        yield from batch
+
+
+class SpilledRuns:
+    def __init__(self, key=None, reverse=False):
+        """
+        Sorted runs of elements that are spilled to temporary files.  Whenever `_MAX_FAN_IN` runs of the same size have
+        been spilled, they are merged into a single larger run, so the number of open files only grows with the
+        logarithm of the number of runs.  The runs are merged in the order they were added, so elements that compare
+        equal keep that order.  Use it as a context manager, or call `close`, to delete the files.
+
+        :param key: Keyword.  A function of one argument that is used to extract a comparison key from each element.
+        :param reverse: Keyword.  If `True`, the runs are sorted in the reverse order.
+        """
+        self._key = key
+        self._reverse = reverse
+        # the runs of each size, where every run of a level holds `_MAX_FAN_IN` times the elements of the level before
+        self._levels = []
+
+    def add(self, run):
+        """
+        Spills a run.
+
+        :param run: An iterable of picklable elements that are already sorted.
+        """
+        run_file = spill(run)
+        for runs in self._levels:
+            runs.append(run_file)
+            if len(runs) < _MAX_FAN_IN:
+                return
+            run_file = self._merge_files(runs)
+            runs.clear()
+        self._levels.append([run_file])
+
+    def merge(self, last_run=()):
+        """
+        A generator of every spilled run merged together.
+
+        :param last_run: Keyword.  A sorted iterable that is merged after the spilled runs, for the elements that were
+        never spilled.
+        """
+        # the larger runs hold the earlier elements
+        run_files = [run_file for runs in reversed(self._levels) for run_file in runs]
+        if not run_files:
+            yield from last_run
+            return
+        yield from heapq.merge(*map(read_spilled, run_files), last_run, key=self._key, reverse=self._reverse)
+
+    def close(self):
+        for runs in self._levels:
+            for run_file in runs:
+                run_file.close()
+        self._levels = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def _merge_files(self, run_files):
+        try:
+            return spill(heapq.merge(*map(read_spilled, run_files), key=self._key, reverse=self._reverse))
+        finally:
+            for run_file in run_files:
+                run_file.close()
+
+
+class SpilledSet:
+    def __init__(self, max_memory):
+        """
+        A set that moves its elements to a temporary database on disk every time it holds `max_memory` elements in
+        memory.  The elements on disk are looked up by their hash and then compared for equality, so the set stays
+        exact.  Use it as a context manager, or call `close`, to delete the database.
+
+        :param max_memory: The maximum number of elements to hold in memory at once.
+        """
+        if max_memory < 1:
+            raise ValueError('max_memory must be at least 1')
+
+        self._max_memory = max_memory
+        self._in_memory = set()
+        self._directory = None
+        self._database = None
+
+    def add(self, item):
+        """
+        Adds the item.
+
+        :param item: A hashable and picklable item.
+        :return: `True` if the item was not added before, else `False`.
+        """
+        if item in self._in_memory or self._on_disk(item):
+            return False
+
+        self._in_memory.add(item)
+        if len(self._in_memory) >= self._max_memory:
+            self._spill()
+        return True
+
+    def __contains__(self, item):
+        return item in self._in_memory or self._on_disk(item)
+
+    def close(self):
+        if self._database is not None:
+            self._database.close()
+            self._database = None
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+        self._in_memory.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def _on_disk(self, item):
+        if self._database is None:
+            return False
+        rows = self._database.execute('SELECT item FROM seen WHERE hash = ?', (hash(item),))
+        return any(pickle.loads(row[0]) == item for row in rows)
+
+    def _spill(self):
+        if self._database is None:
+            self._directory = tempfile.TemporaryDirectory()
+            self._database = sqlite3.connect(os.path.join(self._directory.name, 'seen.sqlite'), check_same_thread=False)
+            # the database is thrown away afterward, so it doesn't need to survive a crash
+            self._database.execute('PRAGMA journal_mode = OFF')
+            self._database.execute('PRAGMA synchronous = OFF')
+            self._database.execute('CREATE TABLE seen (hash INTEGER, item BLOB)')
+            self._database.execute('CREATE INDEX seen_hash ON seen (hash)')
+
+        rows = ((hash(item), pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)) for item in self._in_memory)
+        self._database.executemany('INSERT INTO seen VALUES (?, ?)', rows)
+        self._database.commit()
+        self._in_memory.clear()
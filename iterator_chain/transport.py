@@ -0,0 +1,90 @@
+import collections
+import mmap
+import os
+import tempfile
+from iterator_chain.blocks import numpy
+
+
+# on Linux, /dev/shm is backed by memory, so the payloads never touch a disk
+_SHARED_DIRECTORY = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+_SharedPayload = collections.namedtuple('_SharedPayload', ['path', 'kind', 'dtype', 'shape'])
+
+
+def share(item, threshold):
+    """
+    Moves a large `bytes`, `bytearray`, or NumPy array into a shared memory file so only the returned descriptor needs to be pickled.
+
+    :param item: Any item.
+    :param threshold: How many bytes the item must be to be moved.
+    :return: A descriptor of the shared memory file, or the item itself if it isn't moved.
+    """
+    if isinstance(item, (bytes, bytearray)) and len(item) >= threshold:
+        return _SharedPayload(_write(item), type(item).__name__, None, None)
+    if numpy is not None and isinstance(item, numpy.ndarray) and item.nbytes >= threshold and not item.dtype.hasobject:
+        return _SharedPayload(_write(numpy.ascontiguousarray(item).data), 'ndarray', item.dtype.str, item.shape)
+    return item
+
+
+def share_buffer(buffer):
+    """
+    Moves a buffer, like the out-of-band buffers of pickle protocol 5, into a shared memory file.
+
+    :param buffer: An object that supports the buffer protocol.
+    :return: A descriptor of the shared memory file.
+    """
+    return _SharedPayload(_write(buffer), 'buffer', None, None)
+
+
+def receive(item, delete=False):
+    """
+    Reads the item a descriptor returned by `share` or `share_buffer` stands for.  NumPy arrays and buffers are mapped straight from the shared memory file unless it is deleted.
+
+    :param item: A descriptor, or any other item.
+    :param delete: Keyword.  If `True`, the shared memory file is deleted once it is read.
+    :return: The item the descriptor stands for, or the item itself if it isn't a descriptor.
+    """
+    if not isinstance(item, _SharedPayload):
+        return item
+
+    try:
+        with open(item.path, 'rb') as shared_file:
+            if item.kind not in ('ndarray', 'buffer'):
+                data = shared_file.read()
+                return bytearray(data) if item.kind == 'bytearray' else data
+            if delete or os.fstat(shared_file.fileno()).st_size == 0:
+                buffer = bytearray(shared_file.read())
+            else:
+                # copy-on-write, so the function can modify its array without affecting anyone else
+                buffer = mmap.mmap(shared_file.fileno(), 0, access=mmap.ACCESS_COPY)
+            if item.kind == 'buffer':
+                return buffer
+            return numpy.frombuffer(buffer, dtype=item.dtype).reshape(item.shape)
+    finally:
+        if delete:
+            discard([item])
+
+
+def discard(items):
+    """
+    Deletes the shared memory files of any descriptors in the items.
+
+    :param items: An iterable of descriptors or other items.
+    """
+    for item in items:
+        if isinstance(item, _SharedPayload):
+            try:
+                os.remove(item.path)
+            except OSError:
+                pass
+
+
+def _write(data):
+    descriptor, path = tempfile.mkstemp(prefix='iterator-chain-', dir=_SHARED_DIRECTORY)
+    try:
+        with os.fdopen(descriptor, 'wb') as shared_file:
+            shared_file.write(data)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
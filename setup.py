@@ -20,5 +20,9 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules'
     ],
     packages=find_packages(exclude='tests'),
-    install_requires=[]
+    install_requires=[],
+    extras_require={
+        'numpy': ['numpy'],
+        'cloudpickle': ['cloudpickle']
+    }
 )
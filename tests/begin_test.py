@@ -1,4 +1,10 @@
+import threading
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from iterator_chain import begin
+from iterator_chain import pool
+from iterator_chain.profiling import Profiler
 
 
 def test_from_iterable():
@@ -7,3 +13,163 @@ def test_from_iterable():
     new_intermediate = begin.from_iterable(test_iterable)
 
     assert list(new_intermediate._iterator) == test_iterable
+
+
+def test_from_iterable_parallel_owns_its_executor():
+    test_iterable = [4, 3, 8, 5, 1]
+
+    new_intermediate = begin.from_iterable_parallel(test_iterable)
+
+    assert isinstance(new_intermediate._executor, ProcessPoolExecutor)
+    assert new_intermediate._executor is not pool.shared_executor()
+    assert new_intermediate._shutdown_executor
+    assert new_intermediate.list() == test_iterable
+
+
+def test_from_iterable_parallel_with_shared_executor():
+    test_iterable = [4, 3, 8, 5, 1]
+
+    new_intermediate = begin.from_iterable_parallel(test_iterable, executor=pool.shared_executor())
+
+    assert new_intermediate._executor is pool.shared_executor()
+    assert not new_intermediate._shutdown_executor
+
+
+def test_from_iterable_parallel_with_executor():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_executor = ThreadPoolExecutor()
+
+    new_intermediate = begin.from_iterable_parallel(test_iterable, executor=test_executor)
+    del new_intermediate
+
+    assert test_executor.submit(sum, test_iterable).result() == sum(test_iterable)
+    test_executor.shutdown()
+
+
+def test_from_iterable_thread_parallel():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_threads = set()
+
+    def square(item):
+        test_threads.add(threading.current_thread())
+        return item * item
+
+    new_intermediate = begin.from_iterable_thread_parallel(test_iterable)
+
+    assert new_intermediate.map(square).list() == [item * item for item in test_iterable]
+    assert threading.current_thread() not in test_threads
+
+
+def test_from_async_iterable():
+    test_iterable = [4, 3, 8, 5, 1]
+
+    async def async_generator():
+        for item in test_iterable:
+            yield item
+
+    new_intermediate = begin.from_async_iterable(async_generator())
+
+    assert list(new_intermediate._iterator) == test_iterable
+
+
+def test_from_iterable_with_profiler():
+    test_iterable = [4, 3, 8, 5, 1]
+    profiler = Profiler()
+
+    begin.from_iterable(test_iterable, profiler=profiler).map(lambda item: item + 1).list()
+
+    report = profiler.report()
+    assert [stage['method'] for stage in report] == ['from_iterable', 'map', 'list']
+    assert report[0]['elements_out'] == len(test_iterable)
+    assert report[1]['elements_in'] == len(test_iterable)
+
+
+def test_from_iterable_thread_parallel_with_profiler():
+    test_iterable = [4, 3, 8, 5, 1]
+    profiler = Profiler()
+
+    begin.from_iterable_thread_parallel(test_iterable, chunksize=2, profiler=profiler).map(lambda item: item + 1).list()
+
+    report = profiler.report()
+    assert [stage['method'] for stage in report] == ['from_iterable_thread_parallel', 'map', 'list']
+    assert report[1]['elements_out'] == len(test_iterable)
+    assert report[1]['chunks_submitted'] == 3
+
+
+def _write_lines(tmp_path, lines):
+    path = tmp_path / 'test_file'
+    path.write_text(''.join(line + '\n' for line in lines))
+    return str(path)
+
+
+def test_from_lines(tmp_path):
+    test_lines = ['4', '3', '', '8', '5', '1']
+    path = _write_lines(tmp_path, test_lines)
+
+    assert begin.from_lines(path).list() == test_lines
+
+
+def test_from_lines_parallel_matches_serial(tmp_path):
+    test_lines = [str(number) * (number % 7) for number in range(200)]
+    path = _write_lines(tmp_path, test_lines)
+    test_executor = ThreadPoolExecutor()
+
+    serial = begin.from_lines(path).filter(lambda line: len(line) > 2).map(len).list()
+    parallel = begin.from_lines_parallel(path, range_size=64, chunksize=3, executor=test_executor).filter(lambda line: len(line) > 2).map(len).list()
+
+    assert parallel == serial
+    assert begin.from_lines_parallel(path, range_size=64, executor=test_executor).count() == len(test_lines)
+    test_executor.shutdown()
+
+
+def test_from_lines_parallel_reads_in_execution_units(tmp_path):
+    path = _write_lines(tmp_path, ['a', 'b', 'c'])
+    test_executor = ThreadPoolExecutor()
+
+    chain = begin.from_lines_parallel(path, executor=test_executor)
+
+    assert [kind for kind, _ in chain._stages] == ['flat_map']
+    assert chain.list() == ['a', 'b', 'c']
+    test_executor.shutdown()
+
+
+def test_from_records_parallel_matches_serial(tmp_path):
+    path = _write_lines(tmp_path, ['name,count'] + ['row{},{}'.format(number, number) for number in range(50)])
+    test_executor = ThreadPoolExecutor()
+
+    serial = begin.from_records(path, 'csv').list()
+    parallel = begin.from_records_parallel(path, 'csv', range_size=16, executor=test_executor).list()
+
+    assert parallel == serial
+    assert serial[0] == {'name': 'row0', 'count': '0'}
+    assert len(serial) == 50
+    test_executor.shutdown()
+
+
+def test_from_records_jsonl(tmp_path):
+    path = _write_lines(tmp_path, ['{"a": 1}', '[2]', '3'])
+
+    assert begin.from_records(path, 'jsonl').list() == [{'a': 1}, [2], 3]
+
+
+def test_from_records_unknown_format(tmp_path):
+    path = _write_lines(tmp_path, ['a'])
+
+    with pytest.raises(ValueError):
+        begin.from_records(path, 'xml')
+    with pytest.raises(ValueError):
+        begin.from_records_parallel(path, 'xml')
+
+
+def test_from_lines_parallel_with_profiler(tmp_path):
+    path = _write_lines(tmp_path, ['a', 'b', 'c', 'd'])
+    profiler = Profiler()
+    test_executor = ThreadPoolExecutor()
+
+    begin.from_lines_parallel(path, range_size=2, chunksize=1, executor=test_executor, profiler=profiler).map(str.upper).list()
+
+    report = profiler.report()
+    assert [stage['method'] for stage in report] == ['from_lines_parallel', 'map', 'list']
+    assert report[0]['elements_out'] == 4
+    assert report[1]['elements_in'] == 4
+    test_executor.shutdown()
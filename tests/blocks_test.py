@@ -0,0 +1,18 @@
+from iterator_chain import blocks
+
+
+def test_batches():
+    assert list(blocks.batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_unbatch():
+    assert list(blocks.unbatch([[0, 1], [2, 3], [4]])) == [0, 1, 2, 3, 4]
+
+
+def test_reductions_skip_empty_blocks():
+    test_blocks = [[4, 3], [], [8, 5, 1]]
+
+    assert blocks.count(test_blocks) == 5
+    assert blocks.total(test_blocks) == 21
+    assert blocks.minimums(test_blocks) == [3, 1]
+    assert blocks.maximums(test_blocks) == [4, 8]
@@ -0,0 +1,36 @@
+from iterator_chain.bloom import BloomFilter
+
+
+def test_added_items_are_remembered():
+    bloom_filter = BloomFilter(1000, 0.01)
+
+    for item in range(1000):
+        bloom_filter.add(item)
+
+    assert all(item in bloom_filter for item in range(1000))
+
+
+def test_add_reports_new_items():
+    bloom_filter = BloomFilter(1000, 0.01)
+
+    assert bloom_filter.add('Moof') is True
+    assert bloom_filter.add('Moof') is False
+
+
+def test_false_positive_rate():
+    bloom_filter = BloomFilter(1000, 0.01)
+
+    for item in range(1000):
+        bloom_filter.add(item)
+    false_positives = sum(1 for item in range(1000, 11000) if item in bloom_filter)
+
+    assert false_positives < 300
+
+
+def test_invalid_error_rate():
+    try:
+        BloomFilter(1000, 1.5)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('ValueError was not raised')
@@ -0,0 +1,153 @@
+import functools
+import pytest
+from iterator_chain import caching
+
+
+def _lineage(data, *methods):
+    return (caching.source('from_iterable', data),) + methods
+
+
+def test_fingerprint_is_stable():
+    first = caching.fingerprint(_lineage([1, 2], ('map', (lambda item: item * 2,), {})))
+    second = caching.fingerprint(_lineage([1, 2], ('map', (lambda item: item * 2,), {})))
+
+    assert first == second
+
+
+def test_fingerprint_changes_with_function_code():
+    first = caching.fingerprint(_lineage([1, 2], ('map', (lambda item: item * 2,), {})))
+    second = caching.fingerprint(_lineage([1, 2], ('map', (lambda item: item * 3,), {})))
+
+    assert first != second
+
+
+def test_fingerprint_changes_with_closure():
+    def multiplier(factor):
+        return lambda item: item * factor
+
+    first = caching.fingerprint(_lineage([1, 2], ('map', (multiplier(2),), {})))
+    second = caching.fingerprint(_lineage([1, 2], ('map', (multiplier(3),), {})))
+
+    assert first != second
+
+
+def test_fingerprint_changes_with_partial_arguments():
+    first = caching.fingerprint(_lineage([1, 2], ('map', (functools.partial(pow, 2),), {})))
+    second = caching.fingerprint(_lineage([1, 2], ('map', (functools.partial(pow, 3),), {})))
+
+    assert first != second
+
+
+def test_fingerprint_changes_with_data():
+    assert caching.fingerprint(_lineage([1, 2])) != caching.fingerprint(_lineage([1, 3]))
+
+
+def test_fingerprint_changes_with_file(tmp_path):
+    path = tmp_path / 'test_file'
+    path.write_text('first\n')
+    lineage = (caching.source('from_lines', 'utf-8', path=str(path)),)
+    first = caching.fingerprint(lineage)
+
+    path.write_text('first\nsecond\n')
+
+    assert caching.fingerprint(lineage) != first
+
+
+def test_fingerprint_needs_key_for_iterator():
+    with pytest.raises(ValueError):
+        caching.fingerprint(_lineage(iter([1, 2])))
+
+    assert caching.fingerprint(_lineage(iter([1, 2])), key='numbers') == caching.fingerprint(_lineage(iter([3])), key='numbers')
+    assert caching.fingerprint(_lineage(iter([1, 2])), key='numbers') != caching.fingerprint(_lineage(iter([1, 2])), key='others')
+
+
+def test_fingerprint_of_recursive_function():
+    def recursive(item):
+        return item if item < 1 else recursive(item - 1)
+
+    assert caching.fingerprint(_lineage([1], ('map', (recursive,), {}))) == caching.fingerprint(_lineage([1], ('map', (recursive,), {})))
+
+
+_test_multiplier = 2
+
+
+def _test_multiply(item):
+    return item * _test_multiplier
+
+
+def test_fingerprint_changes_with_global_values():
+    global _test_multiplier
+    first = caching.fingerprint(_lineage([1, 2], ('map', (_test_multiply,), {})))
+    _test_multiplier = 3
+    try:
+        second = caching.fingerprint(_lineage([1, 2], ('map', (_test_multiply,), {})))
+    finally:
+        _test_multiplier = 2
+
+    assert first != second
+
+
+def test_fingerprint_of_large_source_is_stable():
+    test_items = list(range(200000))
+
+    assert caching.fingerprint(_lineage(test_items)) == caching.fingerprint(_lineage(list(test_items)))
+    assert caching.fingerprint(_lineage(test_items)) != caching.fingerprint(_lineage(test_items[:-1]))
+
+
+@pytest.mark.parametrize('storage', caching.STORAGES)
+def test_record_then_replay(tmp_path, storage):
+    test_items = list(range(3000))
+
+    assert caching.replay(storage, str(tmp_path), 'test-{}'.format(storage)) is None
+    assert list(caching.record(storage, str(tmp_path), 'test-{}'.format(storage), iter(test_items))) == test_items
+    assert list(caching.replay(storage, str(tmp_path), 'test-{}'.format(storage))) == test_items
+
+
+@pytest.mark.parametrize('storage', caching.STORAGES)
+def test_record_only_when_exhausted(tmp_path, storage):
+    recording = caching.record(storage, str(tmp_path), 'test-partial-{}'.format(storage), iter(range(10)))
+    next(recording)
+    recording.close()
+
+    assert caching.replay(storage, str(tmp_path), 'test-partial-{}'.format(storage)) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_clear_cache(tmp_path):
+    list(caching.record('memory', None, 'test-clear', iter([1])))
+    list(caching.record('disk', str(tmp_path), 'test-clear', iter([1])))
+
+    caching.clear_cache(path=str(tmp_path))
+
+    assert caching.replay('memory', None, 'test-clear') is None
+    assert caching.replay('disk', str(tmp_path), 'test-clear') is None
+
+
+def test_memory_forgets_least_recently_used(monkeypatch):
+    monkeypatch.setattr(caching, '_MAX_MEMORY_CACHES', 2)
+    caching.clear_cache()
+    list(caching.record('memory', None, 'test-first', iter([1])))
+    list(caching.record('memory', None, 'test-second', iter([2])))
+    caching.replay('memory', None, 'test-first')
+    list(caching.record('memory', None, 'test-third', iter([3])))
+
+    assert list(caching.replay('memory', None, 'test-first')) == [1]
+    assert caching.replay('memory', None, 'test-second') is None
+    assert list(caching.replay('memory', None, 'test-third')) == [3]
+
+
+def test_default_directory_is_private(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, 'DEFAULT_DIRECTORY', str(tmp_path / 'cache'))
+
+    list(caching.record('disk', None, 'test-private', iter([1])))
+
+    assert (tmp_path / 'cache').stat().st_mode & 0o777 == 0o700
+    assert list(caching.replay('disk', None, 'test-private')) == [1]
+
+
+def test_default_directory_writable_by_others_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, 'DEFAULT_DIRECTORY', str(tmp_path))
+    tmp_path.chmod(0o777)
+
+    with pytest.raises(PermissionError):
+        caching.replay('disk', None, 'test-shared')
@@ -0,0 +1,75 @@
+import pytest
+from iterator_chain import files
+
+
+def _write(tmp_path, data):
+    path = tmp_path / 'test_file'
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('range_size', [1, 2, 3, 5, 8, 1 << 20])
+def test_read_splits_lines_on_every_range_boundary(tmp_path, range_size):
+    test_lines = ['first', '', 'third line', 'ünïcödé', 'x', 'last']
+    path = _write(tmp_path, '\n'.join(test_lines).encode() + b'\n')
+
+    assert list(files.read(path, 'utf-8', range_size=range_size)) == test_lines
+
+
+@pytest.mark.parametrize('range_size', [1, 4, 1 << 20])
+def test_read_without_trailing_newline(tmp_path, range_size):
+    path = _write(tmp_path, b'a\nbb\nccc')
+
+    assert list(files.read(path, 'utf-8', range_size=range_size)) == ['a', 'bb', 'ccc']
+
+
+@pytest.mark.parametrize('range_size', [1, 3, 1 << 20])
+def test_read_strips_crlf(tmp_path, range_size):
+    path = _write(tmp_path, b'a\r\nbb\r\nccc\r\n')
+
+    assert list(files.read(path, 'utf-8', range_size=range_size)) == ['a', 'bb', 'ccc']
+
+
+def test_read_empty_file(tmp_path):
+    path = _write(tmp_path, b'')
+
+    assert list(files.read(path, 'utf-8')) == []
+
+
+def test_byte_ranges_cover_file(tmp_path):
+    path = _write(tmp_path, b'0123456789')
+
+    assert files.byte_ranges(path, range_size=4) == [(0, 4), (4, 8), (8, 10)]
+    assert files.byte_ranges(path, range_size=4, start=3) == [(3, 7), (7, 10)]
+
+
+@pytest.mark.parametrize('range_size', [2, 1 << 20])
+def test_read_jsonl(tmp_path, range_size):
+    path = _write(tmp_path, b'{"a": 1}\n\n[2, 3]\n"four"\n')
+
+    assert list(files.read(path, 'utf-8', fmt='jsonl', range_size=range_size)) == [{'a': 1}, [2, 3], 'four']
+
+
+@pytest.mark.parametrize('range_size', [2, 1 << 20])
+def test_read_csv(tmp_path, range_size):
+    path = _write(tmp_path, b'name,count\r\nfirst,1\r\n"se,cond",2\r\n')
+
+    records = list(files.read(path, 'utf-8', fmt='csv', range_size=range_size))
+
+    assert records == [{'name': 'first', 'count': '1'}, {'name': 'se,cond', 'count': '2'}]
+
+
+def test_encode_and_write_round_trip(tmp_path):
+    path = str(tmp_path / 'test_file')
+    test_records = [{'name': 'first', 'count': '1'}, {'name': 'se,cond', 'count': '2'}]
+
+    written = files.write(path, 'utf-8', 'csv', None, [files.encode('csv', 'utf-8', None, test_records)])
+
+    assert written == 2
+    assert list(files.read(path, 'utf-8', fmt='csv')) == test_records
+
+
+def test_check_format():
+    files.check_format('jsonl')
+    with pytest.raises(ValueError):
+        files.check_format('xml')
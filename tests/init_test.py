@@ -3,3 +3,37 @@ import iterator_chain
 
 def test_init_direct_reference():
     assert iterator_chain.from_iterable == iterator_chain.begin.from_iterable
+
+
+def test_init_shared_executor_reference():
+    assert iterator_chain.shared_executor == iterator_chain.pool.shared_executor
+
+
+def test_init_from_iterable_thread_parallel_reference():
+    assert iterator_chain.from_iterable_thread_parallel == iterator_chain.begin.from_iterable_thread_parallel
+
+
+def test_init_from_async_iterable_reference():
+    assert iterator_chain.from_async_iterable == iterator_chain.begin.from_async_iterable
+
+
+def test_init_profiler_reference():
+    assert iterator_chain.Profiler == iterator_chain.profiling.Profiler
+
+
+def test_init_from_lines_reference():
+    assert iterator_chain.from_lines == iterator_chain.begin.from_lines
+    assert iterator_chain.from_records == iterator_chain.begin.from_records
+
+
+def test_init_from_lines_parallel_reference():
+    assert iterator_chain.from_lines_parallel == iterator_chain.begin.from_lines_parallel
+    assert iterator_chain.from_records_parallel == iterator_chain.begin.from_records_parallel
+
+
+def test_init_serializer_reference():
+    assert iterator_chain.Serializer == iterator_chain.serialization.Serializer
+
+
+def test_init_clear_cache_reference():
+    assert iterator_chain.clear_cache == iterator_chain.caching.clear_cache
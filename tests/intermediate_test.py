@@ -1,3 +1,11 @@
+import asyncio
+import gc
+import inspect
+import operator
+import pytest
+import weakref
+from iterator_chain import blocks
+from iterator_chain import caching
 from iterator_chain.intermediate import _IntermediateIteratorChain
 
 
@@ -52,6 +60,54 @@ def test_map():
     assert new_intermediate.list() == [item * item for item in test_iterable]
 
 
+def test_amap():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    async def square(item):
+        await asyncio.sleep(0.001 * item)
+        return item * item
+
+    new_intermediate = test_object.amap(square, concurrency=2)
+
+    assert new_intermediate.list() == [item * item for item in test_iterable]
+
+
+def test_amap_limits_concurrency():
+    test_iterable = range(20)
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+    running = []
+    most_running = []
+
+    async def track(item):
+        running.append(item)
+        most_running.append(len(running))
+        await asyncio.sleep(0.001)
+        running.remove(item)
+        return item
+
+    new_intermediate = test_object.amap(track, concurrency=3)
+
+    assert new_intermediate.list() == list(test_iterable)
+    assert max(most_running) <= 3
+
+
+def test_afilter():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    async def greater_than_four(item):
+        await asyncio.sleep(0)
+        return item > 4
+
+    new_intermediate = test_object.afilter(greater_than_four)
+
+    assert new_intermediate.list() == [8, 5]
+
+
 def test_skip():
     test_iterable = [4, 3, 8, 5, 1]
     test_iterator = iter(test_iterable)
@@ -93,6 +149,47 @@ def test_distinct():
     assert new_intermediate.list() == [4, 3, 5, 1]
 
 
+def test_distinct_with_key():
+    test_iterable = [{'id': 4, 'name': 'a'}, {'id': 3, 'name': 'b'}, {'id': 4, 'name': 'c'}, {'id': 5, 'name': 'd'}]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    new_intermediate = test_object.distinct(key=lambda item: item['id'])
+
+    assert [item['name'] for item in new_intermediate.list()] == ['a', 'b', 'd']
+
+
+def test_distinct_disk():
+    test_iterable = [item % 17 for item in range(100)]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    new_intermediate = test_object.distinct(mode='disk', max_memory=4)
+
+    assert new_intermediate.list() == list(range(17))
+
+
+def test_distinct_approximate():
+    test_iterable = [item % 17 for item in range(100)]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    new_intermediate = test_object.distinct(mode='approximate', capacity=100, error_rate=0.0001)
+
+    assert new_intermediate.list() == list(range(17))
+
+
+def test_distinct_unknown_mode():
+    test_object = _IntermediateIteratorChain(iter([4, 3, 4]))
+
+    try:
+        test_object.distinct(mode='moof')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('ValueError was not raised')
+
+
 def test_reduce():
     test_iterable = [4, 3, 8, 5, 6]
     test_iterator = iter(test_iterable)
@@ -312,6 +409,57 @@ def test_last_with_default():
     assert actual_last == test_default
 
 
+def test_aggregate():
+    test_iterable = [4, 3, 8, 5, 6]
+    test_object = _IntermediateIteratorChain(iter(test_iterable))
+
+    actual_aggregates = test_object.aggregate(count='count', total='sum', smallest='min', largest='max', first='first', last='last', mean='mean', product=(1, operator.mul))
+
+    assert actual_aggregates == {'count': 5, 'total': 26, 'smallest': 3, 'largest': 8, 'first': 4, 'last': 6, 'mean': 5.2, 'product': 2880}
+
+
+def test_aggregate_empty():
+    actual_aggregates = _IntermediateIteratorChain(iter([])).aggregate(count='count', total='sum', largest='max', mean='mean')
+
+    assert actual_aggregates == {'count': 0, 'total': 0, 'largest': None, 'mean': None}
+
+
+def test_aggregate_single_pass():
+    test_iterator = iter(range(3000))
+
+    assert _IntermediateIteratorChain(test_iterator).fan_out('count', 'max', 'last') == (3000, 2999, 2999)
+    assert next(test_iterator, None) is None
+
+
+def test_aggregate_batched():
+    test_object = _IntermediateIteratorChain(iter([4, 3, 8, 5, 6])).batch(2)
+
+    assert test_object.fan_out('count', 'sum', 'min', 'first', 'last') == (5, 26, 3, 4, 6)
+
+
+def test_aggregate_unknown():
+    with pytest.raises(ValueError):
+        _IntermediateIteratorChain(iter([1])).aggregate(median='median')
+
+
+def test_tee():
+    test_object = _IntermediateIteratorChain(iter([4, 3, 8]))
+
+    first, second = test_object.tee()
+
+    assert first.map(lambda item: item * 2).list() == [8, 6, 16]
+    assert second.sum() == 15
+
+
+def test_tee_buffer_size():
+    first, second = _IntermediateIteratorChain(iter(range(10))).tee(buffer_size=3)
+
+    assert first.limit(3).list() == [0, 1, 2]
+    assert second.limit(6).list() == [0, 1, 2, 3, 4, 5]
+    with pytest.raises(BufferError):
+        second.list()
+
+
 def test_for_each():
     test_iterable = [4, 3, 8, 5, 6]
     test_iterator = iter(test_iterable)
@@ -324,6 +472,275 @@ def test_for_each():
     assert test_call == test_iterable
 
 
+def test_to_file(tmp_path):
+    test_iterable = [4, 'three', 8.5]
+    test_object = _IntermediateIteratorChain(iter(test_iterable))
+    path = tmp_path / 'output.txt'
+
+    written = test_object.to_file(str(path))
+
+    assert written == 3
+    assert path.read_text() == '4\nthree\n8.5\n'
+
+
+def test_to_file_append(tmp_path):
+    path = tmp_path / 'output.txt'
+    path.write_text('first\n')
+
+    _IntermediateIteratorChain(iter(['second'])).to_file(str(path), append=True)
+
+    assert path.read_text() == 'first\nsecond\n'
+
+
+def test_to_jsonl_batched(tmp_path):
+    test_iterable = [{'a': 1}, [2], None, 'four']
+    test_object = _IntermediateIteratorChain(iter(test_iterable)).batch(3)
+    path = tmp_path / 'output.jsonl'
+
+    written = test_object.to_jsonl(str(path))
+
+    assert written == len(test_iterable)
+    assert path.read_text() == '{"a": 1}\n[2]\nnull\n"four"\n'
+
+
+def test_to_csv(tmp_path):
+    test_iterable = [{'name': 'first', 'count': 1}, {'name': 'se,cond', 'count': 2}]
+    path = tmp_path / 'output.csv'
+
+    written = _IntermediateIteratorChain(iter(test_iterable)).to_csv(str(path))
+
+    assert written == 2
+    assert path.read_bytes() == b'name,count\r\nfirst,1\r\n"se,cond",2\r\n'
+
+
+def test_to_csv_sequences_with_fieldnames(tmp_path):
+    path = tmp_path / 'output.csv'
+
+    _IntermediateIteratorChain(iter([(1, 2), (3, 4)])).to_csv(str(path), fieldnames=['x', 'y'])
+
+    assert path.read_bytes() == b'x,y\r\n1,2\r\n3,4\r\n'
+
+
+def test_to_csv_different_fields_across_batches(tmp_path):
+    test_iterable = [{'a': 1}] * blocks.DEFAULT_SIZE + [{'b': 2}]
+
+    with pytest.raises(ValueError):
+        _IntermediateIteratorChain(iter(test_iterable)).to_csv(str(tmp_path / 'output.csv'))
+
+
+def test_join():
+    test_left = [(1, 'a'), (2, 'b'), (3, 'c'), (2, 'd')]
+    test_right = [(2, 'x'), (4, 'y'), (2, 'z')]
+    key = operator.itemgetter(0)
+
+    def join(how, build=None):
+        return _IntermediateIteratorChain(iter(test_left)).join(_IntermediateIteratorChain(iter(test_right)), key, how=how, build=build).list()
+
+    inner = [((2, 'b'), (2, 'x')), ((2, 'b'), (2, 'z')), ((2, 'd'), (2, 'x')), ((2, 'd'), (2, 'z'))]
+    assert join('inner') == inner
+    assert join('left') == [((1, 'a'), None)] + inner[:2] + [((3, 'c'), None)] + inner[2:]
+    assert sorted(join('right'), key=repr) == sorted(inner + [(None, (4, 'y'))], key=repr)
+    assert len(join('outer')) == 7
+    for how in ('inner', 'left', 'right', 'outer'):
+        assert sorted(join(how, build='left'), key=repr) == sorted(join(how, build='right'), key=repr)
+
+
+def test_join_with_right_key_and_iterable():
+    test_object = _IntermediateIteratorChain(iter([1, 2, 3]))
+
+    actual_list = test_object.join(['one', 'three'], lambda item: item, right_key=len).list()
+
+    assert actual_list == [(3, 'one')]
+
+
+def test_join_invalid_how():
+    with pytest.raises(ValueError):
+        _IntermediateIteratorChain(iter([1])).join([1], lambda item: item, how='cross')
+
+
+def test_merge_join():
+    test_left = [1, 2, 2, 4, 6]
+    test_right = [2, 3, 4, 4, 7]
+    identity = lambda item: item
+
+    def merge_join(how):
+        return _IntermediateIteratorChain(iter(test_left)).merge_join(_IntermediateIteratorChain(iter(test_right)), identity, how=how).list()
+
+    for how in ('inner', 'left', 'right', 'outer'):
+        hash_joined = _IntermediateIteratorChain(iter(test_left)).join(test_right, identity, how=how).list()
+        assert sorted(merge_join(how), key=repr) == sorted(hash_joined, key=repr)
+    assert merge_join('inner') == [(2, 2), (2, 2), (4, 4), (4, 4)]
+    assert merge_join('outer') == [(1, None), (2, 2), (2, 2), (None, 3), (4, 4), (4, 4), (6, None), (None, 7)]
+
+
+def test_zip_with():
+    test_object = _IntermediateIteratorChain(iter([1, 2, 3]))
+
+    actual_list = test_object.zip_with(_IntermediateIteratorChain(iter('ab'))).list()
+
+    assert actual_list == [(1, 'a'), (2, 'b')]
+
+
+def _record_cache_call(item):
+    # kept on the global function, because the contents of closures and the values of other globals are part of the
+    # fingerprint
+    _record_cache_call.calls.append(item)
+    return item * 2
+
+
+_record_cache_call.calls = []
+
+
+def _cacheable(test_iterable):
+    return _IntermediateIteratorChain(iter(test_iterable), lineage=(caching.source('from_iterable', test_iterable),))
+
+
+@pytest.mark.parametrize('storage', caching.STORAGES)
+def test_cache_replays(tmp_path, storage):
+    test_iterable = [4, 3, 8, 5, storage]
+    _record_cache_call.calls.clear()
+
+    first = _cacheable(test_iterable).map(_record_cache_call).cache(storage=storage, path=str(tmp_path)).filter(lambda item: item != 16).list()
+    second = _cacheable(test_iterable).map(_record_cache_call).cache(storage=storage, path=str(tmp_path)).list()
+
+    assert first == [8, 6, 10, storage * 2]
+    assert second == [8, 6, 16, 10, storage * 2]
+    assert _record_cache_call.calls == test_iterable
+
+
+def test_cache_invalidated_by_function(tmp_path):
+    test_iterable = [4, 3, 8]
+
+    doubled = _cacheable(test_iterable).map(lambda item: item * 2).cache(storage='disk', path=str(tmp_path)).list()
+    tripled = _cacheable(test_iterable).map(lambda item: item * 3).cache(storage='disk', path=str(tmp_path)).list()
+
+    assert doubled == [8, 6, 16]
+    assert tripled == [12, 9, 24]
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_cache_not_written_until_exhausted(tmp_path):
+    test_iterable = list(range(5000))
+
+    assert _cacheable(test_iterable).cache(storage='disk', path=str(tmp_path)).first() == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_batched(tmp_path):
+    test_iterable = list(range(10))
+
+    first = _cacheable(test_iterable).batch(4).cache(storage='disk', path=str(tmp_path)).list()
+    second = _cacheable(test_iterable).batch(4).cache(storage='disk', path=str(tmp_path))
+
+    assert first == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert second.list() == first
+    assert _cacheable(test_iterable).batch(4).cache(storage='disk', path=str(tmp_path)).sum() == 45
+
+
+def test_cache_key():
+    with pytest.raises(ValueError):
+        _IntermediateIteratorChain(iter([1]), lineage=(caching.source('from_iterable', iter([1])),)).cache()
+
+    first = _IntermediateIteratorChain(iter([1, 2]), lineage=(caching.source('from_iterable', iter([1, 2])),)).cache(key='test_cache_key').list()
+    second = _IntermediateIteratorChain(iter([]), lineage=(caching.source('from_iterable', iter([])),)).cache(key='test_cache_key').list()
+
+    assert first == second == [1, 2]
+
+
+def test_cache_lineage_does_not_keep_other_chains():
+    other = _cacheable([5, 6])
+    other_reference = weakref.ref(other)
+
+    zipped = _cacheable([1, 2]).zip_with(other).cache()
+    del other
+
+    assert zipped.list() == [(1, 5), (2, 6)]
+    gc.collect()
+    assert other_reference() is None
+    assert _cacheable([1, 2]).zip_with(_cacheable([5, 6])).cache().list() == [(1, 5), (2, 6)]
+
+
+def test_cache_with_other_iterator_needs_key():
+    with pytest.raises(ValueError):
+        _cacheable([1, 2]).zip_with(iter([5, 6])).cache()
+
+
+def test_cache_invalid_storage():
+    with pytest.raises(ValueError):
+        _cacheable([1]).cache(storage='cloud')
+
+
+def test_chunked():
+    test_object = _IntermediateIteratorChain(iter(range(7)))
+
+    new_intermediate = test_object.chunked(3)
+
+    assert new_intermediate.count() == 3
+    assert _IntermediateIteratorChain(iter(range(7))).chunked(3).list() == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_chunked_invalid_size():
+    with pytest.raises(ValueError):
+        _IntermediateIteratorChain(iter(range(7))).chunked(0)
+
+
+def test_sliding_window():
+    assert _IntermediateIteratorChain(iter(range(5))).sliding_window(3).list() == [(0, 1, 2), (1, 2, 3), (2, 3, 4)]
+    assert _IntermediateIteratorChain(iter(range(8))).sliding_window(3, step=2).list() == [(0, 1, 2), (2, 3, 4), (4, 5, 6)]
+    assert _IntermediateIteratorChain(iter(range(8))).sliding_window(2, step=3).list() == [(0, 1), (3, 4), (6, 7)]
+    assert _IntermediateIteratorChain(iter(range(2))).sliding_window(3).list() == []
+
+
+def test_sliding_window_invalid_step():
+    with pytest.raises(ValueError):
+        _IntermediateIteratorChain(iter(range(5))).sliding_window(3, step=0)
+
+
+def test_window_by():
+    test_iterable = [{'time': 0.5}, {'time': 3}, {'time': 10}, {'time': 19.5}, {'time': 40}]
+    test_object = _IntermediateIteratorChain(iter(test_iterable))
+
+    actual_windows = test_object.window_by(lambda event: event['time'], 10).list()
+
+    assert actual_windows == [(0, test_iterable[:2]), (10, test_iterable[2:4]), (40, test_iterable[4:])]
+
+
+def test_group_by():
+    test_iterable = ['apple', 'bear', 'avocado', 'cat', 'banana']
+    test_object = _IntermediateIteratorChain(iter(test_iterable))
+
+    actual_groups = test_object.group_by(lambda item: item[0]).list()
+
+    assert actual_groups == [('a', ['apple', 'avocado']), ('b', ['bear', 'banana']), ('c', ['cat'])]
+
+
+def test_count_by():
+    test_iterable = [4, 3, 8, 5, 6, 1]
+    test_object = _IntermediateIteratorChain(iter(test_iterable))
+
+    actual_counts = test_object.count_by(lambda item: item % 2 == 0).list()
+
+    assert actual_counts == [(True, 3), (False, 3)]
+
+
+def test_aggregate_by():
+    test_iterable = [4, 3, 8, 5, 6, 1]
+    test_object = _IntermediateIteratorChain(iter(test_iterable))
+
+    actual_aggregates = test_object.aggregate_by(lambda item: item % 3, 0, lambda total, item: total + item).list()
+
+    assert actual_aggregates == [(1, 5), (0, 9), (2, 13)]
+
+
+def test_group_by_is_lazy():
+    test_iterator = iter([1, 2, 3])
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    test_object.group_by(lambda item: item)
+
+    assert next(test_iterator) == 1
+
+
 def test_reverse():
     test_iterable = [4, 3, 8, 5, 6]
     test_iterator = iter(test_iterable)
@@ -385,6 +802,191 @@ def test_sort_with_cmp():
     assert actual_sort == sorted(test_iterable, key=test_key)
 
 
+def test_sort_max_memory():
+    test_iterable = [(item * 7) % 23 for item in range(50)]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    actual_sort = test_object.sort(max_memory=8).list()
+
+    assert actual_sort == sorted(test_iterable)
+
+
+def test_sort_max_memory_is_stable():
+    test_iterable = [{'inner': item % 4, 'order': item} for item in range(30)]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+    test_key = lambda item: item['inner']
+
+    actual_sort = test_object.sort(key=test_key, reverse=True, max_memory=4).list()
+
+    assert actual_sort == sorted(test_iterable, key=test_key, reverse=True)
+
+
+def test_sort_max_memory_with_cmp():
+    test_iterable = [{'inner': 8}, {'inner': 2}, {'inner': 6}, {'inner': 3}, {'inner': 9}]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+    test_key = lambda item: item['inner']
+
+    actual_sort = test_object.sort(cmp=_test_cmp, max_memory=2).list()
+
+    assert actual_sort == sorted(test_iterable, key=test_key)
+
+
+def test_sort_max_memory_is_lazy():
+    consumed = []
+
+    def generator():
+        for item in [4, 3, 8, 5, 6]:
+            consumed.append(item)
+            yield item
+
+    test_object = _IntermediateIteratorChain(generator())
+
+    new_intermediate = test_object.sort(max_memory=2)
+
+    assert consumed == []
+    assert new_intermediate.first() == 3
+
+
+def test_sort_max_memory_fits_in_memory():
+    test_iterable = [4, 3, 8, 5, 6]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    actual_sort = test_object.sort(max_memory=10).list()
+
+    assert actual_sort == sorted(test_iterable)
+
+
+def test_top():
+    test_iterable = [{'inner': item % 7, 'order': item} for item in range(30)]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+    test_key = lambda item: item['inner']
+
+    actual_top = test_object.top(4, key=test_key).list()
+
+    assert actual_top == sorted(test_iterable, key=test_key, reverse=True)[:4]
+
+
+def test_bottom():
+    test_iterable = [4, 3, 8, 5, 6, 1, 9]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    actual_bottom = test_object.bottom(3).list()
+
+    assert actual_bottom == [1, 3, 4]
+
+
+def test_sort_then_limit_selects():
+    test_iterable = [{'inner': item % 7, 'order': item} for item in range(30)]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    sorted_intermediate = test_object.sort(cmp=_test_cmp, reverse=True)
+    actual_limit = sorted_intermediate.limit(5).list()
+
+    assert actual_limit == sorted(test_iterable, key=lambda item: item['inner'], reverse=True)[:5]
+    assert inspect.getgeneratorstate(sorted_intermediate._sort_spec.sorted_iterator) == inspect.GEN_CREATED
+
+
+def test_sort_then_limit_after_iterating():
+    test_iterable = [4, 3, 8, 5, 6, 1, 9]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    sorted_intermediate = test_object.sort()
+    first = sorted_intermediate.first()
+
+    assert first == 1
+    assert sorted_intermediate.limit(2).list() == [3, 4]
+
+
+def test_sort_then_limit_none():
+    test_iterable = [3, 1, 2]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    assert test_object.sort().limit(None).list() == [1, 2, 3]
+
+
+def test_sort_then_limit_negative():
+    test_iterable = [3, 1, 2]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    with pytest.raises(ValueError):
+        test_object.sort().limit(-1).list()
+
+
+def test_batch():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    new_intermediate = test_object.batch(2)
+
+    assert new_intermediate.list() == [[4, 3], [8, 5], [1]]
+
+
+def test_batch_invalid_size():
+    with pytest.raises(ValueError):
+        _IntermediateIteratorChain(iter(range(10))).batch(0)
+
+
+def test_batch_terminals():
+    test_iterable = [4, 3, 8, 5, 1]
+
+    assert _IntermediateIteratorChain(iter(test_iterable)).batch(2).count() == 5
+    assert _IntermediateIteratorChain(iter(test_iterable)).batch(2).sum() == 21
+    assert _IntermediateIteratorChain(iter(test_iterable)).batch(2).min() == 1
+    assert _IntermediateIteratorChain(iter(test_iterable)).batch(2).max() == 8
+    assert _IntermediateIteratorChain(iter([])).batch(2).max(default='Moof') == 'Moof'
+
+
+def test_map_batches():
+    test_iterable = list(range(3000))
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    new_intermediate = test_object.map_batches(lambda block: [item * 2 for item in block])
+
+    assert new_intermediate.count() == len(test_iterable)
+
+
+def test_unbatch():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    new_intermediate = test_object.batch(2).map_batches(lambda block: block[::-1]).unbatch()
+
+    assert new_intermediate.list() == [3, 4, 5, 8, 1]
+    assert new_intermediate.count() == 0
+
+
+def test_batch_array():
+    numpy = pytest.importorskip('numpy')
+    test_iterable = [4.0, 3.0, 8.0, 5.0, 1.0]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    new_intermediate = test_object.batch(2, array=True).map_batches(lambda block: block * 2)
+
+    assert new_intermediate.sum() == 42.0
+
+
+def test_batch_array_without_numpy(monkeypatch):
+    monkeypatch.setattr(blocks, 'numpy', None)
+    test_object = _IntermediateIteratorChain(iter([4, 3]))
+
+    with pytest.raises(ImportError):
+        test_object.batch(2, array=True)
+
+
 def test_flatten():
     test_iterable = [[4, 3], 'DogCow', 5, {'dogCow': 'Moof', 'meep': 'moop'}]
     test_iterator = iter(test_iterable)
@@ -393,3 +995,34 @@ def test_flatten():
     actual_flatten = test_object.flatten().list()
 
     assert actual_flatten == [4, 3, 'DogCow', 5, ('dogCow', 'Moof'), ('meep', 'moop')]
+
+
+def test_flatten_nested():
+    test_iterable = [[4, [3, (8, [5])]], [[{'dogCow': 'Moof'}]], 6]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    actual_flatten = test_object.flatten().list()
+
+    assert actual_flatten == [4, 3, 8, 5, ('dogCow', 'Moof'), 6]
+
+
+def test_flatten_depth():
+    test_iterable = [[4, [3, [8]]], {'dogCow': 'Moof'}, 5]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateIteratorChain(test_iterator)
+
+    actual_flatten = test_object.flatten(depth=1).list()
+
+    assert actual_flatten == [4, [3, [8]], ('dogCow', 'Moof'), 5]
+
+
+def test_flatten_deeper_than_recursion_limit():
+    test_iterable = [1]
+    for _ in range(10000):
+        test_iterable = [test_iterable]
+    test_object = _IntermediateIteratorChain(iter([test_iterable, 2]))
+
+    actual_flatten = test_object.flatten().list()
+
+    assert actual_flatten == [1, 2]
@@ -1,20 +1,35 @@
 from concurrent.futures import Executor
 from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import time
 import inspect
+import os
+import itertools
+import operator
 from iterator_chain.parallel_intermediate import _IntermediateParallelIteratorChain
+from iterator_chain.parallel_intermediate import _AdaptiveChunksizer
 from iterator_chain.intermediate import _IntermediateIteratorChain
+from iterator_chain.profiling import Profiler
+from iterator_chain import caching
+from iterator_chain import transport
+from iterator_chain import serialization
 
 
 class SerialExecutor(Executor):
     def __init__(self):
         self.shutdown_called = False
+        self.submit_count = 0
+        self.results = []
 
     def submit(self, fn, *args, **kwargs):
+        self.submit_count += 1
         submit_future = Future()
 
         try:
             submit_result = fn(*args, **kwargs)
             submit_future.set_result(submit_result)
+            self.results.append(submit_result)
         except Exception as exception:
             submit_future.set_exception(exception)
 
@@ -25,6 +40,31 @@ class SerialExecutor(Executor):
         super(SerialExecutor, self).shutdown(wait=wait)
 
 
+class LazyFuture(Future):
+    def __init__(self, fn, args):
+        super(LazyFuture, self).__init__()
+        self._fn = fn
+        self._args = args
+
+    def result(self, timeout=None):
+        if not self.done():
+            self.set_result(self._fn(*self._args))
+        return super(LazyFuture, self).result(timeout=timeout)
+
+
+class LazyExecutor(Executor):
+    def __init__(self, eager_count=0):
+        self.futures = []
+        self.eager_count = eager_count
+
+    def submit(self, fn, *args, **kwargs):
+        lazy_future = LazyFuture(fn, args)
+        self.futures.append(lazy_future)
+        if len(self.futures) <= self.eager_count:
+            lazy_future.result()
+        return lazy_future
+
+
 # Ensure that all public methods of _IntermediateIteratorChain are overloaded by _IntermediateParallelIteratorChain
 def test_correct_overloading():
     parent_class_methods = {method[0]: method[1] for method in inspect.getmembers(_IntermediateIteratorChain, predicate=inspect.isfunction)}
@@ -73,6 +113,37 @@ def test_executor_shutdowns_when_exception_raised():
     assert executor.shutdown_called is True
 
 
+def test_executor_not_shutdown_when_not_owned():
+    executor = SerialExecutor()
+
+    def inner_scope():
+        test_iterable = [4, 3, 8, 5, 1]
+        test_iterator = iter(test_iterable)
+        test_object = _IntermediateParallelIteratorChain(test_iterator, executor, shutdown_executor=False)
+
+        try:
+            test_object.map(lambda item: item / 0).list()
+        except ZeroDivisionError:
+            pass
+
+    inner_scope()
+
+    assert executor.shutdown_called is False
+
+
+def test_executions_cancelled_when_exception_raised_and_not_owned():
+    executor = LazyExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(range(10)), executor, chunksize=1, max_in_flight=4, shutdown_executor=False)
+
+    try:
+        test_object.map(lambda item: 1 / item).list()
+    except ZeroDivisionError:
+        pass
+
+    assert len(executor.futures) == 4
+    assert all(future.cancelled() for future in executor.futures[1:])
+
+
 # Chain methods parallel
 def test_map():
     test_iterable = [4, 3, 8, 5, 1]
@@ -95,7 +166,73 @@ def test_filter():
     assert new_intermediate.list() == list(filter(test_lambda, [4, 3, 8, 5, 1]))
 
 
+def test_consecutive_stages_are_fused():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=len(test_iterable))
+
+    new_intermediate = test_object.map(lambda item: item * 2).filter(lambda item: item > 8).map(lambda item: item + 1)
+
+    assert new_intermediate.list() == [17, 11]
+    assert executor.submit_count == 1
+
+
+def test_filter_only_returns_indices_of_kept_items():
+    test_iterable = [{'inner': 4}, {'inner': 3}, {'inner': 8}, {'inner': 5}, {'inner': 1}]
+    test_iterator = iter(test_iterable)
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=len(test_iterable))
+
+    new_intermediate = test_object.filter(lambda item: item['inner'] > 3).filter(lambda item: item['inner'] < 8)
+
+    assert new_intermediate.list() == [{'inner': 4}, {'inner': 5}]
+    assert executor.results == [[0, 3]]
+
+
+def test_stages_with_different_chunksizes_are_not_fused():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateParallelIteratorChain(test_iterator, SerialExecutor(), chunksize=2)
+
+    new_intermediate = test_object.map(lambda item: item * 2).filter(lambda item: item > 8, chunksize=3)
+
+    assert new_intermediate.list() == [16, 10]
+
+
 # Chain methods work the same as serial
+def test_amap():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, SerialExecutor())
+
+    async def square(item):
+        return item * item
+
+    new_serial_intermediate = test_serial_object.amap(square)
+    new_parallel_intermediate = test_parallel_object.amap(square)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+
+
+def test_afilter():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, SerialExecutor())
+
+    async def greater_than_four(item):
+        return item > 4
+
+    new_serial_intermediate = test_serial_object.afilter(greater_than_four)
+    new_parallel_intermediate = test_parallel_object.afilter(greater_than_four)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+
+
 def test_skip():
     test_iterable = [4, 3, 8, 5, 1]
     test_serial_iterator = iter(test_iterable)
@@ -122,6 +259,19 @@ def test_distinct():
     assert new_parallel_intermediate.list() == new_serial_intermediate.list()
 
 
+def test_distinct_disk_with_key():
+    test_iterable = [(item % 11, item) for item in range(60)]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, SerialExecutor())
+
+    new_serial_intermediate = test_serial_object.distinct(key=lambda item: item[0])
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item).distinct(key=lambda item: item[0], mode='disk', max_memory=3)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+
+
 def test_limit():
     test_iterable = [4, 3, 8, 5, 1]
     test_serial_iterator = iter(test_iterable)
@@ -148,6 +298,19 @@ def test_flatten():
     assert new_parallel_intermediate.list() == new_serial_intermediate.list()
 
 
+def test_flatten_depth():
+    test_iterable = [[4, [3, [8]]], 'DogCow', 5, {'dogCow': 'Moof', 'meep': 'moop'}]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, SerialExecutor())
+
+    new_serial_intermediate = test_serial_object.flatten(depth=2)
+    new_parallel_intermediate = test_parallel_object.flatten(depth=2)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+
+
 def test_sort():
     test_iterable = [4, 3, 8, 5, 6]
     test_serial_iterator = iter(test_iterable)
@@ -210,6 +373,127 @@ def test_sort_with_cmp():
     assert new_parallel_intermediate.list() == new_serial_intermediate.list()
 
 
+def test_sort_in_chunks():
+    test_iterable = [{'inner': item % 5, 'order': item} for item in range(40)]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    executor = SerialExecutor()
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, executor, chunksize=6)
+    test_key = lambda item: item['inner']
+
+    new_serial_intermediate = test_serial_object.sort(key=test_key, reverse=True)
+    new_parallel_intermediate = test_parallel_object.filter(lambda item: True).sort(key=test_key, reverse=True)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert executor.submit_count == 7
+    assert executor.results[0] == [sorted([(test_key(item), item) for item in test_iterable[:6]], key=lambda pair: pair[0], reverse=True)]
+
+
+def test_sort_without_pending_stages_stays_in_process():
+    test_iterable = [4, 3, 8, 5, 1]
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=2)
+
+    assert test_object.sort(key=lambda item: -item).list() == [8, 5, 4, 3, 1]
+    assert executor.submit_count == 0
+
+
+def test_sort_fused_with_pending_stages():
+    test_iterable = list(range(30, 0, -1))
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    executor = SerialExecutor()
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, executor, chunksize=10)
+
+    new_serial_intermediate = test_serial_object.map(lambda item: item * 3).filter(lambda item: item % 2).sort()
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item * 3).filter(lambda item: item % 2).sort()
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert executor.submit_count == 3
+
+
+def test_sort_is_lazy():
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter([4, 3, 8, 5, 6]), executor)
+
+    new_intermediate = test_object.sort()
+
+    assert executor.submit_count == 0
+    assert new_intermediate.list() == [3, 4, 5, 6, 8]
+
+
+def test_top():
+    test_iterable = [{'inner': item % 7, 'order': item} for item in range(30)]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    executor = SerialExecutor()
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, executor, chunksize=10)
+    test_key = lambda item: item['inner']
+
+    new_serial_intermediate = test_serial_object.sort(key=test_key, reverse=True).limit(4)
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item).top(4, key=test_key)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert [len(result[0]) for result in executor.results] == [4, 4, 4]
+
+
+def test_bottom():
+    test_iterable = [(item * 7) % 23 for item in range(50)]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, SerialExecutor(), chunksize=8)
+
+    new_serial_intermediate = test_serial_object.map(lambda item: item * 2).bottom(5)
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item * 2).bottom(5)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+
+
+def test_sort_then_limit_selects():
+    test_iterable = [(item * 7) % 23 for item in range(50)]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    executor = SerialExecutor()
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, executor, chunksize=10)
+
+    new_serial_intermediate = test_serial_object.sort(cmp=_test_int_cmp).limit(3)
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item).sort(cmp=_test_int_cmp).limit(3)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert [len(result[0]) for result in executor.results] == [3, 3, 3, 3, 3]
+
+
+def _test_int_cmp(first, second):
+    return first - second
+
+
+def test_sort_max_memory():
+    test_iterable = [(item * 7) % 23 for item in range(50)]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, SerialExecutor())
+
+    new_serial_intermediate = test_serial_object.sort()
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item).sort(max_memory=8)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+
+
+def test_sort_max_memory_spills_runs_of_chunks():
+    test_iterable = [(item * 37) % 1001 for item in range(3000)]
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), ThreadPoolExecutor(1), chunksize=1, shutdown_executor=True)
+
+    new_intermediate = test_object.map(abs).sort(key=lambda item: -item, max_memory=100)
+
+    assert new_intermediate.list() == sorted(test_iterable, key=lambda item: -item)
+
+
 def test_reverse():
     test_iterable = [4, 3, 8, 5, 6]
     test_serial_iterator = iter(test_iterable)
@@ -238,6 +522,19 @@ def test_for_each():
     assert test_parallel_output == test_iterable
 
 
+def test_for_each_fused_with_map():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=len(test_iterable))
+    test_parallel_output = []
+
+    test_object.map(lambda item: item * item).for_each(test_parallel_output.append)
+
+    assert test_parallel_output == [item * item for item in test_iterable]
+    assert executor.submit_count == 1
+
+
 # Test chunk size
 def test_with_specified_chunksize():
     test_iterable = [4, 3, 8, 5, 1]
@@ -261,6 +558,683 @@ def test_with_specified_chunksize_on_specific_method():
     assert new_intermediate.list() == list(filter(test_lambda, [4, 3, 8, 5, 1]))
 
 
+# Test streaming
+def test_map_streams_infinite_iterator():
+    test_iterator = itertools.count()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, SerialExecutor(), chunksize=2)
+
+    new_intermediate = test_object.map(lambda item: item * item).limit(3)
+
+    assert new_intermediate.list() == [0, 1, 4]
+
+
+def test_max_in_flight_limits_consumed_input():
+    test_iterator = itertools.count()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, SerialExecutor(), chunksize=3, max_in_flight=2)
+
+    test_object.map(lambda item: item * item).first()
+
+    assert next(test_iterator) == 6
+
+
+# Test ordering
+def test_unordered_map_returns_results_as_they_finish():
+    test_iterable = [0.3, 0.0, 0.1]
+    test_iterator = iter(test_iterable)
+    executor = ThreadPoolExecutor(max_workers=len(test_iterable))
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=1, ordered=False)
+
+    def sleep_for(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    actual_list = test_object.map(sleep_for).list()
+
+    assert actual_list == sorted(test_iterable)
+
+
+def test_unordered_on_specific_method():
+    test_iterable = [0.3, 0.0, 0.1]
+    test_iterator = iter(test_iterable)
+    executor = ThreadPoolExecutor(max_workers=len(test_iterable))
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=1)
+
+    def sleep_for(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    actual_list = test_object.filter(lambda seconds: seconds > 0.0).map(sleep_for, ordered=False).list()
+
+    assert actual_list == [0.1, 0.3]
+
+
+# Test short-circuiting
+def test_first_cancels_outstanding_work():
+    test_iterator = itertools.count()
+    executor = LazyExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=1, max_in_flight=4)
+
+    actual_first = test_object.map(lambda item: item * item).first()
+
+    assert actual_first == 0
+    assert len(executor.futures) == 4
+    assert all(future.cancelled() for future in executor.futures[1:])
+
+
+def test_first_after_lazy_method_cancels_outstanding_work():
+    test_iterator = itertools.count()
+    executor = LazyExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=1, max_in_flight=4)
+
+    actual_first = test_object.map(lambda item: item * item).limit(100).distinct().first()
+
+    assert actual_first == 0
+    assert len(executor.futures) == 4
+    assert all(future.cancelled() for future in executor.futures[1:])
+
+
+def test_any_match_cancels_outstanding_work():
+    test_iterator = itertools.count()
+    executor = LazyExecutor(eager_count=2)
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=2, max_in_flight=3)
+
+    actual_any_match = test_object.map(lambda item: item * 2).any_match(lambda item: item == 6)
+
+    assert actual_any_match is True
+    assert len(executor.futures) == 4
+    assert all(future.cancelled() for future in executor.futures[2:])
+
+
+def test_any_match_without_pending_stages_stays_in_process():
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter([4, 3, 8]), executor)
+
+    assert test_object.any_match(lambda item: item == 3) is True
+    assert executor.submit_count == 0
+
+
+def test_all_match_stops_on_first_failure():
+    test_iterator = itertools.count()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, SerialExecutor(), chunksize=2)
+
+    actual_all_match = test_object.all_match(lambda item: item < 5)
+
+    assert actual_all_match is False
+
+
+def test_limit_cancels_outstanding_work():
+    test_iterator = itertools.count()
+    executor = LazyExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=1, max_in_flight=4)
+
+    actual_list = test_object.map(lambda item: item * item).limit(2).map(lambda item: item + 1).list()
+
+    assert actual_list == [1, 2]
+    assert all(future.cancelled() for future in executor.futures if not future.done())
+
+
+# Test partial results
+def test_sum_reduces_in_execution_units():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=2)
+
+    actual_sum = test_object.map(lambda item: item * 2).sum()
+
+    assert actual_sum == 42
+    assert executor.results == [[14], [26], [2]]
+
+
+def test_to_jsonl_serializes_in_execution_units(tmp_path):
+    test_iterable = [4, 3, 8, 5, 1]
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=2)
+    parallel_path = tmp_path / 'parallel.jsonl'
+    serial_path = tmp_path / 'serial.jsonl'
+
+    written = test_object.map(lambda item: {'item': item}).to_jsonl(str(parallel_path))
+    _IntermediateIteratorChain(iter(test_iterable)).map(lambda item: {'item': item}).to_jsonl(str(serial_path))
+
+    assert written == len(test_iterable)
+    assert parallel_path.read_bytes() == serial_path.read_bytes()
+    assert [type(result[0].data) for result in executor.results] == [bytes] * 3
+
+
+def test_to_csv_matches_serial(tmp_path):
+    test_iterable = list(range(20))
+    to_row = lambda item: {'item': item, 'square': item * item}
+    parallel_path = tmp_path / 'parallel.csv'
+    serial_path = tmp_path / 'serial.csv'
+
+    _IntermediateParallelIteratorChain(iter(test_iterable), SerialExecutor(), chunksize=3).map(to_row).to_csv(str(parallel_path))
+    _IntermediateIteratorChain(iter(test_iterable)).map(to_row).to_csv(str(serial_path))
+
+    assert parallel_path.read_bytes() == serial_path.read_bytes()
+
+
+def test_to_file_without_pending_stages(tmp_path):
+    path = tmp_path / 'output.txt'
+
+    written = _IntermediateParallelIteratorChain(iter(['a', 'b']), SerialExecutor()).to_file(str(path))
+
+    assert written == 2
+    assert path.read_text() == 'a\nb\n'
+
+
+def test_aggregate_in_execution_units():
+    test_iterable = list(range(20))
+    executor = SerialExecutor()
+    specs = {'count': 'count', 'total': 'sum', 'smallest': 'min', 'largest': 'max', 'first': 'first', 'last': 'last', 'mean': 'mean', 'odd': (0, lambda total, item: total + item % 2, operator.add)}
+
+    serial = _IntermediateIteratorChain(iter(test_iterable)).map(lambda item: item * 3).aggregate(**specs)
+    parallel = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=6).map(lambda item: item * 3).aggregate(**specs)
+
+    assert parallel == serial
+    assert len(executor.results) == 4
+    assert all(len(result) == 1 and isinstance(result[0], dict) for result in executor.results)
+
+
+def test_aggregate_without_combiner():
+    test_iterable = list(range(20))
+    executor = SerialExecutor()
+
+    actual = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=6).map(lambda item: item * 3).fan_out('count', ((), lambda items, item: items + (item,)))
+
+    assert actual == (20, tuple(item * 3 for item in test_iterable))
+    assert executor.results[0] == [0, 3, 6, 9, 12, 15]
+
+
+def test_tee():
+    test_iterable = list(range(10))
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=5)
+
+    first, second = test_object.map(lambda item: item * 2).tee()
+
+    assert first.list() == second.map(lambda item: item).list() == [item * 2 for item in test_iterable]
+    assert len(executor.results) == 4
+
+
+def test_tee_branch_stopping_early_leaves_other_branches():
+    test_iterable = list(range(100))
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=10, max_in_flight=2)
+
+    first, second, third = test_object.map(_test_double).tee(n=3)
+
+    assert first.first() == 0
+    assert second.distinct().limit(1).list() == [0]
+    del first
+    gc.collect()
+    assert executor.shutdown_called is False
+    assert third.count() == 100
+
+
+def test_tee_shuts_down_executor_once_every_branch_is_gone():
+    executor = SerialExecutor()
+
+    def inner_scope():
+        first, second = _IntermediateParallelIteratorChain(iter(range(10)), executor).map(_test_double).tee()
+        first.first()
+        second.list()
+
+    inner_scope()
+    gc.collect()
+
+    assert executor.shutdown_called is True
+
+
+def test_sum_with_default_after_map():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateParallelIteratorChain(test_iterator, SerialExecutor(), chunksize=2)
+
+    actual_sum = test_object.map(lambda item: 'DogCow' if item == 8 else item).sum(default='Moof')
+
+    assert actual_sum == 'Moof'
+
+
+def test_count_after_filter():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=2)
+
+    actual_count = test_object.filter(lambda item: item > 3).count()
+
+    assert actual_count == 3
+    assert executor.results == [[1], [2], []]
+
+
+def test_max_and_min_after_map():
+    test_iterable = [4, 3, 8, 5, 1]
+
+    actual_max = _IntermediateParallelIteratorChain(iter(test_iterable), SerialExecutor(), chunksize=2).map(lambda item: -item).max()
+    actual_min = _IntermediateParallelIteratorChain(iter(test_iterable), SerialExecutor(), chunksize=2).map(lambda item: -item).min()
+    actual_default = _IntermediateParallelIteratorChain(iter(test_iterable), SerialExecutor(), chunksize=2).filter(lambda item: item > 26).max(default='Moof')
+
+    assert actual_max == -1
+    assert actual_min == -8
+    assert actual_default == 'Moof'
+
+
+def test_reduce_with_combiner():
+    test_iterable = [4, 3, 8, 5, 1]
+    test_iterator = iter(test_iterable)
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(test_iterator, executor, chunksize=2)
+
+    actual_reduce = test_object.map(lambda item: item + 1).reduce(lambda first, second: first * second, combiner=lambda first, second: first * second)
+
+    assert actual_reduce == 5 * 4 * 9 * 6 * 2
+    assert executor.results == [[20], [54], [2]]
+
+
+def test_reduce_with_combiner_and_initial():
+    test_iterable = ['Dog', 'Cow', 'Moof']
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateParallelIteratorChain(test_iterator, SerialExecutor(), chunksize=2)
+
+    actual_reduce = test_object.map(str.lower).reduce(lambda total, item: total + len(item), initial=0, combiner=lambda first, second: first + second)
+
+    assert actual_reduce == 10
+
+
+# Test adaptive chunksize
+def test_adaptive_chunksize_starts_at_one():
+    chunksizer = _AdaptiveChunksizer(itertools.count())
+
+    assert chunksizer.next_chunksize() == 1
+    assert chunksizer.next_chunksize() == 1
+
+
+def test_adaptive_chunksize_grows_for_cheap_items():
+    chunksizer = _AdaptiveChunksizer(itertools.count(), target_chunk_time=0.1)
+
+    chunksizer.record(1, 0.001)
+    first_chunksize = chunksizer.next_chunksize()
+    chunksizer.record(first_chunksize, 0.001 * first_chunksize)
+    second_chunksize = chunksizer.next_chunksize()
+
+    assert first_chunksize == 4
+    assert second_chunksize == 16
+
+
+def test_adaptive_chunksize_targets_chunk_time():
+    chunksizer = _AdaptiveChunksizer(itertools.count(), target_chunk_time=0.1)
+
+    for _ in range(10):
+        chunksize = chunksizer.next_chunksize()
+        chunksizer.record(chunksize, 0.01 * chunksize)
+
+    assert chunksizer.next_chunksize() == 10
+    assert chunksizer.history[-1].chunksize == 10
+
+
+def test_adaptive_chunksize_shrinks_near_end():
+    test_iterator = iter(range(10))
+    chunksizer = _AdaptiveChunksizer(test_iterator, target_chunk_time=0.1)
+    chunksizer.record(1, 0.0)
+
+    assert chunksizer.next_chunksize() <= max(1, -(-10 // (2 * chunksizer._execution_units)))
+
+
+def test_adaptive_chunksize_chain():
+    test_iterable = list(range(1000))
+    test_iterator = iter(test_iterable)
+    test_object = _IntermediateParallelIteratorChain(test_iterator, SerialExecutor(), target_chunk_time=0.001)
+
+    new_intermediate = test_object.map(lambda item: item * 2).filter(lambda item: item % 3)
+
+    assert new_intermediate.list() == [item * 2 for item in test_iterable if (item * 2) % 3]
+
+
+def test_profiler_counts_fused_stages():
+    profiler = Profiler()
+    test_iterable = list(range(10))
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=3, profiler=profiler)
+
+    test_object.map(lambda item: item * 2).filter(lambda item: item % 3).skip(1).list()
+
+    map_report, filter_report, skip_report, list_report = profiler.report()
+    assert (map_report['elements_in'], map_report['elements_out']) == (10, 10)
+    assert (filter_report['elements_in'], filter_report['elements_out']) == (10, 6)
+    assert (skip_report['elements_in'], skip_report['elements_out']) == (6, 5)
+    assert list_report['elements_in'] == 5
+    assert map_report['chunks_submitted'] == filter_report['chunks_submitted'] == executor.submit_count == 4
+    assert map_report['bytes_pickled'] is None
+    assert map_report['wall_time'] is None
+    assert filter_report['wall_time'] >= 0
+    assert skip_report['chunks_submitted'] is None
+
+
+def test_profiler_measures_serializer_payloads():
+    profiler = Profiler()
+    payload_sizes = []
+    serializer = serialization.Serializer(use_cloudpickle=False)
+    original_dumps = serializer.dumps
+
+    def measured_dumps(something, threshold=None):
+        payload = original_dumps(something, threshold=threshold)
+        payload_sizes.append(len(payload.data))
+        return payload
+
+    serializer.dumps = measured_dumps
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(range(10)), executor, chunksize=5, serializer=serializer, profiler=profiler)
+
+    test_object.map(_test_double).list()
+
+    map_report = profiler.report()[0]
+    result_sizes = [len(result.data) for result in executor.results]
+    assert map_report['bytes_pickled'] == sum(payload_sizes) + sum(result_sizes)
+
+
+def test_profiler_counts_terminal_stage():
+    profiler = Profiler()
+    test_object = _IntermediateParallelIteratorChain(iter(range(10)), SerialExecutor(), chunksize=5, profiler=profiler)
+
+    test_object.map(lambda item: item * 2).for_each(lambda item: item)
+
+    map_report, for_each_report = profiler.report()
+    assert map_report['elements_out'] == 10
+    assert for_each_report['elements_in'] == 10
+    assert for_each_report['elements_out'] is None
+    assert for_each_report['function_time'] > 0
+    assert for_each_report['chunks_submitted'] == 2
+
+
+def test_profiler_counts_partial_results():
+    profiler = Profiler()
+    test_object = _IntermediateParallelIteratorChain(iter(range(10)), SerialExecutor(), chunksize=5, profiler=profiler)
+
+    actual_sum = test_object.filter(lambda item: item % 2).sum()
+
+    assert actual_sum == 25
+    filter_report, sum_report = profiler.report()
+    assert filter_report['elements_out'] == 5
+    assert sum_report['method'] == 'sum'
+
+
+def test_map_batches():
+    test_iterable = list(range(50))
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    executor = SerialExecutor()
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, executor, chunksize=2)
+
+    new_serial_intermediate = test_serial_object.batch(10).map_batches(lambda block: [item * 2 for item in block]).unbatch()
+    new_parallel_intermediate = test_parallel_object.batch(10).map_batches(lambda block: [item * 2 for item in block]).unbatch()
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert executor.submit_count == 3
+
+
+def test_batch_terminals_in_execution_units():
+    test_iterable = list(range(50))
+
+    def batched_object(executor):
+        return _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=2).batch(10).map_batches(lambda block: block[1:])
+
+    executor = SerialExecutor()
+    assert batched_object(executor).count() == 45
+    assert executor.results == [[18], [18], [9]]
+    assert batched_object(SerialExecutor()).sum() == sum(test_iterable) - sum(range(0, 50, 10))
+    assert batched_object(SerialExecutor()).min() == 1
+    assert batched_object(SerialExecutor()).max() == 49
+
+
+def test_batch_invalid_size():
+    try:
+        _IntermediateParallelIteratorChain(iter(range(10)), SerialExecutor()).map(_test_double).batch(0)
+        raise AssertionError('ValueError was not raised')
+    except ValueError:
+        pass
+
+
+def test_shared_memory():
+    test_iterable = [bytes([item]) * 100 for item in range(10)]
+    test_serial_iterator = iter(test_iterable)
+    test_parallel_iterator = iter(test_iterable)
+    test_serial_object = _IntermediateIteratorChain(test_serial_iterator)
+    executor = SerialExecutor()
+    test_parallel_object = _IntermediateParallelIteratorChain(test_parallel_iterator, executor, chunksize=3, shared_memory_threshold=50)
+
+    new_serial_intermediate = test_serial_object.map(lambda item: item * 2).filter(lambda item: item[0] % 2)
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item * 2).filter(lambda item: item[0] % 2)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    shared_results = [result for results in executor.results for result in results]
+    assert all(isinstance(result, transport._SharedPayload) for result in shared_results)
+    assert not any(os.path.exists(result.path) for result in shared_results)
+
+
+def test_shared_memory_discarded_when_cancelled():
+    test_iterable = [bytes([item]) * 100 for item in range(10)]
+    executor = LazyExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=1, max_in_flight=4, shared_memory_threshold=50)
+
+    new_intermediate = test_object.map(lambda item: item[:2])
+    first = new_intermediate.first()
+
+    assert first == bytes([0, 0])
+    assert new_intermediate._executions[0]._shared_chunks == {}
+
+
+def test_shared_memory_discarded_when_stopped_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(transport, '_SHARED_DIRECTORY', str(tmp_path))
+    test_iterable = [bytes([item]) * 100 for item in range(10)]
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), LazyExecutor(), chunksize=1, max_in_flight=4, shared_memory_threshold=50)
+
+    zipped = test_object.map(lambda item: item[:2]).zip_with([1, 2]).list()
+    gc.collect()
+
+    assert zipped == [(bytes([0, 0]), 1), (bytes([1, 1]), 2)]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shared_memory_discarded_when_exception_raised_and_owned(tmp_path, monkeypatch):
+    monkeypatch.setattr(transport, '_SHARED_DIRECTORY', str(tmp_path))
+    test_iterable = [bytes([item]) * 100 for item in range(10)]
+    executor = LazyExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=1, max_in_flight=4, shared_memory_threshold=50)
+
+    new_intermediate = test_object.map(lambda item: item[:2])
+    try:
+        new_intermediate.distinct(key=lambda item: 1 // item[0]).list()
+        raise AssertionError('ZeroDivisionError was not raised')
+    except ZeroDivisionError:
+        pass
+
+    assert new_intermediate._executions[0]._shared_chunks == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_skips_execution_units(tmp_path):
+    test_iterable = list(range(20))
+    lineage = (caching.source('from_iterable_parallel', test_iterable),)
+    first_executor = SerialExecutor()
+    second_executor = SerialExecutor()
+
+    first = _IntermediateParallelIteratorChain(iter(test_iterable), first_executor, chunksize=6, lineage=lineage).map(_test_double).cache(storage='disk', path=str(tmp_path)).list()
+    second = _IntermediateParallelIteratorChain(iter(test_iterable), second_executor, chunksize=6, lineage=lineage).map(_test_double).cache(storage='disk', path=str(tmp_path)).list()
+
+    assert first == second == [item * 2 for item in test_iterable]
+    assert first_executor.submit_count == 4
+    assert second_executor.submit_count == 0
+
+
+def test_join():
+    test_left = list(range(10))
+    test_right = list(range(0, 20, 3))
+    key = lambda item: item % 6
+
+    serial = _IntermediateIteratorChain(iter(test_left)).map(lambda item: item * 2).join(iter(test_right), key, how='outer').list()
+    parallel_left = _IntermediateParallelIteratorChain(iter(test_left), SerialExecutor(), chunksize=3).map(lambda item: item * 2)
+    parallel_right = _IntermediateParallelIteratorChain(iter(test_right), SerialExecutor(), chunksize=3).map(lambda item: item)
+    parallel = parallel_left.join(parallel_right, key, how='outer').list()
+
+    assert parallel == serial
+
+
+def test_merge_join_and_zip_with():
+    test_iterable = list(range(10))
+
+    def chains():
+        return _IntermediateIteratorChain(iter(test_iterable)).map(lambda item: item // 2), _IntermediateParallelIteratorChain(iter(test_iterable), SerialExecutor(), chunksize=3).map(lambda item: item // 2)
+
+    serial, parallel = chains()
+    assert parallel.merge_join(range(3), lambda item: item).list() == serial.merge_join(range(3), lambda item: item).list()
+    serial, parallel = chains()
+    assert parallel.zip_with('abc').list() == serial.zip_with('abc').list()
+
+
+def test_chunked_sends_whole_chunks():
+    test_iterable = list(range(10))
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=2)
+
+    actual_list = test_object.map(lambda item: item + 1).chunked(4).map(sum).list()
+
+    assert actual_list == [10, 26, 19]
+    assert executor.results[-2:] == [[10, 26], [19]]
+
+
+def test_windows():
+    test_iterable = list(range(10))
+
+    def chains():
+        return _IntermediateIteratorChain(iter(test_iterable)).map(lambda item: item * 2), _IntermediateParallelIteratorChain(iter(test_iterable), SerialExecutor(), chunksize=3).map(lambda item: item * 2)
+
+    serial, parallel = chains()
+    assert parallel.sliding_window(3, step=2).list() == serial.sliding_window(3, step=2).list()
+    serial, parallel = chains()
+    assert parallel.window_by(lambda item: item, 5).list() == serial.window_by(lambda item: item, 5).list()
+
+
+def test_group_by():
+    test_iterable = list(range(30))
+    executor = SerialExecutor()
+    test_serial_object = _IntermediateIteratorChain(iter(test_iterable))
+    test_parallel_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=4)
+
+    new_serial_intermediate = test_serial_object.map(lambda item: item * 3).group_by(lambda item: item % 4)
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item * 3).group_by(lambda item: item % 4)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert all(len(result) == 1 and isinstance(result[0], dict) for result in executor.results)
+
+
+def test_count_by():
+    test_iterable = list(range(30))
+    executor = SerialExecutor()
+    test_serial_object = _IntermediateIteratorChain(iter(test_iterable))
+    test_parallel_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=4)
+
+    new_serial_intermediate = test_serial_object.filter(lambda item: item % 5).count_by(lambda item: item % 3)
+    new_parallel_intermediate = test_parallel_object.filter(lambda item: item % 5).count_by(lambda item: item % 3)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert len(executor.results) == 8
+
+
+def test_aggregate_by():
+    test_iterable = list(range(30))
+    key = lambda item: item % 4
+    combine = lambda total, item: total + item
+    executor = SerialExecutor()
+    test_serial_object = _IntermediateIteratorChain(iter(test_iterable))
+    test_parallel_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=4)
+
+    new_serial_intermediate = test_serial_object.map(lambda item: item * 2).aggregate_by(key, 0, combine)
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item * 2).aggregate_by(key, 0, combine, combiner=operator.add)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert all(isinstance(result[0], dict) for result in executor.results)
+
+
+def test_group_by_count_by_aggregate_by_without_pending_stages_stay_in_process():
+    test_iterable = list(range(30))
+    executor = SerialExecutor()
+
+    def test_object():
+        return _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=4)
+
+    assert test_object().group_by(lambda item: item % 2).list() == [(0, test_iterable[::2]), (1, test_iterable[1::2])]
+    assert test_object().count_by(lambda item: item % 2).list() == [(0, 15), (1, 15)]
+    assert test_object().aggregate_by(lambda item: item % 2, 0, operator.add, combiner=operator.add).list() == [(0, 210), (1, 225)]
+    assert executor.submit_count == 0
+
+
+def test_aggregate_by_without_combiner():
+    test_iterable = list(range(30))
+    key = lambda item: item % 4
+    combine = lambda values, item: values + (item,)
+    executor = SerialExecutor()
+    test_serial_object = _IntermediateIteratorChain(iter(test_iterable))
+    test_parallel_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=4)
+
+    new_serial_intermediate = test_serial_object.map(lambda item: item * 2).aggregate_by(key, (), combine)
+    new_parallel_intermediate = test_parallel_object.map(lambda item: item * 2).aggregate_by(key, (), combine)
+
+    assert new_parallel_intermediate.list() == new_serial_intermediate.list()
+    assert executor.results[0] == [0, 2, 4, 6]
+
+
+def _test_double(item):
+    return item * 2
+
+
+def _test_is_odd(item):
+    return item[0] % 2 if isinstance(item, bytes) else item % 2
+
+
+def test_serializer():
+    test_iterable = list(range(20))
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=3, serializer=serialization.Serializer(use_cloudpickle=False))
+
+    actual_list = test_object.map(_test_double).filter(_test_is_odd).list()
+
+    assert actual_list == [item * 2 for item in test_iterable if item * 2 % 2]
+    assert all(isinstance(result, serialization._Payload) for result in executor.results)
+
+
+def test_serializer_adaptive_chunksize_and_reducer():
+    test_iterable = list(range(20))
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), SerialExecutor(), serializer=serialization.Serializer(use_cloudpickle=False))
+
+    assert test_object.map(_test_double).sum() == 2 * sum(test_iterable)
+
+
+def test_serializer_with_shared_memory():
+    test_iterable = [bytes([item]) * 100 for item in range(10)]
+    executor = SerialExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=3, shared_memory_threshold=50, serializer=serialization.Serializer(use_cloudpickle=False))
+
+    actual_list = test_object.map(_test_double).filter(_test_is_odd).list()
+
+    assert actual_list == [item * 2 for item in test_iterable if item[0] % 2]
+    shared = [shared for payload in executor.results for shared in payload.buffers]
+    assert len(shared) == len(actual_list)
+    assert not any(os.path.exists(descriptor.path) for descriptor in shared)
+
+
+def test_serializer_shared_memory_discarded_when_cancelled():
+    test_iterable = [bytes([item]) * 100 for item in range(10)]
+    executor = LazyExecutor()
+    test_object = _IntermediateParallelIteratorChain(iter(test_iterable), executor, chunksize=1, max_in_flight=4, shared_memory_threshold=50, serializer=serialization.Serializer(use_cloudpickle=False))
+
+    new_intermediate = test_object.map(_test_double)
+    first = new_intermediate.first()
+
+    assert first == test_iterable[0] * 2
+    assert new_intermediate._executions[0]._shared_chunks == {}
+
+
 # Termination methods
 def test_list():
     test_iterable = [4, 3, 8, 5, 1]
@@ -0,0 +1,35 @@
+import asyncio
+from iterator_chain import pool
+
+
+def test_shared_executor_is_reused():
+    first_executor = pool.shared_executor()
+    second_executor = pool.shared_executor()
+
+    assert first_executor is second_executor
+
+
+def test_shutdown_shared_executor_starts_new_executor():
+    first_executor = pool.shared_executor()
+
+    pool.shutdown_shared_executor()
+    second_executor = pool.shared_executor()
+
+    assert first_executor is not second_executor
+
+
+def test_shared_thread_executor_is_reused():
+    first_executor = pool.shared_thread_executor()
+    second_executor = pool.shared_thread_executor()
+
+    assert first_executor is second_executor
+    assert first_executor is not pool.shared_executor()
+
+
+def test_shared_event_loop_runs_coroutines():
+    async def coroutine():
+        return 'Moof'
+
+    event_loop = pool.shared_event_loop()
+
+    assert asyncio.run_coroutine_threadsafe(coroutine(), event_loop).result() == 'Moof'
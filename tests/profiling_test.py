@@ -0,0 +1,69 @@
+from iterator_chain.profiling import Profiler
+from iterator_chain.intermediate import _IntermediateIteratorChain
+
+
+def test_report_counts_elements():
+    profiler = Profiler()
+    test_object = _IntermediateIteratorChain(iter([4, 3, 8, 5, 1]), profiler=profiler)
+
+    test_object.map(lambda item: item * 2).filter(lambda item: item > 6).list()
+
+    report = profiler.report()
+    assert [stage['method'] for stage in report] == ['map', 'filter', 'list']
+    assert [stage['elements_in'] for stage in report] == [None, 5, 3]
+    assert [stage['elements_out'] for stage in report] == [5, 3, None]
+
+
+def test_report_times_functions():
+    profiler = Profiler()
+    test_object = _IntermediateIteratorChain(iter([4, 3, 8, 5, 1]), profiler=profiler)
+
+    test_object.sort(key=lambda item: -item).skip(1).reduce(lambda first, second: first + second)
+
+    report = profiler.report()
+    assert report[0]['function_time'] > 0
+    assert report[1]['function_time'] is None
+    assert report[2]['function_time'] > 0
+    assert all(stage['wall_time'] >= 0 for stage in report)
+
+
+def test_report_serial_has_no_parallel_numbers():
+    profiler = Profiler()
+    test_object = _IntermediateIteratorChain(iter([4, 3, 8, 5, 1]), profiler=profiler)
+
+    test_object.map(lambda item: item * 2).count()
+
+    for stage in profiler.report():
+        assert stage['chunks_submitted'] is None
+        assert stage['bytes_pickled'] is None
+        assert stage['wait_time'] is None
+        assert stage['worker_idle_time'] is None
+
+
+def test_report_wall_time_excludes_previous_methods():
+    profiler = Profiler()
+    test_object = _IntermediateIteratorChain(iter(range(1000)), profiler=profiler)
+
+    test_object.map(lambda item: sum(range(1000))).sort().first()
+
+    map_report, sort_report, first_report = profiler.report()
+    assert map_report['wall_time'] > sort_report['wall_time']
+    assert map_report['wall_time'] > first_report['wall_time']
+
+
+def test_callback_called_on_terminating_method():
+    reports = []
+    profiler = Profiler(callback=reports.append)
+    test_object = _IntermediateIteratorChain(iter([4, 3, 8, 5, 1]), profiler=profiler)
+
+    test_object.none_match(lambda item: item > 10)
+
+    assert len(reports) == 1
+    assert [stage['method'] for stage in reports[0]] == ['none_match']
+    assert reports[0][0]['elements_in'] is None
+
+
+def test_no_profiler():
+    test_object = _IntermediateIteratorChain(iter([4, 3, 8, 5, 1]))
+
+    assert test_object.map(lambda item: item * 2).list() == [8, 6, 16, 10, 2]
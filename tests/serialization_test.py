@@ -0,0 +1,97 @@
+import os
+import pickle
+import pytest
+from iterator_chain import serialization
+from iterator_chain import transport
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __reduce__(self):
+        raise pickle.PicklingError('Point must be sent with its codec')
+
+
+def encode_point(point):
+    return point.x, point.y
+
+
+def decode_point(coordinates):
+    return Point(*coordinates)
+
+
+def double(chunk):
+    return [item * 2 for item in chunk]
+
+
+def test_dumps_loads_round_trip():
+    test_object = {'a': [1, 2.5, 'three'], 'b': (None, b'four')}
+
+    payload = serialization.dumps(test_object, {})
+
+    assert payload.buffers == []
+    assert serialization.loads(payload) == test_object
+
+
+def test_codecs():
+    payload = serialization.Serializer(codecs={Point: (encode_point, decode_point)}).dumps([Point(1, 2)])
+
+    point = serialization.loads(payload)[0]
+
+    assert (point.x, point.y) == (1, 2)
+
+
+def test_large_buffers_are_sent_out_of_band():
+    large = bytearray(b'x' * 10000)
+
+    payload = serialization.dumps([large, bytearray(b'small')], {}, threshold=50)
+
+    assert len(payload.buffers) == 1
+    assert len(payload.data) < len(large)
+    assert serialization.loads(payload, delete=True) == [large, bytearray(b'small')]
+    assert not os.path.exists(payload.buffers[0].path)
+
+
+def test_discard():
+    payload = serialization.dumps([bytearray(100)], {}, threshold=1)
+
+    serialization.discard(payload)
+
+    assert not os.path.exists(payload.buffers[0].path)
+
+
+def test_execute_loads_program_once(monkeypatch):
+    digest, program = serialization.Serializer(use_cloudpickle=False).program(double)
+    loads = []
+    original_loads = pickle.loads
+    monkeypatch.setattr(serialization.pickle, 'loads', lambda data, **kwargs: loads.append(data) or original_loads(data, **kwargs))
+
+    first = serialization.execute(digest, program, None, serialization.dumps([1, 2], {}))
+    second = serialization.execute(digest, program, None, serialization.dumps([3], {}))
+
+    assert serialization.loads(first) == [2, 4]
+    assert serialization.loads(second) == [6]
+    assert loads.count(program) <= 1
+
+
+def test_program_without_cloudpickle_rejects_lambdas():
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        serialization.Serializer(use_cloudpickle=False).program(lambda chunk: chunk)
+
+
+def test_program_with_cloudpickle_accepts_lambdas():
+    pytest.importorskip('cloudpickle')
+    digest, program = serialization.Serializer(use_cloudpickle=True).program(lambda chunk: [item + 1 for item in chunk])
+
+    results = serialization.execute(digest, program, None, serialization.dumps([1], {}))
+
+    assert serialization.loads(results) == [2]
+
+
+def test_shared_buffer_round_trip():
+    descriptor = transport.share_buffer(b'abc')
+
+    assert bytes(transport.receive(descriptor, delete=True)) == b'abc'
+    assert not os.path.exists(descriptor.path)
@@ -0,0 +1,66 @@
+from iterator_chain import spill
+
+
+def test_spill_round_trip():
+    test_items = list(range(3000))
+
+    spill_file = spill.spill(test_items)
+
+    assert list(spill.read_spilled(spill_file)) == test_items
+    spill_file.close()
+
+
+def test_external_sort_merges_runs():
+    test_items = [(item * 37) % 101 for item in range(101)]
+
+    actual_sort = list(spill.external_sort(iter(test_items), max_memory=10))
+
+    assert actual_sort == sorted(test_items)
+
+
+def test_external_sort_exact_runs():
+    test_items = [5, 2, 7, 1, 9, 3]
+
+    actual_sort = list(spill.external_sort(iter(test_items), max_memory=3))
+
+    assert actual_sort == sorted(test_items)
+
+
+def test_external_sort_empty():
+    assert list(spill.external_sort(iter([]), max_memory=3)) == []
+
+
+def test_external_sort_bounds_open_runs():
+    test_items = [(item * 37) % 1001 for item in range(5000)]
+
+    actual_sort = list(spill.external_sort(iter(test_items), max_memory=1))
+
+    assert actual_sort == sorted(test_items)
+
+
+def test_spilled_runs_merge_levels_in_order():
+    with spill.SpilledRuns(key=lambda item: item[0]) as runs:
+        for index in range(spill._MAX_FAN_IN * 2 + 3):
+            runs.add([(index % 3, index)])
+
+        assert sum(len(level) for level in runs._levels) == 5
+        actual_merge = list(runs.merge(last_run=[(0, 'last')]))
+
+    assert actual_merge == sorted([(index % 3, index) for index in range(spill._MAX_FAN_IN * 2 + 3)] + [(0, 'last')], key=lambda item: item[0])
+
+
+def test_spilled_set_stays_exact():
+    with spill.SpilledSet(5) as spilled_set:
+        added = [spilled_set.add(item % 13) for item in range(40)]
+
+        assert added == [True] * 13 + [False] * 27
+        assert all(item in spilled_set for item in range(13))
+        assert 13 not in spilled_set
+
+
+def test_spilled_set_compares_equal_items():
+    with spill.SpilledSet(1) as spilled_set:
+        spilled_set.add(1)
+
+        assert spilled_set.add(1.0) is False
+        assert spilled_set.add('1') is True
@@ -0,0 +1,42 @@
+import os
+import pytest
+from iterator_chain import transport
+
+
+def test_share_small_item_is_unchanged():
+    assert transport.share(b'Moof', 10) == b'Moof'
+    assert transport.share('DogCow' * 10, 10) == 'DogCow' * 10
+
+
+def test_share_round_trip():
+    test_item = b'DogCow' * 100
+
+    shared_item = transport.share(test_item, 10)
+
+    assert shared_item != test_item
+    assert transport.receive(shared_item, delete=True) == test_item
+    assert not os.path.exists(shared_item.path)
+
+
+def test_share_bytearray_round_trip():
+    test_item = bytearray(b'DogCow' * 100)
+
+    shared_item = transport.share(test_item, 10)
+    received_item = transport.receive(shared_item)
+    transport.discard([shared_item])
+
+    assert isinstance(received_item, bytearray)
+    assert received_item == test_item
+    assert not os.path.exists(shared_item.path)
+
+
+def test_share_array_round_trip():
+    numpy = pytest.importorskip('numpy')
+    test_item = numpy.arange(1000, dtype='float64').reshape(10, 100)
+
+    shared_item = transport.share(test_item, 10)
+    received_item = transport.receive(shared_item)
+    received_item += 1
+    transport.discard([shared_item])
+
+    assert (received_item == test_item + 1).all()